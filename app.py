@@ -10,6 +10,7 @@ Usage:
 """
 
 import io
+from functools import partial
 from pathlib import Path
 
 import gradio as gr
@@ -23,12 +24,16 @@ sys.path.insert(0, str(Path(__file__).parent))
 from backend.app.ml.model import HandwritingLSTM
 from backend.app.ml.utils import build_vocab
 from backend.app.services.renderer import Renderer
+from backend.app.services.stroke_cache import StrokeCache, style_cache_key
 
 
 # Global model instance
 MODEL = None
 VOCAB = None
 RENDERER = None
+
+# Word-level stroke cache for document mode (common words repeat a lot)
+WORD_CACHE = StrokeCache(max_bytes=32 * 1024 * 1024, variants=4)
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
 # Style presets with display names
@@ -67,6 +72,9 @@ def load_model():
     MODEL = MODEL.to(DEVICE)
     MODEL.eval()
 
+    # Cached strokes belong to the previous weights
+    WORD_CACHE.clear()
+
     # Try to load checkpoint if available
     checkpoint_path = Path("checkpoints/lstm_mdn_v1_best.pt")
     if checkpoint_path.exists():
@@ -256,7 +264,12 @@ def generate_document(
         current_temp = min(current_temp, 1.0)
 
         try:
-            strokes = generate_strokes(word, style_idx, current_temp)
+            strokes = WORD_CACHE.get_or_generate(
+                word,
+                style_cache_key(style_idx),
+                current_temp,
+                partial(generate_strokes, word, style_idx, current_temp),
+            )
         except Exception:
             continue
 
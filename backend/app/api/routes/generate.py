@@ -18,45 +18,209 @@ import json
 import logging
 import time
 import uuid
+from collections.abc import AsyncIterator
+from pathlib import Path
 from typing import Any
 
 from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 
-from app.models.schemas import GenerateRequest, GenerateResponse, JobStatusResponse
+from app.config import settings
+from app.ml.admission import AdmissionRejectedError
+from app.ml.llm_engine import UnsupportedStyleError
+from app.ml.pacing import StreamPacer, pace_events
+from app.ml.profiling import PROFILE_HEADER, RequestProfile
+from app.models.schemas import (
+    GenerateRequest,
+    GenerateResponse,
+    JobStatusResponse,
+    StreamFraming,
+)
+from app.services.job_store import InMemoryJobStore, JobStore
+from app.services.metrics import SERIALIZATION_TIME
+from app.services.stream_relay import StreamRelay
+from app.services.stroke_codec import STROKE_SUBPROTOCOL, encode_frame, header_message
+from app.services.stroke_framer import frame_events
 
 logger = logging.getLogger("inkforge.routes.generate")
 
 router = APIRouter()
 
-# In-memory job store (replace with Redis in production)
-_jobs: dict[str, dict[str, Any]] = {}
 
-# TTL for job cleanup (1 hour)
-_JOB_TTL_SECONDS = 3600
-_MAX_JOBS = 500
+def _job_store(app: Any) -> JobStore:
+    """Return the app's job store (created in lifespan; in-memory fallback without one)."""
+    store = getattr(app.state, "job_store", None)
+    if store is None:
+        store = app.state.job_store = InMemoryJobStore()
+    return store
 
 
-def _cleanup_old_jobs() -> None:
-    """Remove jobs older than TTL and enforce a size cap."""
-    if len(_jobs) <= _MAX_JOBS // 2:
-        return  # skip cleanup when well under capacity
+def _stream_relay(app: Any) -> StreamRelay:
+    """Return the app's Redis stream relay, connecting on first use."""
+    relay = getattr(app.state, "stream_relay", None)
+    if relay is None:
+        import redis.asyncio as redis
 
-    now = time.monotonic()
-    expired = [
-        jid for jid, job in _jobs.items() if now - job.get("created_at", now) > _JOB_TTL_SECONDS
-    ]
-    for jid in expired:
-        del _jobs[jid]
+        relay = app.state.stream_relay = StreamRelay(
+            redis.Redis.from_url(settings.redis_url),
+            idle_timeout_s=settings.stream_relay_timeout_s,
+        )
+    return relay
+
+
+def _engine_unavailable(app: Any) -> str | None:
+    """Return why this process cannot run a job's stream, or None if it can."""
+    if settings.stream_mode == "distributed":
+        return None  # Inference runs on the Celery workers
+    engine = getattr(app.state, "engine", None)
+    if engine is None:
+        return "Engine unavailable"
+    if not engine.is_ready:
+        return "Engine not ready — model still loading"
+    return None
 
-    # If still over capacity, evict oldest
-    if len(_jobs) > _MAX_JOBS:
-        sorted_ids = sorted(
-            _jobs.keys(),
-            key=lambda jid: _jobs[jid].get("created_at", 0),
+
+def _check_admission(app: Any, text: str) -> None:
+    """
+    Answer 429 (with Retry-After) when the local engine is too busy to stream text.
+
+    Raises:
+        HTTPException: 429 if the admission controller would reject the stream.
+    """
+    if settings.stream_mode == "distributed":
+        return  # Celery queues the work
+    engine = getattr(app.state, "engine", None)
+    if engine is None or not engine.is_ready:
+        return
+    try:
+        engine.check_admission(text)
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        ) from e
+
+
+def _check_style(app: Any, style_id: str) -> None:
+    """
+    Answer 422 when the local engine's backend cannot write style_id.
+
+    Raises:
+        HTTPException: 422 for styles the backend does not serve.
+    """
+    if settings.stream_mode == "distributed":
+        return  # The workers check the style
+    engine = getattr(app.state, "engine", None)
+    if engine is None or not engine.is_ready:
+        return
+    try:
+        engine.check_style(style_id)
+    except UnsupportedStyleError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+
+def _profile_requested(request: Request) -> bool:
+    """Whether a job submitted with this request should be profiled (PROFILE_REQUESTS)."""
+    if settings.profile_requests == "all":
+        return True
+    if settings.profile_requests == "header":
+        return request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes")
+    return False
+
+
+def _job_profile(job_id: str, job: dict[str, Any]) -> RequestProfile | None:
+    """Per-phase timers for a profiled job's stream (None when it is not profiled)."""
+    if not job.get("profile"):
+        return None
+    return RequestProfile(
+        trace=settings.profile_trace,
+        trace_path=Path(settings.export_dir) / "profiles" / f"{job_id}.trace.json",
+    )
+
+
+async def _save_trace(job_id: str, profile: RequestProfile | None) -> None:
+    """Write a profiled stream's trace file, if tracing is on."""
+    if profile is None or profile.spans is None:
+        return
+    try:
+        path = await asyncio.to_thread(profile.write_trace)
+        logger.info(f"Job {job_id}: profile trace written to {path}")
+    except OSError as e:
+        logger.warning(f"Job {job_id}: could not write profile trace: {e}")
+
+
+async def _relayed_events(app: Any, job_id: str, job: dict[str, Any]) -> AsyncIterator[dict]:
+    """
+    Distributed mode: dispatch the job to a Celery worker (once) and relay its events.
+
+    Dispatch is claimed atomically in the job store, so when several
+    connections for the same job race (reconnects, other API processes)
+    exactly one sends the task; the others relay its stream. The worker
+    generates unpaced; the job's pacing is applied here instead.
+
+    When the worker fails or goes silent, its stream and the dispatch claim
+    are dropped, so the next connection for the job dispatches it again.
+    """
+    if await _job_store(app).claim(job_id, "dispatched_at", time.time()):
+        from app.worker import worker
+
+        result = await asyncio.to_thread(
+            worker.send_task,
+            "inkforge.generate_stream",
+            args=[
+                job_id,
+                job["text"],
+                job["style_id"],
+                job["params"],
+                job.get("seed"),
+                job.get("profile", False),
+            ],
         )
-        for jid in sorted_ids[: len(_jobs) - _MAX_JOBS]:
-            del _jobs[jid]
+        await _job_store(app).update(job_id, task_id=result.id)
+        logger.info(f"Job {job_id}: dispatched to worker (task {result.id})")
+
+    pacer = StreamPacer.create(
+        job["pacing"] or settings.stream_pacing, settings.stream_chunk_delay_ms
+    )
+    relay = _stream_relay(app)
+    async for event in pace_events(relay.events(job_id), pacer):
+        if event.get("type") == "error":
+            await relay.reset(job_id)
+            await _job_store(app).update(job_id, dispatched_at=None, task_id=None)
+        yield event
+
+
+def _job_events(
+    app: Any,
+    job_id: str,
+    job: dict[str, Any],
+    force_framing: bool = False,
+    profile: RequestProfile | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Start the event stream for a job, grouped into frames if the job asked for framing.
+
+    Events come from the local engine, or from a Celery worker via Redis in
+    distributed stream mode. force_framing applies the default framing when
+    the job has none (binary clients). A profiled distributed job is timed
+    by the worker, so its profile covers generation but not this process.
+    """
+    if settings.stream_mode == "distributed":
+        events = _relayed_events(app, job_id, job)
+    else:
+        events = app.state.engine.stream_generate(
+            text=job["text"],
+            style_id=job["style_id"],
+            params=job["params"],
+            pacing=job["pacing"],
+            seed=job.get("seed"),
+            profile=profile,
+        )
+    framing = job.get("framing")
+    if framing is None and force_framing:
+        framing = StreamFraming().model_dump()
+    if framing is None:
+        return events
+    return frame_events(events, framing["max_strokes"], framing["max_interval_ms"])
 
 
 @router.post("/generate", response_model=GenerateResponse, status_code=202)
@@ -72,28 +236,35 @@ async def generate_handwriting(
     stroke streaming.
 
     The actual inference runs lazily when the client connects to the
-    stream endpoint — no Celery task is dispatched for streaming jobs.
-    For batch/async jobs, use the Celery worker path instead.
+    stream endpoint: in this process by default, or on a Celery worker
+    (relayed through Redis) when STREAM_MODE=distributed.
     """
-    # Periodic cleanup of expired/stale jobs
-    _cleanup_old_jobs()
+    _check_style(request.app, request_body.style_id)
+    _check_admission(request.app, request_body.text)
 
     job_id = str(uuid.uuid4())
 
-    # Store job metadata
-    _jobs[job_id] = {
-        "status": "queued",
-        "created_at": time.monotonic(),
-        "text": request_body.text,
-        "style_id": request_body.style_id,
-        "params": request_body.params.model_dump(),
-        "paper_texture": request_body.paper_texture.value,
-        "ink_color": request_body.ink_color.value,
-        "font_size": request_body.font_size.value,
-        "progress": 0.0,
-        "error": None,
-        "result": None,
-    }
+    # Store job metadata (the store expires it after the TTL)
+    await _job_store(request.app).create(
+        job_id,
+        {
+            "status": "queued",
+            "created_at": time.time(),
+            "text": request_body.text,
+            "style_id": request_body.style_id,
+            "params": request_body.params.model_dump(),
+            "paper_texture": request_body.paper_texture.value,
+            "ink_color": request_body.ink_color.value,
+            "font_size": request_body.font_size.value,
+            "pacing": request_body.pacing.value if request_body.pacing else None,
+            "framing": request_body.framing.model_dump() if request_body.framing else None,
+            "seed": request_body.seed,
+            "profile": _profile_requested(request),
+            "progress": 0.0,
+            "error": None,
+            "result": None,
+        },
+    )
 
     # Build the WebSocket URL (matches the /api/ws/{job_id} route)
     base_url = str(request.base_url).rstrip("/")
@@ -126,80 +297,123 @@ async def websocket_stream(websocket: WebSocket, job_id: str) -> None:
 
         {"type": "stroke", "index": 0, "data": {"dx": 8.2, "dy": -0.3, "p1": 1, "p2": 0, "p3": 0}}
 
+    With framing enabled, strokes arrive grouped as column arrays instead:
+
+        {"type": "frame", "index": 0, "count": 32, "data": {"dx": [...], "dy": [...], "pen": [...]}}
+
     The stream ends with a completion event:
 
         {"type": "complete", "total_strokes": 1247}
-    """
-    await websocket.accept()
 
-    if job_id not in _jobs:
-        await websocket.send_json({"type": "error", "message": f"Job {job_id} not found"})
-        await websocket.close(code=4004)
-        return
+    When the server is overloaded the stream is refused with an error event
+    carrying retry_after (seconds) and close code 4029; the job stays
+    queued, so the client can reconnect once that time has passed.
 
-    job = _jobs[job_id]
+    Clients that offer the "inkforge.strokes.v1" subprotocol get a JSON
+    header message, then frames as packed binary messages (see
+    app.services.stroke_codec). Complete/error events stay JSON.
+    """
+    binary = STROKE_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=STROKE_SUBPROTOCOL if binary else None)
 
-    # Get the engine from app state (loaded during lifespan)
-    engine = getattr(websocket.app.state, "engine", None)
+    if binary:
+        await websocket.send_json(header_message())
 
-    if engine is None:
-        await websocket.send_json({"type": "error", "message": "Engine unavailable"})
-        await websocket.close(code=4003)
+    store = _job_store(websocket.app)
+    job = await store.get(job_id)
+
+    if job is None:
+        await websocket.send_json({"type": "error", "message": f"Job {job_id} not found"})
+        await websocket.close(code=4004)
         return
 
-    if not engine.is_ready:
-        await websocket.send_json(
-            {"type": "error", "message": "Engine not ready — model still loading"}
-        )
+    # The engine is loaded during lifespan (not needed in distributed mode)
+    unavailable = _engine_unavailable(websocket.app)
+    if unavailable is not None:
+        await websocket.send_json({"type": "error", "message": unavailable})
         await websocket.close(code=4003)
         return
 
     # Mark job as processing
-    job["status"] = "processing"
+    await store.update(job_id, status="processing")
 
     # Wrap the generator in a task so we can cancel it on disconnect
     gen_task: asyncio.Task | None = None
+    profile = _job_profile(job_id, job)
 
     try:
         stroke_count = 0
 
         async def _run_stream():
             nonlocal stroke_count
-            async for event in engine.stream_generate(
-                text=job["text"],
-                style_id=job["style_id"],
-                params=job["params"],
-            ):
-                await websocket.send_json(event)
+            events = _job_events(websocket.app, job_id, job, force_framing=binary, profile=profile)
+            async for event in events:
+                started = time.perf_counter()
+                if binary and event.get("type") == "frame":
+                    payload = encode_frame(event)
+                    serialized = time.perf_counter()
+                    SERIALIZATION_TIME.observe(serialized - started, format="binary")
+                    await websocket.send_bytes(payload)
+                else:
+                    # Same encoding as send_json(), timed separately from the send
+                    payload = json.dumps(event, separators=(",", ":"), ensure_ascii=False)
+                    serialized = time.perf_counter()
+                    SERIALIZATION_TIME.observe(serialized - started, format="json")
+                    await websocket.send_text(payload)
+                if profile is not None:
+                    profile.add("serialize", started, serialized)
+                    profile.add("send", serialized)
 
                 if event.get("type") == "stroke":
                     stroke_count += 1
+                elif event.get("type") == "frame":
+                    stroke_count += event["count"]
                 elif event.get("type") == "complete":
-                    job["status"] = "complete"
-                    job["result"] = {
-                        "total_strokes": event.get("total_strokes", stroke_count),
-                    }
+                    await store.update(
+                        job_id,
+                        status="complete",
+                        result={"total_strokes": event.get("total_strokes", stroke_count)},
+                    )
+                elif event.get("type") == "error":
+                    # Relayed worker failure or relay timeout
+                    await store.update(job_id, status="failed", error=event.get("message"))
 
         gen_task = asyncio.create_task(_run_stream())
         await gen_task
 
-        # If we exited without a complete event, mark accordingly
-        if job["status"] != "complete":
-            job["status"] = "complete"
+        # If we exited without a complete (or error) event, mark accordingly
+        current = await store.get(job_id)
+        if current is not None and current["status"] == "failed":
+            await websocket.close(code=4000)
+            return
+        if current is not None and current["status"] != "complete":
+            await store.update(job_id, status="complete")
 
         await websocket.close(code=1000)
 
+    except AdmissionRejectedError as e:
+        # Overloaded: the job stays queued, so the client can reconnect later
+        logger.warning(f"Job {job_id}: rejected, retry after {e.retry_after}s ({e})")
+        await store.update(job_id, status="queued")
+
+        try:
+            await websocket.send_json(
+                {"type": "error", "message": str(e), "retry_after": e.retry_after}
+            )
+            await websocket.close(code=4029, reason=f"retry-after={e.retry_after}")
+        except Exception:
+            pass
+
     except WebSocketDisconnect:
         logger.info(f"Job {job_id}: client disconnected")
-        job["status"] = "cancelled"
+        await store.update(job_id, status="cancelled")
         # Cancel the running generation task so the engine stops work
         if gen_task is not None and not gen_task.done():
             gen_task.cancel()
 
     except Exception as e:
         logger.error(f"Job {job_id} failed: {e}")
-        job["status"] = "failed"
-        job["error"] = str(e)
+        await store.update(job_id, status="failed", error=str(e))
 
         try:
             await websocket.send_json({"type": "error", "message": str(e)})
@@ -207,6 +421,9 @@ async def websocket_stream(websocket: WebSocket, job_id: str) -> None:
         except Exception:
             pass
 
+    finally:
+        await _save_trace(job_id, profile)
+
 
 @router.get("/stream/{job_id}")
 async def stream_strokes(job_id: str, request: Request) -> StreamingResponse:
@@ -222,25 +439,22 @@ async def stream_strokes(job_id: str, request: Request) -> StreamingResponse:
 
         data: {"type": "complete", "total_strokes": 1247, ...}
     """
-    if job_id not in _jobs:
-        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    store = _job_store(request.app)
+    job = await store.get(job_id)
 
-    job = _jobs[job_id]
-
-    # Get the engine from app state (loaded during lifespan)
-    engine = getattr(request.app.state, "engine", None)
-
-    if engine is None:
-        raise HTTPException(status_code=503, detail="Engine unavailable")
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
 
-    if not engine.is_ready:
-        raise HTTPException(
-            status_code=503,
-            detail="Engine not ready — model still loading",
-        )
+    # The engine is loaded during lifespan (not needed in distributed mode)
+    unavailable = _engine_unavailable(request.app)
+    if unavailable is not None:
+        raise HTTPException(status_code=503, detail=unavailable)
+    _check_admission(request.app, job["text"])
 
     # Mark job as processing
-    job["status"] = "processing"
+    await store.update(job_id, status="processing")
+
+    profile = _job_profile(job_id, job)
 
     async def event_generator():
         """
@@ -254,36 +468,54 @@ async def stream_strokes(job_id: str, request: Request) -> StreamingResponse:
         try:
             stroke_count = 0
 
-            async for event in engine.stream_generate(
-                text=job["text"],
-                style_id=job["style_id"],
-                params=job["params"],
-            ):
+            async for event in _job_events(request.app, job_id, job, profile=profile):
                 # Check if client disconnected
                 if await request.is_disconnected():
                     logger.info(f"Job {job_id}: client disconnected")
                     break
 
                 # Format as SSE
+                started = time.perf_counter()
                 event_data = json.dumps(event, ensure_ascii=False)
+                serialized = time.perf_counter()
+                SERIALIZATION_TIME.observe(serialized - started, format="json")
                 yield f"data: {event_data}\n\n"
+                if profile is not None:
+                    profile.add("serialize", started, serialized)
+                    profile.add("send", serialized)
 
                 if event.get("type") == "stroke":
                     stroke_count += 1
+                elif event.get("type") == "frame":
+                    stroke_count += event["count"]
                 elif event.get("type") == "complete":
-                    job["status"] = "complete"
-                    job["result"] = {
-                        "total_strokes": event.get("total_strokes", stroke_count),
-                    }
+                    await store.update(
+                        job_id,
+                        status="complete",
+                        result={"total_strokes": event.get("total_strokes", stroke_count)},
+                    )
+                elif event.get("type") == "error":
+                    # Relayed worker failure or relay timeout
+                    await store.update(job_id, status="failed", error=event.get("message"))
+
+            # If we exited without a complete (or error) event, mark accordingly
+            current = await store.get(job_id)
+            if current is not None and current["status"] not in ("complete", "failed"):
+                await store.update(job_id, status="complete")
+
+        except AdmissionRejectedError as e:
+            # Lost the race since the pre-check: the job stays queued for a retry
+            logger.warning(f"Job {job_id}: rejected, retry after {e.retry_after}s ({e})")
+            await store.update(job_id, status="queued")
 
-            # If we exited without a complete event, mark accordingly
-            if job["status"] != "complete":
-                job["status"] = "complete"
+            error_event = json.dumps(
+                {"type": "error", "message": str(e), "retry_after": e.retry_after}
+            )
+            yield f"data: {error_event}\n\n"
 
         except Exception as e:
             logger.error(f"Job {job_id} failed: {e}")
-            job["status"] = "failed"
-            job["error"] = str(e)
+            await store.update(job_id, status="failed", error=str(e))
 
             error_event = json.dumps(
                 {
@@ -293,6 +525,9 @@ async def stream_strokes(job_id: str, request: Request) -> StreamingResponse:
             )
             yield f"data: {error_event}\n\n"
 
+        finally:
+            await _save_trace(job_id, profile)
+
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
@@ -305,18 +540,17 @@ async def stream_strokes(job_id: str, request: Request) -> StreamingResponse:
 
 
 @router.get("/job/{job_id}", response_model=JobStatusResponse)
-async def get_job_status(job_id: str) -> JobStatusResponse:
+async def get_job_status(job_id: str, request: Request) -> JobStatusResponse:
     """
     Poll job status.
 
     Returns the current state of a generation job:
     queued → processing → complete | failed
     """
-    if job_id not in _jobs:
+    job = await _job_store(request.app).get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
 
-    job = _jobs[job_id]
-
     return JobStatusResponse(
         job_id=job_id,
         status=job["status"],
@@ -2,7 +2,7 @@
 INKFORGE — GET /health
 
 LLM-aware service health check. Reports engine status, VRAM usage,
-quantization config, and inference availability.
+quantization config, inference availability and admission queue state.
 """
 
 from __future__ import annotations
@@ -11,6 +11,8 @@ import logging
 
 from fastapi import APIRouter, Request
 
+from app.config import settings
+
 logger = logging.getLogger("inkforge.routes.health")
 
 router = APIRouter()
@@ -29,6 +31,14 @@ async def health_check(request: Request) -> dict:
     # Get engine from app state (set during lifespan)
     engine = getattr(request.app.state, "engine", None)
 
+    if engine is None and settings.stream_mode == "distributed":
+        return {
+            "status": "healthy",
+            "model_loaded": False,
+            "stream_mode": "distributed",
+            "detail": "Inference runs on Celery workers",
+        }
+
     if engine is None:
         return {
             "status": "starting",
@@ -70,5 +80,14 @@ async def health_check(request: Request) -> dict:
             "active_requests": status.active_requests,
             "total_requests_served": status.total_requests_served,
             "uptime_seconds": status.uptime_seconds,
+            "stroke_budget_exceeded": status.stroke_budget_exceeded,
+        },
+        "admission": {
+            "queue_depth": status.queue_depth,
+            "queue_wait_ms_p50": status.queue_wait_ms_p50,
+            "queue_wait_ms_p95": status.queue_wait_ms_p95,
+            "expected_wait_ms": status.expected_wait_ms,
+            "admitted": status.admitted_requests,
+            "rejected": status.rejected_requests,
         },
     }
@@ -0,0 +1,21 @@
+"""
+INKFORGE — GET /metrics
+
+Prometheus scrape endpoint: request latencies, decode step timings,
+throughput, cache hit ratios and admission queue depth.
+"""
+
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.services.metrics import CONTENT_TYPE, REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Render every metric of this process in the Prometheus text format."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -6,8 +6,15 @@ Includes LLM infrastructure settings for VRAM management, quantization,
 and inference engine backend selection.
 """
 
+import logging
+
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
+from app.ml.profiling import PROFILE_MODES
+
+logger = logging.getLogger("inkforge.config")
+
 
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
@@ -25,34 +32,90 @@ class Settings(BaseSettings):
     # Redis
     redis_url: str = "redis://localhost:6379/0"
 
+    # Job store: "memory" (single process) or "redis" (shared across API processes)
+    job_store_backend: str = "memory"
+    job_ttl_seconds: int = 3600
+    max_jobs: int = 500  # In-memory backend capacity
+
+    # Stream mode: "local" (engine in the API process) or "distributed"
+    # (Celery workers generate, events are relayed through Redis)
+    stream_mode: str = "local"
+    stream_relay_timeout_s: float = 30.0  # Give up on a silent worker after this long
+    worker_metrics_port: int = 0  # Celery worker /metrics port (0 = no metrics server)
+
     # --- LLM / Model Infrastructure ---
-    # Engine backend: "lstm" for real model, "mock" for development without model
+    # Engine backend: "lstm" for real model, "onnx" for the same model under
+    # ONNX Runtime (CPU), "mock" for development without model
     # The engine will automatically fall back to mock if no checkpoint is found
     engine_backend: str = "lstm"
+    onnx_num_threads: int = 0  # ONNX Runtime intra-op threads (0 = onnxruntime default)
+    onnx_cache_dir: str = ""  # Where exported ONNX graphs go ("" = next to the checkpoint)
     model_name: str = "inkforge-lstm-mdn-v1"
     model_checkpoint_path: str = "checkpoints/lstm_mdn_v1_best.pt"
+    compiled_decode: bool = True  # Prefer <checkpoint>.decode.pts when present
     device: str = "cpu"  # "cpu" or "cuda"
 
     # GPU / VRAM Management
     gpu_memory_fraction: float = 0.85  # Fraction of total VRAM to allocate
     quantization_bits: int = 0  # 0=fp16 (no quant), 4=int4, 8=int8
+    quantization_max_nll_delta: float = 0.05  # Max held-out NLL increase accepted for int8
     kv_cache_size_gb: float = 2.0  # KV cache allocation in GB
     max_seq_len: int = 2048  # Maximum sequence length for generation
 
     # Inference
     max_concurrent_requests: int = 4  # Max parallel inference requests
+    admission_max_queue: int = 32  # Streams waiting for a slot before 429 / close 4029
+    admission_max_wait_s: float = 10.0  # Longest expected or actual queue wait accepted
+    admission_policy: str = "sjf"  # "sjf" (cheapest first, with aging) | "fifo"
+    admission_aging_half_life_s: float = 1.0  # Queued cost counts half per this much waiting
+    decode_workers: int = 1  # Decode threads sharing the model (batch slots split across them)
+    decode_threads_per_worker: int = 0  # torch intra-op threads per worker (0 = cores / workers)
+    decode_queue_size: int = 64  # Streams waiting for a decode slot (0 = unbounded)
     stream_chunk_delay_ms: int = 20  # Per-stroke streaming delay (ms)
+    stream_pacing: str = "paced"  # "unpaced" | "paced" | "adaptive"
+    batch_decode_size: int = 32  # Sequences decoded together by batch tasks
+    max_strokes_per_char: int = 50  # Hard cap on decode steps per input character
+    stroke_budget_multiplier: float = 1.5  # Per-char step cap = training p99 × this (0 = off)
+
+    # Persistent word stroke store (memory-mapped; empty = disabled)
+    # Build with: python scripts/build_stroke_store.py
+    stroke_store_dir: str = ""
+
+    # Word stroke cache of document generation (MiB; 0 = disabled)
+    stroke_cache_mb: int = 64
+
+    # Document generation worker processes (0 = decode in the calling process)
+    document_workers: int = 0
+
+    # Result cache: finished generations replayed for identical requests
+    result_cache_mb: int = 64  # In-memory capacity (compressed); 0 = disabled
+    result_cache_spill: str = ""  # "" (memory only) | "disk" | "redis"
+    result_cache_dir: str = "./cache/results"  # Disk spill directory
+    result_cache_ttl_seconds: int = 86400  # Redis spill expiry
 
     # Export
     export_dir: str = "./exports"
     export_dpi: int = 300
 
+    # Request profiling: "off", "header" (X-Inkforge-Profile: 1) or "all"
+    profile_requests: str = "off"
+    profile_trace: bool = False  # Also write a Chrome trace per profiled request to export_dir
+
     # CORS
     cors_origins: list[str] = [
         "http://localhost:5173",
         "http://localhost:3000",
     ]
 
+    @field_validator("profile_requests")
+    @classmethod
+    def _check_profile_requests(cls, value: str) -> str:  # noqa: N805
+        """Fall back to "off" for unknown profiling modes."""
+        if value not in PROFILE_MODES:
+            logger.warning(f"Unknown profile mode: {value}, using off")
+            return "off"
+        return value
+
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8",
@@ -19,6 +19,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
 from app.ml.llm_engine import EngineConfig, LLMEngine
+from app.services.job_store import create_job_store
 
 # --- Logging Setup ---
 logging.basicConfig(
@@ -41,12 +42,15 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
 
     On startup:
         - Initialize the LLMEngine singleton
-        - Load model weights into VRAM (or mock in dev mode)
+        - Load model weights into VRAM (or mock in dev mode); skipped with
+          STREAM_MODE=distributed, where Celery workers hold the model
         - Store engine reference on app.state for route access
+        - Open the job store (in-memory or Redis) on app.state
 
     On shutdown:
         - Release VRAM
         - Clean up model resources
+        - Close the job store
 
     This ensures the 15+ GB model is loaded ONCE, not per-request.
     """
@@ -55,19 +59,53 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     config = EngineConfig(
         model_name=settings.model_name,
         checkpoint_path=settings.model_checkpoint_path,
+        compiled_decode=settings.compiled_decode,
         device=settings.device,
         engine_backend=settings.engine_backend,
+        onnx_num_threads=settings.onnx_num_threads,
+        onnx_cache_dir=settings.onnx_cache_dir,
         gpu_memory_fraction=settings.gpu_memory_fraction,
         quantization_bits=settings.quantization_bits,
+        quantization_max_nll_delta=settings.quantization_max_nll_delta,
         kv_cache_size_gb=settings.kv_cache_size_gb,
         max_seq_len=settings.max_seq_len,
         max_concurrent_requests=settings.max_concurrent_requests,
+        admission_max_queue=settings.admission_max_queue,
+        admission_max_wait_s=settings.admission_max_wait_s,
+        admission_policy=settings.admission_policy,
+        admission_aging_half_life_s=settings.admission_aging_half_life_s,
+        decode_workers=settings.decode_workers,
+        decode_threads_per_worker=settings.decode_threads_per_worker,
+        decode_queue_size=settings.decode_queue_size,
         stream_chunk_delay_ms=settings.stream_chunk_delay_ms,
+        stream_pacing=settings.stream_pacing,
+        stroke_store_dir=settings.stroke_store_dir,
+        stroke_cache_mb=settings.stroke_cache_mb,
+        document_workers=settings.document_workers,
+        batch_decode_size=settings.batch_decode_size,
+        max_strokes_per_char=settings.max_strokes_per_char,
+        stroke_budget_multiplier=settings.stroke_budget_multiplier,
+        result_cache_mb=settings.result_cache_mb,
+        result_cache_spill=settings.result_cache_spill,
+        result_cache_dir=settings.result_cache_dir,
+        result_cache_ttl_seconds=settings.result_cache_ttl_seconds,
+        redis_url=settings.redis_url,
+    )
+
+    app.state.job_store = create_job_store(
+        backend=settings.job_store_backend,
+        redis_url=settings.redis_url,
+        ttl_seconds=settings.job_ttl_seconds,
+        max_jobs=settings.max_jobs,
     )
 
     try:
-        await engine.initialize_model(config)
-        app.state.engine = engine
+        if settings.stream_mode == "distributed":
+            # Streams are generated by Celery workers and relayed: stay model-free
+            logger.info("Stream mode: distributed — model not loaded in the API process")
+        else:
+            await engine.initialize_model(config)
+            app.state.engine = engine
 
         logger.info("FastAPI application ready — accepting requests")
 
@@ -79,6 +117,10 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             await engine.shutdown()
         except Exception as e:
             logger.error(f"Error during engine shutdown: {e}")
+        await app.state.job_store.close()
+        relay = getattr(app.state, "stream_relay", None)
+        if relay is not None:
+            await relay.close()
         logger.info("Shutdown complete")
 
 
@@ -109,10 +151,11 @@ app.add_middleware(
 )
 
 # --- Routes ---
-from app.api.routes import generate, health  # noqa: E402
+from app.api.routes import generate, health, metrics  # noqa: E402
 
 app.include_router(generate.router, prefix="/api", tags=["generation"])
 app.include_router(health.router, tags=["health"])
+app.include_router(metrics.router, tags=["metrics"])
 
 # Optional: register export and styles routes when ready
 # from app.api.routes import export, styles
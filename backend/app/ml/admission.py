@@ -0,0 +1,294 @@
+"""
+INKFORGE — Admission Control
+
+Decides, per streaming request, whether to start it now, queue it, or turn
+it away, so a burst cannot pile up connections that will never be served
+in time.
+
+Policy:
+    - Up to max_active requests run; the rest wait in a bounded queue.
+    - Each request's cost is its estimated stroke count: the caller's
+      estimate (the model's per-character training statistics), or else
+      characters × strokes per character, an EMA of completed requests.
+    - Freed slots go to the cheapest waiting request (shortest job first),
+      with aging: a request's cost counts half as much for every
+      aging_half_life_s it has waited, so a long job overtakes any stream
+      of short ones after a bounded wait. policy="fifo" serves in arrival
+      order instead.
+    - The expected wait of a newcomer is the work ahead of it (queued
+      costs it would not overtake plus half the running ones) × seconds
+      per stroke (EMA) spread over the max_active slots. A request is
+      rejected up front when the queue is full or that wait exceeds
+      max_wait_s, and rejected later if it has already waited max_wait_s
+      without starting.
+
+Rejections raise AdmissionRejectedError carrying a retry-after hint, which
+the routes turn into HTTP 429 / WebSocket close 4029.
+
+Usage:
+    controller = AdmissionController(max_active=4, max_queue=32, max_wait_s=10.0)
+    async with controller.admit(len(text)):
+        ...  # generate
+    controller.record(len(text), strokes, seconds)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+# Weight of the newest completed request in the strokes/char and seconds/stroke EMAs
+EMA_ALPHA = 0.1
+
+# Queue wait samples kept for the percentiles reported on /health
+WAIT_WINDOW = 1000
+
+# Orders in which queued requests are started
+POLICIES = ("sjf", "fifo")
+
+
+class AdmissionRejectedError(RuntimeError):
+    """Raised when a request is turned away; retry_after is in whole seconds."""
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    """One request's place in the admission queue."""
+
+    __slots__ = ("cost", "enqueued_at", "future")
+
+    def __init__(self, cost: float) -> None:
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future | None = None  # Set while queued
+
+
+class AdmissionController:
+    """
+    Bounded admission queue with cost-based, deadline-aware rejection.
+
+    Args:
+        max_active: Requests generating at once.
+        max_queue: Requests allowed to wait for a slot (0 = none may wait).
+        max_wait_s: Longest expected or actual queue wait accepted.
+        strokes_per_char: Initial strokes-per-character estimate.
+        seconds_per_stroke: Initial per-stroke service time estimate.
+        policy: "sjf" (cheapest first, with aging) or "fifo".
+        aging_half_life_s: Wait after which a queued request's cost counts half.
+
+    Raises:
+        ValueError: If policy is unknown.
+    """
+
+    def __init__(
+        self,
+        max_active: int,
+        max_queue: int = 32,
+        max_wait_s: float = 10.0,
+        strokes_per_char: float = 12.0,
+        seconds_per_stroke: float = 0.02,
+        policy: str = "sjf",
+        aging_half_life_s: float = 1.0,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown admission policy {policy!r} (expected one of {POLICIES})")
+        self.policy = policy
+        self.aging_half_life_s = aging_half_life_s
+        self.max_active = max(1, max_active)
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.strokes_per_char = strokes_per_char
+        self.seconds_per_stroke = seconds_per_stroke
+
+        self._waiting: list[_Ticket] = []  # Arrival order
+        self._running: set[_Ticket] = set()
+        self._waits: deque[float] = deque(maxlen=WAIT_WINDOW)
+
+        # Counters
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting for a slot."""
+        return len(self._waiting)
+
+    # --------------------------------------------------------
+    # Estimates
+    # --------------------------------------------------------
+
+    def estimate_cost(self, num_chars: int) -> float:
+        """Estimated strokes for a text of num_chars characters."""
+        return max(1, num_chars) * self.strokes_per_char
+
+    def expected_wait(self, cost: float | None = None) -> float:
+        """
+        Expected queue wait of a request arriving now, in seconds.
+
+        Args:
+            cost: The newcomer's cost; under SJF only queued requests it
+                would not overtake count. None counts the whole queue.
+        """
+        if len(self._running) < self.max_active and not self._waiting:
+            return 0.0
+        now = time.monotonic()
+        queued = sum(
+            t.cost
+            for t in self._waiting
+            if cost is None or self.policy == "fifo" or self._priority(t, now) <= cost
+        )
+        ahead = queued + sum(t.cost for t in self._running) / 2
+        return ahead * self.seconds_per_stroke / self.max_active
+
+    def _priority(self, ticket: _Ticket, now: float) -> float:
+        """Aged cost of a queued request (lower starts first)."""
+        if self.policy == "fifo":
+            return ticket.enqueued_at
+        if self.aging_half_life_s <= 0:
+            return ticket.cost
+        return ticket.cost * 0.5 ** ((now - ticket.enqueued_at) / self.aging_half_life_s)
+
+    def record(self, num_chars: int, strokes: int, seconds: float) -> None:
+        """
+        Fold a completed request into the cost estimates.
+
+        Args:
+            num_chars: Characters of the request's text.
+            strokes: Strokes it produced.
+            seconds: Time from admission to completion.
+        """
+        if num_chars <= 0 or strokes <= 0:
+            return
+        self.strokes_per_char += EMA_ALPHA * (strokes / num_chars - self.strokes_per_char)
+        self.seconds_per_stroke += EMA_ALPHA * (seconds / strokes - self.seconds_per_stroke)
+
+    # --------------------------------------------------------
+    # Admission
+    # --------------------------------------------------------
+
+    def check(self, num_chars: int, cost: float | None = None) -> None:
+        """
+        Raise if a request arriving now would be rejected (nothing is reserved).
+
+        Args:
+            num_chars: Characters of the request's text.
+            cost: Estimated strokes, if the caller has a better estimate.
+
+        Raises:
+            AdmissionRejectedError: If the queue is full or the expected wait is too long.
+        """
+        if len(self._running) < self.max_active and not self._waiting:
+            return
+
+        wait = self.expected_wait(cost if cost is not None else self.estimate_cost(num_chars))
+        if len(self._waiting) >= self.max_queue:
+            raise AdmissionRejectedError(
+                f"Server busy: {len(self._waiting)} requests queued", self._retry_after(wait)
+            )
+        if wait > self.max_wait_s:
+            raise AdmissionRejectedError(
+                f"Server busy: expected queue wait {wait:.1f}s exceeds {self.max_wait_s:.1f}s",
+                self._retry_after(wait),
+            )
+
+    @asynccontextmanager
+    async def admit(self, num_chars: int, cost: float | None = None) -> AsyncIterator[None]:
+        """
+        Hold a generation slot for the duration of the block.
+
+        Args:
+            num_chars: Characters of the request's text.
+            cost: Estimated strokes; defaults to num_chars × strokes_per_char.
+
+        Raises:
+            AdmissionRejectedError: If the request is rejected, up front or
+                after waiting max_wait_s.
+        """
+        try:
+            self.check(num_chars, cost)
+        except AdmissionRejectedError:
+            self.rejected += 1
+            raise
+
+        ticket = _Ticket(cost if cost is not None else self.estimate_cost(num_chars))
+        if len(self._running) < self.max_active and not self._waiting:
+            self._running.add(ticket)
+        else:
+            ticket.future = asyncio.get_running_loop().create_future()
+            self._waiting.append(ticket)
+            await self._wait(ticket)
+
+        self.admitted += 1
+        self._waits.append(time.monotonic() - ticket.enqueued_at)
+        try:
+            yield
+        finally:
+            self._running.discard(ticket)
+            self._grant()
+
+    async def _wait(self, ticket: _Ticket) -> None:
+        """Wait until the ticket is granted a slot, or give up at the deadline."""
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.max_wait_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Granted just as we gave up: hand the slot on
+                self._running.discard(ticket)
+                self._grant()
+            else:
+                ticket.future.cancel()
+                self._waiting.remove(ticket)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected += 1
+            self.timed_out += 1
+            raise AdmissionRejectedError(
+                f"Server busy: not started within {self.max_wait_s:.1f}s",
+                self._retry_after(self.expected_wait()),
+            ) from None
+
+    def _grant(self) -> None:
+        """Start queued requests, lowest aged cost first, while slots are free."""
+        while self._waiting and len(self._running) < self.max_active:
+            now = time.monotonic()
+            ticket = min(self._waiting, key=lambda t: self._priority(t, now))
+            self._waiting.remove(ticket)
+            self._running.add(ticket)
+            ticket.future.set_result(None)
+
+    @staticmethod
+    def _retry_after(wait: float) -> int:
+        return max(1, math.ceil(wait))
+
+    # --------------------------------------------------------
+    # Introspection
+    # --------------------------------------------------------
+
+    def stats(self) -> dict[str, float | int | str]:
+        """Queue depth, wait-time percentiles (ms) and counters for /health."""
+        waits = np.array(self._waits) * 1000 if self._waits else np.zeros(1)
+        p50, p95 = np.percentile(waits, [50, 95])
+        return {
+            "queue_depth": self.queue_depth,
+            "active": len(self._running),
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "queue_wait_ms_p50": round(float(p50), 1),
+            "queue_wait_ms_p95": round(float(p95), 1),
+            "expected_wait_ms": round(self.expected_wait() * 1000, 1),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "strokes_per_char": round(self.strokes_per_char, 2),
+            "policy": self.policy,
+        }
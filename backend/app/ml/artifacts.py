@@ -0,0 +1,47 @@
+"""
+INKFORGE — Model Artifact Paths
+
+Where derived serving artifacts of a checkpoint live, and how artifacts
+built from a checkpoint recognize it. Kept free of torch imports so the
+engine can look for them before it knows whether PyTorch is installed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+
+class ArtifactExportError(RuntimeError):
+    """
+    A checkpoint cannot be turned into the artifact its backend serves.
+
+    Raised at startup (never answered with mock output): the configured
+    backend and checkpoint do not fit together.
+    """
+
+
+def decode_artifact_path(checkpoint_path: str | Path) -> Path:
+    """Where the compiled decode step of a checkpoint is (or would be) stored."""
+    checkpoint_path = Path(checkpoint_path)
+    return checkpoint_path.with_name(f"{checkpoint_path.stem}.decode.pts")
+
+
+def checkpoint_fingerprint(checkpoint_path: str | Path) -> str:
+    """
+    Content hash of a checkpoint.
+
+    Identifies the model across copies and renames, and changes when
+    training overwrites the file.
+
+    Args:
+        checkpoint_path: Checkpoint file.
+
+    Returns:
+        16 hex characters.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    with open(checkpoint_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,309 @@
+"""
+INKFORGE — Continuous Batching Scheduler
+
+Merges the active generation streams of concurrent requests into one
+[B, 1] model step, instead of decoding each request with batch size 1
+in its own thread.
+
+A pool of decode threads shares one read-only model. Each worker owns
+its batch of streams (and their decode states), and each step it:
+    1. Admits pending streams (up to max_batch_size)
+    2. Runs InferenceService.decode_step() on its active streams
+    3. Hands every stroke back to its request's event loop
+    4. Retires streams that finished or were cancelled
+
+Sequences join and leave a batch between steps, so a short request never
+waits for a long one to finish. Busy workers only take new streams when
+no worker is idle, so load spreads across the pool.
+
+Every worker pins torch's intra-op thread count on its own thread
+(threads_per_worker), so N workers use N × threads_per_worker cores
+instead of each op fanning out over every core. The pending queue is
+bounded (max_queue): past it, generate() raises BatcherFullError instead
+of queueing without limit.
+
+A batcher started before fork() (Celery's prefork pool loads the model in
+the parent) restarts its threads in the child on the child's first request.
+
+Usage:
+    batcher = ContinuousBatcher(inference_service, max_batch_size=4, num_workers=2)
+    batcher.start()
+    async for stroke in batcher.generate(text, style_id="neat_cursive"):
+        ...
+    batcher.stop()
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncGenerator
+from typing import Any
+
+from app.ml.profiling import RequestProfile
+
+logger = logging.getLogger("inkforge.batching")
+
+# Sentinel pushed onto a stream's queue once its sequence is finished
+_END = object()
+
+
+class BatcherFullError(RuntimeError):
+    """Raised by ContinuousBatcher.generate() when the pending queue is full."""
+
+
+class _Stream:
+    """One request's decode state plus its channel back to the event loop."""
+
+    __slots__ = ("state", "loop", "queue", "cancelled")
+
+    def __init__(self, state: Any, loop: asyncio.AbstractEventLoop) -> None:
+        self.state = state
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.cancelled = False
+
+    def emit(self, item: Any) -> None:
+        """Deliver an item to the consumer (called from the decode thread)."""
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        except RuntimeError:
+            # Event loop already closed — consumer is gone
+            self.cancelled = True
+
+
+class ContinuousBatcher:
+    """
+    Pool of continuous-batching decode loops shared by all real-model requests.
+
+    Args:
+        inference_service: Loaded InferenceService exposing begin_decode()
+            and decode_step().
+        max_batch_size: Maximum number of sequences a worker steps together.
+        num_workers: Decode threads, each with its own batch.
+        threads_per_worker: torch intra-op threads per worker (0 = leave torch's default).
+        max_queue: Streams allowed to wait for a batch slot (0 = unbounded).
+    """
+
+    def __init__(
+        self,
+        inference_service: Any,
+        max_batch_size: int = 4,
+        num_workers: int = 1,
+        threads_per_worker: int = 0,
+        max_queue: int = 0,
+    ) -> None:
+        self._service = inference_service
+        self._max_batch_size = max(1, max_batch_size)
+        self._num_workers = max(1, num_workers)
+        self._threads_per_worker = threads_per_worker
+        self._max_queue = max_queue
+
+        self._threads: list[threading.Thread] = []
+        self._pid: int | None = None  # Process the threads run in (None = not started)
+        self._reset()
+        self.steps_run = 0
+
+    def _reset(self) -> None:
+        """Fresh scheduling state (at construction, and in a forked child)."""
+        self._pending: deque[_Stream] = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._idle_workers = 0
+
+        # Introspection (one slot per worker, written only by that worker)
+        self._worker_active = [0] * self._num_workers
+
+    @property
+    def active_streams(self) -> int:
+        """Streams currently being decoded, across all workers."""
+        return sum(self._worker_active)
+
+    @property
+    def queue_depth(self) -> int:
+        """Streams waiting for a batch slot."""
+        return len(self._pending)
+
+    # --------------------------------------------------------
+    # Lifecycle
+    # --------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the decode worker threads."""
+        if self._pid == os.getpid():
+            return
+        self._stopping = False
+        self._pid = os.getpid()
+        self._threads = [
+            threading.Thread(
+                target=self._run, args=(worker,), name=f"inkforge-decode-{worker}", daemon=True
+            )
+            for worker in range(self._num_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(
+            f"Continuous batcher started (workers={self._num_workers}, "
+            f"max_batch_size={self._max_batch_size}, "
+            f"threads_per_worker={self._threads_per_worker or 'default'}, "
+            f"max_queue={self._max_queue or 'unbounded'})"
+        )
+
+    def stop(self) -> None:
+        """Stop the decode threads and fail any streams still in flight."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5.0)
+        self._threads = []
+        self._pid = None
+
+    def _ensure_running(self) -> None:
+        """
+        Restart the decode threads in a process forked after start().
+
+        Threads do not survive fork(): a Celery prefork child inherits the
+        parent's started batcher with no thread left to consume its queue
+        (and possibly a lock held by a parent thread), so the child starts
+        over with its own state and threads.
+        """
+        if self._pid is None:
+            raise RuntimeError("Batcher not started — call start() first")
+        if self._pid == os.getpid():
+            return
+        logger.info(f"Decode threads lost to fork() — restarting them in pid {os.getpid()}")
+        self._threads = []
+        self._pid = None
+        self._reset()
+        self.start()
+
+    # --------------------------------------------------------
+    # Request API
+    # --------------------------------------------------------
+
+    async def generate(
+        self,
+        text: str,
+        style_id: str | int = "neat_cursive",
+        temperature: float = 0.4,
+        max_strokes: int = 2000,
+        seed: int | None = None,
+        profile: RequestProfile | None = None,
+    ) -> AsyncGenerator[tuple[float, float, int, int, int], None]:
+        """
+        Submit a request and yield its strokes as the batch produces them.
+
+        Args:
+            text: Input text string.
+            style_id: Style preset name or index.
+            temperature: Sampling temperature τ.
+            max_strokes: Maximum number of strokes per character.
+            seed: Sampling seed; the request's strokes do not depend on
+                which other requests share its batch steps.
+            profile: Timers of a profiled request (charged with its decode phases).
+
+        Yields:
+            (Δx, Δy, p1, p2, p3) stroke tuples.
+
+        Raises:
+            BatcherFullError: If max_queue streams are already waiting.
+        """
+        self._ensure_running()
+        if self._max_queue and len(self._pending) >= self._max_queue:
+            raise BatcherFullError(f"Decode queue full ({self._max_queue} streams waiting)")
+
+        started = time.perf_counter()
+        state = self._service.begin_decode(
+            text,
+            style_id=style_id,
+            temperature=temperature,
+            max_strokes=max_strokes,
+            seed=seed,
+        )
+        if profile is not None:
+            profile.add("prepare", started)
+            state.profile = profile
+        if state.finished:
+            return
+
+        stream = _Stream(state, asyncio.get_running_loop())
+        with self._cond:
+            self._pending.append(stream)
+            self._cond.notify()
+
+        try:
+            while True:
+                item = await stream.queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Client disconnect / early exit: the decode thread drops it next step
+            stream.cancelled = True
+
+    # --------------------------------------------------------
+    # Decode thread
+    # --------------------------------------------------------
+
+    def _run(self, worker: int) -> None:
+        """Decode loop of one worker: one batched model step per iteration."""
+        if self._threads_per_worker > 0:
+            import torch
+
+            # Set from the worker's own thread: OpenMP builds apply it per calling thread
+            torch.set_num_threads(self._threads_per_worker)
+
+        active: list[_Stream] = []
+
+        while True:
+            with self._cond:
+                while not self._pending and not active and not self._stopping:
+                    self._idle_workers += 1
+                    self._cond.wait()
+                    self._idle_workers -= 1
+                if self._stopping:
+                    break
+                # A busy worker leaves new streams to idle ones
+                if not active or not self._idle_workers:
+                    while self._pending and len(active) < self._max_batch_size:
+                        active.append(self._pending.popleft())
+
+            active = [stream for stream in active if not stream.cancelled]
+            self._worker_active[worker] = len(active)
+            if not active:
+                continue
+
+            try:
+                strokes = self._service.decode_step([stream.state for stream in active])
+            except Exception as e:
+                logger.error(f"Batched decode step failed (batch={len(active)}): {e}")
+                for stream in active:
+                    stream.emit(e)
+                active = []
+                continue
+
+            self.steps_run += 1
+            still_active = []
+            for stream, stroke in zip(active, strokes, strict=True):
+                stream.emit(stroke)
+                if stream.state.finished:
+                    stream.emit(_END)
+                else:
+                    still_active.append(stream)
+            active = still_active
+
+        # Shutdown: fail everything still waiting
+        error = RuntimeError("Decode batcher stopped")
+        with self._cond:
+            active.extend(self._pending)
+            self._pending.clear()
+        for stream in active:
+            stream.emit(error)
+        self._worker_active[worker] = 0
@@ -0,0 +1,272 @@
+"""
+INKFORGE — Compiled Decode Step
+
+Exports the per-stroke work of InferenceService.decode_step() — one model
+step, MDN sampling and denormalization — as a single traced TorchScript
+module, so each stroke is one graph call instead of a few dozen Python-level
+tensor ops and module calls.
+
+Artifact (<checkpoint>.decode.pts):
+    forward(chars, style_proj, prev_stroke, h, c, temperature, uniform, normal)
+        → (stroke [B, 5], h, c)
+    style_projection(style_z) → [B, hidden]
+    buffers: preset_styles (W_style·z per preset), style_embeddings,
+             stroke_mean, stroke_std
+    extra file "inkforge.json": format version, model config, stroke stats
+
+The random draws stay outside the graph (sampling_noise() with the
+per-request generators), so a seeded request gives the same strokes with
+or without the compiled step.
+
+Build with: python scripts/export_decode_step.py --checkpoint ...
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+import torch
+import torch.nn as nn
+
+from .model import HandwritingLSTM
+
+# Name of the metadata entry stored alongside the TorchScript graph
+METADATA_FILE = "inkforge.json"
+
+# Bump when the forward() signature or the metadata layout changes
+DECODE_FORMAT_VERSION = 1
+
+
+class DecodeStep(nn.Module):
+    """One fused decode step of a HandwritingLSTM: step() + sampling + denormalization."""
+
+    def __init__(
+        self,
+        model: HandwritingLSTM,
+        style_embeddings: torch.Tensor,
+        stroke_mean: torch.Tensor,
+        stroke_std: torch.Tensor,
+    ) -> None:
+        """
+        Args:
+            model: HandwritingLSTM in eval mode (float or int8 serving copy).
+            style_embeddings: Style preset embeddings [num_presets, style_dim].
+            stroke_mean: Stroke delta mean [2].
+            stroke_std: Stroke delta std [2].
+        """
+        super().__init__()
+        self.model = model
+        with torch.no_grad():
+            self.register_buffer("char_table", model.char_projection_table().clone())
+            self.register_buffer("preset_styles", model.style_projection(style_embeddings))
+        self.register_buffer("style_embeddings", style_embeddings.clone())
+        self.register_buffer("stroke_mean", stroke_mean.clone())
+        self.register_buffer("stroke_std", stroke_std.clone())
+
+    def forward(
+        self,
+        chars: torch.Tensor,
+        style_proj: torch.Tensor,
+        prev_stroke: torch.Tensor,
+        h: torch.Tensor,
+        c: torch.Tensor,
+        temperature: torch.Tensor,
+        uniform: torch.Tensor,
+        normal: torch.Tensor,
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Advance B sequences by one stroke.
+
+        Args:
+            chars: Current character of each sequence [B].
+            style_proj: W_style·z per sequence [B, hidden].
+            prev_stroke: Previous strokes [B, 5].
+            h: LSTM hidden state [num_layers, B, hidden].
+            c: LSTM cell state [num_layers, B, hidden].
+            temperature: Sampling temperature per sequence [B].
+            uniform: Uniform draws [B, 2] (see sampling_noise).
+            normal: Normal draws [B, 2].
+
+        Returns:
+            Tuple of (stroke [B, 5] with denormalized Δx/Δy, h, c).
+        """
+        char_proj = self.char_table.index_select(0, chars)
+        mdn_params, pen_logits, (h, c) = self.model.step(char_proj, style_proj, prev_stroke, (h, c))
+        sampled = self.model.sample_from_noise(mdn_params, pen_logits, temperature, uniform, normal)
+        stroke = torch.cat([sampled[:, :2] * self.stroke_std + self.stroke_mean, sampled[:, 2:]], 1)
+        return stroke, h, c
+
+    def style_projection(self, style_z: torch.Tensor) -> torch.Tensor:
+        """W_style·z for a custom style embedding [B, style_dim]."""
+        return self.model.style_projection(style_z)
+
+
+def _example_inputs(step: DecodeStep, batch_size: int, generator: torch.Generator) -> tuple:
+    """Random decode-step inputs for tracing and parity checks."""
+    model = step.model
+    hidden = step.preset_styles.size(1)
+    num_layers = model.lstm.num_layers
+    return (
+        torch.randint(0, step.char_table.size(0), (batch_size,), generator=generator),
+        torch.randn(batch_size, hidden, generator=generator),
+        torch.randn(batch_size, 5, generator=generator),
+        torch.randn(num_layers, batch_size, hidden, generator=generator),
+        torch.randn(num_layers, batch_size, hidden, generator=generator),
+        torch.rand(batch_size, generator=generator) + 0.1,
+        torch.rand(batch_size, 2, generator=generator),
+        torch.randn(batch_size, 2, generator=generator),
+    )
+
+
+def trace_decode_step(step: DecodeStep) -> torch.jit.ScriptModule:
+    """Trace forward() and style_projection() into one TorchScript module."""
+    generator = torch.Generator().manual_seed(0)
+    style_z = torch.randn(2, step.style_embeddings.size(1), generator=generator)
+    with torch.no_grad():
+        return torch.jit.trace_module(
+            step,
+            {
+                "forward": _example_inputs(step, 2, generator),
+                "style_projection": (style_z,),
+            },
+        )
+
+
+def check_decode_parity(
+    compiled: torch.jit.ScriptModule,
+    reference: DecodeStep,
+    batch_sizes: tuple[int, ...] = (1, 3, 8),
+    steps: int = 16,
+) -> float:
+    """
+    Largest difference between the compiled and the eager decode step.
+
+    Each batch size is decoded for several steps from random inputs, feeding
+    the eager outputs back into both modules. Pen states are one-hot, so a
+    differently sampled pen state shows up as a difference of 1.
+
+    Args:
+        compiled: Traced (or reloaded) decode step.
+        reference: Eager DecodeStep it was traced from.
+        batch_sizes: Batch sizes to check (the trace must generalize over B).
+        steps: Decode steps per batch size.
+
+    Returns:
+        Maximum absolute difference over strokes, hidden states and style projections.
+    """
+    generator = torch.Generator().manual_seed(1)
+    worst = 0.0
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            chars, style_proj, prev, h, c, temperature, _, _ = _example_inputs(
+                reference, batch_size, generator
+            )
+            style_z = torch.randn(
+                batch_size, reference.style_embeddings.size(1), generator=generator
+            )
+            worst = max(
+                worst,
+                (compiled.style_projection(style_z) - reference.style_projection(style_z))
+                .abs()
+                .max()
+                .item(),
+            )
+            for _ in range(steps):
+                uniform = torch.rand(batch_size, 2, generator=generator)
+                normal = torch.randn(batch_size, 2, generator=generator)
+                args = (chars, style_proj, prev, h, c, temperature, uniform, normal)
+                expected = reference(*args)
+                actual = compiled(*args)
+                for a, b in zip(actual, expected, strict=True):
+                    worst = max(worst, (a - b).abs().max().item())
+                prev, h, c = expected
+    return worst
+
+
+def export_decode_step(
+    model: HandwritingLSTM,
+    output_path: str | Path,
+    style_embeddings: torch.Tensor,
+    stroke_mean: torch.Tensor,
+    stroke_std: torch.Tensor,
+    metadata: dict[str, Any],
+    atol: float = 1e-4,
+) -> float:
+    """
+    Trace, save and verify the compiled decode step of a model.
+
+    The artifact is written next to output_path first and only moved into
+    place once the reloaded module matches the eager step within atol.
+
+    Args:
+        model: HandwritingLSTM in eval mode, on CPU.
+        output_path: Destination .pts file.
+        style_embeddings: Style preset embeddings [num_presets, style_dim].
+        stroke_mean: Stroke delta mean [2].
+        stroke_std: Stroke delta std [2].
+        metadata: JSON-serializable metadata (model_config, stroke_stats, ...).
+        atol: Largest accepted difference.
+
+    Returns:
+        Measured maximum difference.
+
+    Raises:
+        ValueError: If the model cannot be exported or parity fails.
+    """
+    if getattr(model, "architecture", "lstm") != "lstm":
+        raise ValueError("Only the LSTM architecture has a compiled decode step")
+
+    reference = DecodeStep(model, style_embeddings.cpu(), stroke_mean.cpu(), stroke_std.cpu())
+    reference.eval()
+    traced = trace_decode_step(reference)
+
+    output_path = Path(output_path)
+    tmp_path = output_path.with_suffix(".tmp")
+    metadata = {
+        **metadata,
+        "format": DECODE_FORMAT_VERSION,
+        "num_layers": model.lstm.num_layers,
+        "hidden_dim": reference.preset_styles.size(1),
+    }
+    torch.jit.save(traced, str(tmp_path), _extra_files={METADATA_FILE: json.dumps(metadata)})
+
+    # Verify what was written, not the in-memory trace
+    reloaded, _ = load_decode_step(tmp_path)
+    error = check_decode_parity(reloaded, reference)
+    if error > atol:
+        tmp_path.unlink()
+        raise ValueError(f"Compiled decode step differs from eager by {error:.2e} (atol {atol})")
+
+    tmp_path.replace(output_path)
+    return error
+
+
+def load_decode_step(
+    path: str | Path, device: str | torch.device = "cpu"
+) -> tuple[torch.jit.ScriptModule, dict[str, Any]]:
+    """
+    Load a compiled decode step and its metadata.
+
+    Args:
+        path: .pts artifact written by export_decode_step().
+        device: Target device.
+
+    Returns:
+        Tuple of (module, metadata).
+
+    Raises:
+        ValueError: If the file is not a decode-step artifact of a supported format.
+    """
+    extra_files = {METADATA_FILE: ""}
+    module = torch.jit.load(str(path), map_location=device, _extra_files=extra_files)
+    if not extra_files[METADATA_FILE]:
+        raise ValueError(
+            f"{path} is not a compiled decode step (export one with scripts/export_decode_step.py)"
+        )
+
+    metadata = json.loads(extra_files[METADATA_FILE])
+    if metadata.get("format") != DECODE_FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported decode step format {metadata.get('format')}")
+    return module.eval(), metadata
@@ -7,7 +7,7 @@ Supports both mock mode (development) and real inference (production).
 The engine abstracts model lifecycle management:
     - One-time loading on startup
     - VRAM management (GPU) or CPU fallback
-    - Async streaming generation
+    - Async streaming generation (continuous batching across requests)
     - Graceful shutdown
 
 Usage:
@@ -22,16 +22,35 @@ from __future__ import annotations
 import asyncio
 import logging
 import math
+import os
 import random
+import threading
 import time
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Iterator
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 from typing import Any
 
+from app.ml.admission import POLICIES as ADMISSION_POLICIES
+from app.ml.admission import AdmissionController, AdmissionRejectedError
+from app.ml.artifacts import ArtifactExportError, checkpoint_fingerprint, decode_artifact_path
+from app.ml.batching import BatcherFullError
+from app.ml.pacing import PacingMode, StreamPacer, resolve_pacing_mode
+from app.ml.profiling import RequestProfile
+from app.ml.seeding import derive_seed
+from app.services import metrics
+from app.services.result_cache import CachedResult, create_result_cache, request_key
+
 logger = logging.getLogger("inkforge.engine")
 
+# Space width (stroke units) next to stored words when the checkpoint has no stroke statistics
+DEFAULT_WORD_GAP = 10.0
+
+
+class UnsupportedStyleError(ValueError):
+    """The serving backend cannot write the requested style (a client error)."""
+
 
 # ============================================================
 # Engine Configuration
@@ -56,14 +75,37 @@ class EngineConfig:
 
     model_name: str = "inkforge-lstm-mdn-v1"
     checkpoint_path: str = "checkpoints/lstm_mdn_v1_best.pt"
+    compiled_decode: bool = True  # Prefer <checkpoint>.decode.pts when present
     device: str = "cpu"
-    engine_backend: str = "lstm"  # "mock" | "lstm" (real model)
+    engine_backend: str = "lstm"  # "mock" | "lstm" (PyTorch) | "onnx" (ONNX Runtime, CPU)
+    onnx_num_threads: int = 0  # ONNX Runtime intra-op threads (0 = onnxruntime default)
+    onnx_cache_dir: str = ""  # Exported ONNX graphs ("" = next to the checkpoint)
     gpu_memory_fraction: float = 0.85
-    quantization_bits: int = 0
+    quantization_bits: int = 0  # 8 = dynamic int8 on CPU (see app.ml.quantization)
+    quantization_max_nll_delta: float = 0.05  # Refuse int8 beyond this held-out NLL increase
     kv_cache_size_gb: float = 2.0
     max_seq_len: int = 2048
     max_concurrent_requests: int = 4
+    admission_max_queue: int = 32  # Streams waiting for a slot before 429 / close 4029
+    admission_max_wait_s: float = 10.0  # Longest expected or actual queue wait accepted
+    admission_policy: str = "sjf"  # "sjf" (cheapest first, with aging) | "fifo"
+    admission_aging_half_life_s: float = 1.0  # Queued cost counts half per this much waiting
+    decode_workers: int = 1  # Decode threads sharing the model, each with its own batch
+    decode_threads_per_worker: int = 0  # torch intra-op threads per worker (0 = cores / workers)
+    decode_queue_size: int = 64  # Streams waiting for a decode slot (0 = unbounded)
     stream_chunk_delay_ms: int = 20  # Faster for real model
+    stream_pacing: str = "paced"  # "unpaced" | "paced" | "adaptive" (see app.ml.pacing)
+    stroke_store_dir: str = ""  # Pre-generated word strokes ("" = disabled)
+    stroke_cache_mb: int = 64  # Word stroke cache of document generation (0 = disabled)
+    document_workers: int = 0  # Worker processes of document generation (0 = in-process)
+    batch_decode_size: int = 32  # Sequences per decode step in generate_batch()
+    max_strokes_per_char: int = 50  # Hard cap on decode steps per input character
+    stroke_budget_multiplier: float = 1.5  # Per-char step cap = training p99 × this (0 = off)
+    result_cache_mb: int = 64  # Replay cache of finished generations (0 = disabled)
+    result_cache_spill: str = ""  # "" | "disk" | "redis" (see app.services.result_cache)
+    result_cache_dir: str = "./cache/results"
+    result_cache_ttl_seconds: int = 86400
+    redis_url: str = ""
 
 
 @dataclass
@@ -85,6 +127,13 @@ class EngineStatus:
     active_requests: int = 0
     total_requests_served: int = 0
     uptime_seconds: float = 0.0
+    stroke_budget_exceeded: int = 0
+    queue_depth: int = 0
+    queue_wait_ms_p50: float = 0.0
+    queue_wait_ms_p95: float = 0.0
+    expected_wait_ms: float = 0.0
+    admitted_requests: int = 0
+    rejected_requests: int = 0
 
 
 # ============================================================
@@ -103,9 +152,10 @@ class LLMEngine:
         - Thread-safe singleton — only one instance per process
         - Clean shutdown with memory deallocation
 
-    The engine supports two backends:
+    The engine supports three backends:
         - "mock"  → simulated inference with random strokes (development)
         - "lstm"  → real LSTM+MDN model inference (production)
+        - "onnx"  → the same model, decode step exported to ONNX Runtime (CPU)
     """
 
     _instance: LLMEngine | None = None
@@ -143,12 +193,21 @@ class LLMEngine:
         self._vram_reserved_gb: float = 0.0
         self._gpu_name: str | None = None
 
-        # Semaphore for concurrent request limiting
-        self._semaphore: asyncio.Semaphore | None = None
+        # Concurrency limit, bounded wait queue and load shedding
+        self._admission: AdmissionController | None = None
 
         # Model objects
         self._inference_service: Any = None  # InferenceService instance
+        self._checkpoint_fingerprint: str | None = None  # Content hash of the source checkpoint
+        self._batcher: Any = None  # ContinuousBatcher instance
+        self._document_generator: Any = None  # DocumentGenerator (real model only)
+        self._document_workers = 0  # DocumentWorkerPool size (0 = in-process decode)
+        self._document_pool: Any = None  # Started lazily, in the process that uses it
+        self._document_pool_pid: int | None = None
+        self._document_pool_lock = threading.Lock()
         self._use_real_model: bool = False
+        self._result_cache: Any = None  # ResultCache instance (None = disabled)
+        self._quantization = QuantizationMode.NONE  # Weight precision actually served
 
         # Instance-bound asyncio lock (safe as it's created during fastapi lifespan)
         self._lock = asyncio.Lock()
@@ -171,7 +230,17 @@ class LLMEngine:
 
             self._config = config
             self._start_time = time.monotonic()
-            self._semaphore = asyncio.Semaphore(config.max_concurrent_requests)
+            if config.admission_policy not in ADMISSION_POLICIES:
+                logger.warning(f"Unknown admission policy: {config.admission_policy}, using sjf")
+                config.admission_policy = "sjf"
+            self._admission = AdmissionController(
+                max_active=config.max_concurrent_requests,
+                max_queue=config.admission_max_queue,
+                max_wait_s=config.admission_max_wait_s,
+                seconds_per_stroke=max(config.stream_chunk_delay_ms, 1) / 1000,
+                policy=config.admission_policy,
+                aging_half_life_s=config.admission_aging_half_life_s,
+            )
 
             logger.info("=" * 60)
             logger.info("INKFORGE ENGINE — Initialization Sequence")
@@ -204,26 +273,64 @@ class LLMEngine:
             # --- Step 2: Load Model ---
             logger.info(f"[2/4] Loading model: {config.model_name}")
 
-            if config.engine_backend == "lstm":
+            if config.engine_backend in ("lstm", "onnx"):
                 # Try to load real LSTM+MDN model
                 checkpoint_path = Path(config.checkpoint_path)
+                if config.engine_backend == "onnx" and actual_device != "cpu":
+                    logger.warning("  → The onnx backend runs on CPU only — ignoring DEVICE")
+                    actual_device = "cpu"
+                if (
+                    config.engine_backend == "lstm"
+                    and config.compiled_decode
+                    and checkpoint_path.suffix != ".pts"
+                ):
+                    compiled_path = decode_artifact_path(checkpoint_path)
+                    if compiled_path.exists():
+                        logger.info(f"  → Compiled decode step found: {compiled_path}")
+                        checkpoint_path = compiled_path
 
                 if checkpoint_path.exists():
                     try:
-                        from app.services.inference import InferenceService
-
-                        self._inference_service = InferenceService(
-                            checkpoint_path=str(checkpoint_path),
-                            device=actual_device,
+                        self._inference_service = self._create_inference_service(
+                            config, checkpoint_path, actual_device
                         )
                         self._inference_service.load_model()
+                        # Of the trained checkpoint, also when serving its compiled step
+                        source = Path(config.checkpoint_path)
+                        self._checkpoint_fingerprint = checkpoint_fingerprint(
+                            source if source.exists() else checkpoint_path
+                        )
+                        if config.quantization_bits:
+                            self._apply_quantization(config)
+                        if self._inference_service.quantization == "int8":
+                            self._quantization = QuantizationMode.INT8
                         self._inference_service.warmup()
 
+                        self._batcher = self._create_batcher(config)
+                        self._batcher.start()
+
+                        if config.stroke_store_dir:
+                            self._open_stroke_store(config.stroke_store_dir)
+                        self._document_generator = self._create_document_generator(config)
+
                         self._use_real_model = True
                         self._vram_allocated_gb = 0.5  # LSTM is small
                         logger.info(f"  → LSTM+MDN model loaded from: {checkpoint_path}")
                         logger.info(f"  → Device: {actual_device}")
-
+                        if config.engine_backend == "onnx":
+                            threads = config.onnx_num_threads or "auto"
+                            logger.info(f"  → ONNX Runtime CPU provider, {threads} threads")
+                        budget = self._inference_service.stroke_budget
+                        if budget is not None:
+                            logger.info(
+                                f"  → Stroke budget: {len(budget.caps)} chars, "
+                                f"default cap {budget.default_cap} steps"
+                            )
+
+                    except ArtifactExportError as e:
+                        # Misconfiguration, not a missing model: refuse to start
+                        logger.error(f"  → Cannot serve {checkpoint_path}: {e}")
+                        raise
                     except Exception as e:
                         logger.warning(f"  → Failed to load model: {e}")
                         logger.info("  → Falling back to mock mode")
@@ -243,7 +350,40 @@ class LLMEngine:
             # --- Step 3: Configuration ---
             logger.info("[3/4] Configuring engine...")
             logger.info(f"  → Max concurrent requests: {config.max_concurrent_requests}")
+            if self._use_real_model:
+                logger.info(
+                    f"  → Decode pool: {max(1, config.decode_workers)} workers, "
+                    f"queue {config.decode_queue_size or 'unbounded'}"
+                )
+                stats = self._inference_service.stroke_stats
+                if stats and stats.get("global", {}).get("count"):
+                    # Seed the cost estimate with the training data's median
+                    self._admission.strokes_per_char = stats["global"]["p50"]
+            logger.info(
+                f"  → Admission: {config.admission_policy}, queue {config.admission_max_queue}, "
+                f"max wait {config.admission_max_wait_s:.1f}s"
+            )
             logger.info(f"  → Stream delay: {config.stream_chunk_delay_ms}ms")
+            try:
+                pacing = resolve_pacing_mode(config.stream_pacing, config.stream_chunk_delay_ms)
+            except ValueError:
+                logger.warning(f"  → Unknown stream pacing: {config.stream_pacing}, using paced")
+                config.stream_pacing = PacingMode.PACED.value
+                pacing = resolve_pacing_mode(config.stream_pacing, config.stream_chunk_delay_ms)
+            logger.info(f"  → Stream pacing: {pacing.value}")
+            try:
+                self._result_cache = create_result_cache(
+                    max_mb=config.result_cache_mb,
+                    spill=config.result_cache_spill,
+                    spill_dir=config.result_cache_dir,
+                    redis_url=config.redis_url,
+                    ttl_seconds=config.result_cache_ttl_seconds,
+                )
+            except Exception as e:
+                logger.warning(f"  → Result cache unavailable: {e}")
+                self._result_cache = None
+            if self._result_cache is not None:
+                logger.info(f"  → Result cache: {config.result_cache_mb} MiB")
 
             # --- Step 4: Warmup ---
             logger.info("[4/4] Engine ready")
@@ -251,6 +391,7 @@ class LLMEngine:
             # --- Ready ---
             self._model_loaded = True
             self._actual_device = actual_device
+            metrics.REGISTRY.on_collect(self._collect_metrics)
             logger.info("=" * 60)
             logger.info(f"ENGINE READY — {config.model_name}")
             logger.info(f"  Backend:  {'LSTM+MDN' if self._use_real_model else 'Mock'}")
@@ -265,15 +406,25 @@ class LLMEngine:
         """
         async with self._lock:
             logger.info("ENGINE SHUTDOWN — Releasing resources...")
+            metrics.REGISTRY.remove_collector(self._collect_metrics)
+
+            if self._batcher is not None:
+                self._batcher.stop()
+                self._batcher = None
+            self.close_document_pool()
+            self._document_generator = None
 
             if self._inference_service is not None:
                 del self._inference_service
                 self._inference_service = None
+            self._checkpoint_fingerprint = None
 
             self._vram_allocated_gb = 0.0
             self._vram_reserved_gb = 0.0
             self._model_loaded = False
             self._use_real_model = False
+            self._result_cache = None
+            self._quantization = QuantizationMode.NONE
 
             # Clear CUDA cache if available
             try:
@@ -296,6 +447,9 @@ class LLMEngine:
         text: str,
         style_id: str = "neat_cursive",
         params: dict[str, Any] | None = None,
+        pacing: str | None = None,
+        seed: int | None = None,
+        profile: RequestProfile | None = None,
     ) -> AsyncGenerator[dict[str, Any], None]:
         """
         Async generator that yields stroke data one at a time.
@@ -307,80 +461,397 @@ class LLMEngine:
             text: Input text to synthesize as handwriting.
             style_id: Style preset identifier.
             params: Humanization parameters dict.
+            pacing: Pacing mode override ("unpaced" | "paced" | "adaptive").
+                Defaults to config.stream_pacing.
+            seed: Sampling seed; the same request and seed give the same strokes.
+            profile: Per-phase timers; their summary is added to the complete
+                event as "profile".
 
         Yields:
             Dicts with type="stroke" containing (dx, dy, p1, p2, p3) data,
             followed by a type="complete" event.
+
+        Raises:
+            UnsupportedStyleError: If the backend cannot write style_id.
         """
         if not self._model_loaded:
             raise RuntimeError("Engine not initialized — call initialize_model() first")
+        self.check_style(style_id)
 
         params = params or {}
         config = self._config
+        pacer = StreamPacer.create(
+            pacing or config.stream_pacing, config.stream_chunk_delay_ms, profile=profile
+        )
+        backend = self._metrics_backend()
+        arrival = time.monotonic()
+        queued = time.perf_counter()
+
+        # Only seeded requests are cached: an unseeded repeat must be a fresh sample
+        cache_key = None
+        if self._result_cache is not None and seed is not None:
+            cache_key = request_key(text, style_id, params, seed, model=self._model_identity())
+            cached = await self._cache_call(self._result_cache.get, cache_key)
+            if cached is not None:
+                self._total_requests += 1
+                metrics.REQUESTS.inc(backend=backend, outcome="cached")
+                async for event in self._replay_cached(
+                    cached, pacer, self._total_requests, time.monotonic()
+                ):
+                    if event["type"] == "complete" and profile is not None:
+                        event = {**event, "profile": profile.summary()}
+                    yield event
+                return
 
-        # Enforce concurrency limit
-        async with self._semaphore:
-            self._active_requests += 1
-            self._total_requests += 1
-            request_id = self._total_requests
-            start_time = time.monotonic()
-
-            logger.info(
-                f"[req-{request_id}] Starting generation: "
-                f"{len(text)} chars, style={style_id}, "
-                f"active={self._active_requests}/{config.max_concurrent_requests}"
-            )
+        # Enforce concurrency limit (may queue, or reject with a retry-after)
+        try:
+            async with self._admission.admit(len(text), self._estimate_strokes(text)):
+                self._active_requests += 1
+                self._total_requests += 1
+                request_id = self._total_requests
+                start_time = time.monotonic()
+                metrics.QUEUE_WAIT.observe(start_time - arrival, backend=backend)
+                if profile is not None:
+                    profile.add("queue", queued)
+
+                logger.info(
+                    f"[req-{request_id}] Starting generation: "
+                    f"{len(text)} chars, style={style_id}, pacing={pacer.mode.value}, "
+                    f"active={self._active_requests}/{config.max_concurrent_requests}"
+                )
 
-            try:
                 if self._use_real_model and self._inference_service is not None:
                     # Real LSTM+MDN inference
-                    async for event in self._stream_real_model(
-                        text, style_id, params, config, request_id, start_time
-                    ):
-                        yield event
+                    events = self._stream_real_model(
+                        text, style_id, params, seed, pacer, request_id, start_time
+                    )
                 else:
                     # Mock inference (fallback)
-                    async for event in self._stream_mock(
-                        text, style_id, params, config, request_id, start_time
-                    ):
+                    events = self._stream_mock(
+                        text, style_id, params, seed, pacer, request_id, start_time
+                    )
+
+                recorded: list[dict[str, Any]] = []
+                strokes = 0
+                try:
+                    async for event in events:
+                        if event["type"] == "stroke":
+                            if not strokes:
+                                metrics.TIME_TO_FIRST_STROKE.observe(
+                                    time.monotonic() - arrival, backend=backend
+                                )
+                            strokes += 1
+                        elif event["type"] == "complete":
+                            self._admission.record(
+                                len(text), event["total_strokes"], time.monotonic() - start_time
+                            )
+                            metrics.GENERATION_TIME.observe(
+                                time.monotonic() - arrival, backend=backend
+                            )
+                            metrics.REQUESTS.inc(backend=backend, outcome="completed")
+                        if cache_key is not None:
+                            if event["type"] == "stroke":
+                                recorded.append(event["data"])
+                            elif event["type"] == "complete" and "fallback" not in event:
+                                # Stored before the client sees completion, so an
+                                # identical follow-up request already hits
+                                await self._cache_call(
+                                    self._result_cache.put,
+                                    cache_key,
+                                    CachedResult(tuple(recorded), event),
+                                )
+                        if event["type"] == "complete" and profile is not None:
+                            event = {**event, "profile": profile.summary()}
                         yield event
 
-            finally:
-                self._active_requests -= 1
+                except BatcherFullError as e:
+                    self._admission.rejected += 1
+                    raise AdmissionRejectedError(str(e), retry_after=1) from e
+                finally:
+                    await events.aclose()
+                    self._active_requests -= 1
+                    metrics.STROKES.inc(strokes, backend=backend)
+
+        except AdmissionRejectedError:
+            metrics.REQUESTS.inc(backend=backend, outcome="rejected")
+            raise
+        except Exception:
+            metrics.REQUESTS.inc(backend=backend, outcome="failed")
+            raise
+
+    def check_admission(self, text: str) -> None:
+        """
+        Raise if a stream for text would be rejected right now.
+
+        Lets the HTTP routes answer 429 before a job or stream is started;
+        nothing is reserved, so the stream itself may still be rejected.
+
+        Raises:
+            AdmissionRejectedError: If the server is too busy to take it.
+        """
+        if self._admission is not None:
+            self._admission.check(len(text), self._estimate_strokes(text))
+
+    def check_style(self, style_id: str) -> None:
+        """
+        Raise if the serving backend cannot write style_id.
+
+        Raises:
+            UnsupportedStyleError: For styles the backend does not serve
+                (the onnx backend serves style presets only).
+        """
+        service = self._inference_service
+        if self._use_real_model and service is not None and not service.supports_style(style_id):
+            raise UnsupportedStyleError(
+                f"The {self._config.engine_backend} backend only serves style presets, "
+                f"not {style_id!r}"
+            )
+
+    def _estimate_strokes(self, text: str) -> float | None:
+        """Model-based stroke estimate for scheduling (None = let admission estimate it)."""
+        if self._use_real_model and self._inference_service is not None:
+            return self._inference_service.estimate_strokes(text)
+        return None
+
+    def generate_batch(
+        self,
+        texts: list[str],
+        style_id: str = "neat_cursive",
+        params: dict[str, Any] | None = None,
+        seed: int | None = None,
+    ) -> list[list[tuple[float, float, int, int, int]]]:
+        """
+        Generate strokes for many texts synchronously, without streaming.
+
+        Bulk path for batch jobs: no event loop, no per-stroke delay. The
+        real model decodes the texts in continuous batches of up to
+        batch_decode_size sequences.
+
+        Args:
+            texts: Input texts.
+            style_id: Style preset identifier.
+            params: Humanization parameters dict.
+            seed: Batch seed; text i is sampled with derive_seed(seed, i).
+
+        Returns:
+            One list of (dx, dy, p1, p2, p3) stroke tuples per text, in order.
+
+        Raises:
+            UnsupportedStyleError: If the backend cannot write style_id.
+        """
+        if not self._model_loaded:
+            raise RuntimeError("Engine not initialized — call initialize_model() first")
+        self.check_style(style_id)
+
+        params = params or {}
+        backend = self._metrics_backend()
+        arrival = time.monotonic()
+        self._active_requests += 1
+        self._total_requests += len(texts)
+
+        try:
+            if self._use_real_model and self._inference_service is not None:
+                batch = self._inference_service.generate_batch(
+                    texts,
+                    style_id=style_id,
+                    temperature=params.get("character_inconsistency", 0.4),
+                    max_strokes=self._config.max_strokes_per_char,
+                    max_batch_size=self._config.batch_decode_size,
+                    seed=seed,
+                )
+            else:
+                batch = [
+                    [
+                        (data["dx"], data["dy"], data["p1"], data["p2"], data["p3"])
+                        for data in self._mock_strokes(
+                            text, params, {}, None if seed is None else derive_seed(seed, i)
+                        )
+                    ]
+                    for i, text in enumerate(texts)
+                ]
+        except Exception:
+            metrics.REQUESTS.inc(len(texts), backend=backend, outcome="failed")
+            raise
+        finally:
+            self._active_requests -= 1
+
+        self._record_bulk(backend, arrival, len(texts), sum(len(strokes) for strokes in batch))
+        return batch
+
+    def generate_document(
+        self,
+        text: str,
+        style_id: str = "neat_cursive",
+        params: dict[str, Any] | None = None,
+        seed: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Lay out and generate a full page synchronously.
+
+        Words repeat across and within documents, so unseeded words are
+        served from the engine's shared word stroke cache (STROKE_CACHE_MB)
+        and only misses are decoded, as one batch.
+
+        Args:
+            text: Full document text.
+            style_id: Style preset identifier.
+            params: Humanization parameters dict.
+            seed: Document seed (bypasses the stroke cache).
+
+        Returns:
+            One dict per word: word, strokes, position and line_number.
+
+        Raises:
+            RuntimeError: If the engine is not loaded or is in mock mode.
+            UnsupportedStyleError: If the backend cannot write style_id.
+        """
+        if not self._model_loaded:
+            raise RuntimeError("Engine not initialized — call initialize_model() first")
+        if self._document_generator is None:
+            raise RuntimeError("Document generation needs a loaded model (engine is in mock mode)")
+        self.check_style(style_id)
+
+        self._ensure_document_pool()
+
+        params = params or {}
+        backend = self._metrics_backend()
+        arrival = time.monotonic()
+        self._active_requests += 1
+        self._total_requests += 1
+        try:
+            layout = self._document_generator.generate_document(
+                text,
+                style_id=style_id,
+                temperature=params.get("character_inconsistency", 0.4),
+                fatigue=params.get("fatigue_simulation", 0.3),
+                baseline_drift=params.get("baseline_drift", 0.3),
+                seed=seed,
+            )
+        except Exception:
+            metrics.REQUESTS.inc(backend=backend, outcome="failed")
+            raise
+        finally:
+            self._active_requests -= 1
+
+        self._record_bulk(backend, arrival, 1, sum(len(word["strokes"]) for word in layout))
+        return layout
+
+    def close_document_pool(self) -> None:
+        """Stop the document worker processes started by this process, if any."""
+        with self._document_pool_lock:
+            if self._document_pool is None:
+                return
+            if self._document_pool_pid == os.getpid():
+                self._document_pool.shutdown()
+            # A pool inherited through fork belongs to the parent; just drop it here
+            self._document_pool = None
+            self._document_pool_pid = None
+            if self._document_generator is not None:
+                self._document_generator.worker_pool = None
+
+    def _ensure_document_pool(self) -> None:
+        """
+        Start the document worker pool in this process on first use.
+
+        A pool (its processes and management thread) does not survive a
+        fork, so it is never started at initialization: the Celery worker
+        initializes the engine before the prefork pool forks.
+        """
+        if self._document_workers <= 0 or self._document_pool_pid == os.getpid():
+            return
+
+        from app.services.document_pool import DocumentWorkerPool
+
+        with self._document_pool_lock:
+            if self._document_pool_pid == os.getpid():
+                return
+            service = self._inference_service
+            self._document_pool = DocumentWorkerPool(
+                str(service.checkpoint_path),
+                workers=self._document_workers,
+                device=self._config.device,
+                batch_size=self._config.batch_decode_size,
+                style_embeddings=service.style_embeddings,
+                stroke_budget_multiplier=service.stroke_budget_multiplier,
+                quantization=service.quantization,
+            )
+            self._document_pool_pid = os.getpid()
+            self._document_generator.worker_pool = self._document_pool
+
+    async def _replay_cached(
+        self,
+        result: CachedResult,
+        pacer: StreamPacer,
+        request_id: int,
+        start_time: float,
+    ) -> AsyncGenerator[dict[str, Any], None]:
+        """
+        Stream a cached generation as if it were being generated.
+
+        Same events, indices and pacing as a live stream; the completion
+        event keeps the original metadata plus cached=True, with
+        generation_time_ms measuring the replay.
+        """
+        for index, data in enumerate(result.strokes):
+            yield {"type": "stroke", "index": index, "data": data}
+            await pacer.pace()
+
+        elapsed_ms = (time.monotonic() - start_time) * 1000
+        yield {**result.complete, "generation_time_ms": round(elapsed_ms, 1), "cached": True}
+
+        logger.info(
+            f"[req-{request_id}] Complete (cached): {len(result.strokes)} strokes, "
+            f"{elapsed_ms:.1f}ms"
+        )
+
+    async def _cache_call(self, method: Any, *args: Any) -> Any:
+        """Call a result cache method, off the event loop when it may touch disk/Redis."""
+        if self._result_cache.spill is None:
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+
+    def _model_identity(self) -> str:
+        """
+        Identify what produces strokes, so cache entries never cross models.
+
+        The checkpoint is identified by content (a retrain that overwrites
+        the same file is another model), together with the settings that
+        change the strokes a checkpoint writes.
+        """
+        if self._use_real_model:
+            config = self._config
+            identity = f"{config.model_name}:{self._checkpoint_fingerprint}"
+            if config.engine_backend != "lstm":
+                identity += f":{config.engine_backend}"
+            if self._quantization is not QuantizationMode.NONE:
+                identity += f":{self._quantization.value}"
+            identity += (
+                f":steps={config.max_strokes_per_char}:budget={config.stroke_budget_multiplier}"
+            )
+            if getattr(self._inference_service, "stroke_store", None) is not None:
+                identity += f":store={config.stroke_store_dir}"
+            return identity
+        return "mock"
 
     async def _stream_real_model(
         self,
         text: str,
         style_id: str,
         params: dict[str, Any],
-        config: EngineConfig,
+        seed: int | None,
+        pacer: StreamPacer,
         request_id: int,
         start_time: float,
     ) -> AsyncGenerator[dict[str, Any], None]:
         """
         Stream strokes from the real LSTM+MDN model.
+
+        Strokes come from the shared ContinuousBatcher, which steps this
+        request together with every other active request.
         """
         temperature = params.get("character_inconsistency", 0.4)
 
-        # Generate strokes using InferenceService
-        # Run in thread pool to avoid blocking the async event loop
-        try:
-            strokes = await asyncio.to_thread(
-                self._inference_service.generate,
-                text=text,
-                style_id=style_id,
-                params=params,
-                temperature=temperature,
-                max_strokes=50,  # Per character
-            )
-        except Exception as e:
-            logger.error(f"[req-{request_id}] Model inference failed: {e}")
-            # Fall back to mock on error
-            async for event in self._stream_mock(
-                text, style_id, params, config, request_id, start_time
-            ):
-                yield event
-            return
+        strokes = self._real_stroke_source(text, style_id, temperature, seed, pacer.profile)
 
         # Stream the strokes with layout positioning
         stroke_index = 0
@@ -394,47 +865,65 @@ class LLMEngine:
         margin_left = 40.0
         margin_right = page_width - 40.0
 
-        for dx, dy, p1, p2, p3 in strokes:
-            # Track position for layout
-            cursor_x += dx
-            cursor_y += dy
-
-            # Line wrap check
-            if cursor_x > margin_right:
-                cursor_x = margin_left
-                cursor_y += line_height
-                line_num += 1
-
-            # Get current character if available
-            current_char = text[char_idx] if char_idx < len(text) else ""
-            if p2 == 1:  # Pen up = move to next character
-                char_idx += 1
-
-            stroke_event = {
-                "type": "stroke",
-                "index": stroke_index,
-                "data": {
-                    "dx": round(dx, 3),
-                    "dy": round(dy, 3),
-                    "p1": int(p1),
-                    "p2": int(p2),
-                    "p3": int(p3),
-                    "char": current_char,
-                    "x": round(cursor_x, 2),
-                    "y": round(cursor_y, 2),
-                },
-            }
-
-            yield stroke_event
-            stroke_index += 1
-
-            # Small delay for streaming effect
-            delay = config.stream_chunk_delay_ms / 1000.0
-            await asyncio.sleep(delay)
-
-            # Check for end of sequence
-            if p3 == 1:
-                break
+        try:
+            async for dx, dy, p1, p2, p3 in strokes:
+                # Track position for layout
+                cursor_x += dx
+                cursor_y += dy
+
+                # Line wrap check
+                if cursor_x > margin_right:
+                    cursor_x = margin_left
+                    cursor_y += line_height
+                    line_num += 1
+
+                # Get current character if available
+                current_char = text[char_idx] if char_idx < len(text) else ""
+                if p2 == 1:  # Pen up = move to next character
+                    char_idx += 1
+
+                stroke_event = {
+                    "type": "stroke",
+                    "index": stroke_index,
+                    "data": {
+                        "dx": round(dx, 3),
+                        "dy": round(dy, 3),
+                        "p1": int(p1),
+                        "p2": int(p2),
+                        "p3": int(p3),
+                        "char": current_char,
+                        "char_index": char_idx,
+                        "x": round(cursor_x, 2),
+                        "y": round(cursor_y, 2),
+                    },
+                }
+
+                yield stroke_event
+                stroke_index += 1
+
+                # Streaming animation delay (no sleep when unpaced)
+                await pacer.pace()
+
+                # Check for end of sequence
+                if p3 == 1:
+                    break
+        except BatcherFullError:
+            raise  # Backpressure: the caller rejects the request, no mock strokes
+        except Exception as e:
+            logger.error(f"[req-{request_id}] Model inference failed: {e}")
+            if stroke_index > 0:
+                raise
+            # Fall back to mock if the model failed before producing output,
+            # marked so the result cache never serves it as the model's output
+            async for event in self._stream_mock(
+                text, style_id, params, seed, pacer, request_id, start_time
+            ):
+                if event["type"] == "complete":
+                    event = {**event, "fallback": "mock"}
+                yield event
+            return
+        finally:
+            await strokes.aclose()
 
         # Completion event
         elapsed_ms = (time.monotonic() - start_time) * 1000
@@ -452,18 +941,168 @@ class LLMEngine:
             f"{elapsed_ms:.1f}ms"
         )
 
+    async def _real_stroke_source(
+        self,
+        text: str,
+        style_id: str,
+        temperature: float,
+        seed: int | None = None,
+        profile: RequestProfile | None = None,
+    ) -> AsyncGenerator[tuple[float, float, int, int, int], None]:
+        """
+        Yield model strokes for the text, serving stored words from disk.
+
+        Without a stroke store the whole text is one batched sequence. With
+        one, stored words are replayed from the memory-mapped store and every
+        run of consecutive misses is still decoded as one sequence, so the
+        model writes those words and the spaces between them itself. Only
+        where a stored word meets other output is a space written as a pen-up
+        move of the model's typical space width (InferenceService.word_gap()).
+
+        Seeded requests give word i the seed derive_seed(seed, i), which
+        picks its store variant; a run of misses starting at word i is
+        sampled with the same seed (with the request seed itself when the run
+        is the whole text, exactly as without a store).
+        """
+        store = self._inference_service.stroke_store
+
+        if store is None:
+            async for stroke in self._batcher.generate(
+                text=text,
+                style_id=style_id,
+                temperature=temperature,
+                max_strokes=self._config.max_strokes_per_char,
+                seed=seed,
+                profile=profile,
+            ):
+                yield stroke
+            return
+
+        # Segments of (first word index, words, stored strokes or None for a decoded run)
+        words = text.split(" ")
+        segments: list[tuple[int, list[str], list[tuple[float, float, int, int, int]] | None]] = []
+        for word_idx, word in enumerate(words):
+            stored = None
+            if word:
+                word_seed = None if seed is None else derive_seed(seed, word_idx)
+                started = time.perf_counter()
+                stored = store.lookup(word, style_id, temperature, variant=word_seed)
+                if profile is not None:
+                    profile.add("store", started)
+            if stored is not None:
+                segments.append((word_idx, [word], stored))
+            elif segments and segments[-1][2] is None:
+                segments[-1][1].append(word)
+            else:
+                segments.append((word_idx, [word], None))
+
+        gap = self._inference_service.word_gap() or DEFAULT_WORD_GAP
+        for segment_idx, (first_idx, run, stored) in enumerate(segments):
+            is_last = segment_idx == len(segments) - 1
+            if segment_idx > 0:
+                # Pen-up move across the space between two segments
+                yield (gap, 0.0, 0, 1, 0)
+
+            if stored is not None:
+                for stroke in stored:
+                    yield self._word_stroke(stroke, is_last)
+                continue
+
+            run_text = " ".join(run)
+            if not run_text.strip():
+                # Only extra spaces between stored words
+                for _ in range(len(run) - 1):
+                    yield (gap, 0.0, 0, 1, 0)
+                continue
+
+            if seed is None:
+                run_seed = None
+            elif len(run) == len(words):
+                run_seed = seed
+            else:
+                run_seed = derive_seed(seed, first_idx)
+            async for stroke in self._batcher.generate(
+                text=run_text,
+                style_id=style_id,
+                temperature=temperature,
+                max_strokes=self._config.max_strokes_per_char,
+                seed=run_seed,
+                profile=profile,
+            ):
+                yield self._word_stroke(stroke, is_last)
+
+    @staticmethod
+    def _word_stroke(
+        stroke: tuple[float, float, int, int, int], is_last: bool
+    ) -> tuple[float, float, int, int, int]:
+        """Turn end-of-sequence into pen-up for every segment but the last."""
+        dx, dy, p1, p2, p3 = stroke
+        if p3 == 1 and not is_last:
+            return (dx, dy, p1, 1, 0)
+        return stroke
+
     async def _stream_mock(
         self,
         text: str,
         style_id: str,
         params: dict[str, Any],
-        config: EngineConfig,
+        seed: int | None,
+        pacer: StreamPacer,
         request_id: int,
         start_time: float,
     ) -> AsyncGenerator[dict[str, Any], None]:
         """
         Stream mock strokes for development/demo when no model is available.
         """
+        layout: dict[str, int] = {}
+        stroke_index = 0
+
+        for data in self._mock_strokes(text, params, layout, seed):
+            yield {"type": "stroke", "index": stroke_index, "data": data}
+            stroke_index += 1
+
+            if data["p2"] == 1:
+                # Pause between words
+                await pacer.pace(0.02)
+            else:
+                await pacer.pace(pacer.delay * random.uniform(0.2, 0.8))  # faster for mock strokes
+
+        # Completion event
+        elapsed_ms = (time.monotonic() - start_time) * 1000
+        yield {
+            "type": "complete",
+            "total_strokes": stroke_index,
+            "total_words": layout["words"],
+            "lines": layout["lines"],
+            "generation_time_ms": round(elapsed_ms, 1),
+        }
+
+        logger.info(
+            f"[req-{request_id}] Complete (mock): {stroke_index} strokes, {layout['lines']} lines"
+        )
+
+    @staticmethod
+    def _mock_strokes(
+        text: str,
+        params: dict[str, Any],
+        layout: dict[str, int],
+        seed: int | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Generate mock stroke data (random scribbles laid out as words).
+
+        Args:
+            text: Input text.
+            params: Humanization parameters dict.
+            layout: Filled with "words" and "lines" counts once exhausted.
+            seed: Seed of the request's private RNG (None = fresh entropy).
+
+        Yields:
+            Stroke data dicts (dx, dy, p1, p2, p3, char, char_index, x, y).
+        """
+        rng = random.Random(seed)
+        char_index = 0  # Characters written so far (spaces included)
+
         # Use a non-whitespace sentinel so \n survives .split()
         words = text.replace("\n", " __NL__ ").split()
         total_words = len([w for w in words if w != "__NL__"])
@@ -481,22 +1120,21 @@ class LLMEngine:
         line_height = 28.0
         margin_left = 40.0
         margin_right = page_width - 40.0
-        stroke_index = 0
 
         for word_idx, word in enumerate(words):
             # Handle paragraph breaks
             if word == "__NL__":
-                cursor_x = margin_left + random.uniform(-2, 5)
+                cursor_x = margin_left + rng.uniform(-2, 5)
                 cursor_y += line_height * 1.2
                 line_num += 1
                 continue
 
-            word_width = len(word) * random.uniform(8.0, 12.0)
+            word_width = len(word) * rng.uniform(8.0, 12.0)
 
             # Line wrap
             if cursor_x + word_width > margin_right:
-                cursor_x = margin_left + random.uniform(-2, 3)
-                cursor_y += line_height + random.uniform(-1.5, 1.5)
+                cursor_x = margin_left + rng.uniform(-2, 3)
+                cursor_y += line_height + rng.uniform(-1.5, 1.5)
                 line_num += 1
 
             # Baseline drift (Exaggerated for visual awareness in mock mode)
@@ -504,7 +1142,7 @@ class LLMEngine:
                 baseline_drift
                 * 8.0
                 * math.sin(
-                    2 * math.pi * line_num / max(total_words / 5.0, 3.0) + random.uniform(0, 0.5)
+                    2 * math.pi * line_num / max(total_words / 5.0, 3.0) + rng.uniform(0, 0.5)
                 )
             )
 
@@ -513,8 +1151,8 @@ class LLMEngine:
                 fatigue_factor = 1.0 + fatigue * (word_idx / max(total_words, 1))
 
                 # Generate a small scribble for the character (~15 strokes)
-                num_strokes = max(1, int(random.gauss(15, 3)))
-                char_width_target = max(0.5, random.gauss(8.0, 2.0 * temperature * fatigue_factor))
+                num_strokes = max(1, int(rng.gauss(15, 3)))
+                char_width_target = max(0.5, rng.gauss(8.0, 2.0 * temperature * fatigue_factor))
 
                 # We need to end up char_width_target to the right
                 dx_base = char_width_target / num_strokes
@@ -525,75 +1163,162 @@ class LLMEngine:
 
                     # Create some loops and zig-zags
                     # dx is mostly forward, but occasionally backwards
-                    dx = random.gauss(dx_base, 1.0 * temperature)
+                    dx = rng.gauss(dx_base, 1.0 * temperature)
 
                     # dy oscillates to draw height
                     # frequency is roughly 2-3 up/down sweeps per character
-                    freq = random.uniform(2.0, 3.0)
-                    dy = math.sin(t * math.pi * 2 * freq) * random.uniform(3.0, 6.0)
-                    dy += random.gauss(0.0 + global_drift, 0.5 * temperature)
-                    dy += slant * 0.1 * random.gauss(0, 0.3)
-
-                    stroke_event = {
-                        "type": "stroke",
-                        "index": stroke_index,
-                        "data": {
-                            "dx": round(dx, 3),
-                            "dy": round(dy, 3),
-                            "p1": 1,  # pen always down during char
-                            "p2": 0,
-                            "p3": 0,
-                            "char": char if step == 0 else "",  # only send char on first stroke
-                            "x": round(char_x, 2),
-                            "y": round(cursor_y + dy, 2),
-                        },
+                    freq = rng.uniform(2.0, 3.0)
+                    dy = math.sin(t * math.pi * 2 * freq) * rng.uniform(3.0, 6.0)
+                    dy += rng.gauss(0.0 + global_drift, 0.5 * temperature)
+                    dy += slant * 0.1 * rng.gauss(0, 0.3)
+
+                    yield {
+                        "dx": round(dx, 3),
+                        "dy": round(dy, 3),
+                        "p1": 1,  # pen always down during char
+                        "p2": 0,
+                        "p3": 0,
+                        "char": char if step == 0 else "",  # only send char on first stroke
+                        "char_index": char_index,
+                        "x": round(char_x, 2),
+                        "y": round(cursor_y + dy, 2),
                     }
-
-                    yield stroke_event
-                    stroke_index += 1
                     char_x += dx
-
-                    delay = config.stream_chunk_delay_ms / 1000.0
-                    delay *= random.uniform(0.2, 0.8)  # faster for mock strokes
-                    await asyncio.sleep(delay)
+                char_index += 1
 
             # Pen-up between words
-            word_space = random.uniform(8, 14)
+            word_space = rng.uniform(8, 14)
             yield {
-                "type": "stroke",
-                "index": stroke_index,
-                "data": {
-                    "dx": round(word_space, 3),
-                    "dy": 0.0,
-                    "p1": 0,
-                    "p2": 1,
-                    "p3": 0,
-                    "char": " ",
-                    "word_idx": word_idx,
-                    "x": round(char_x + word_space, 2),
-                    "y": round(cursor_y, 2),
-                    "pressure": 0.0,
-                },
+                "dx": round(word_space, 3),
+                "dy": 0.0,
+                "p1": 0,
+                "p2": 1,
+                "p3": 0,
+                "char": " ",
+                "char_index": char_index,
+                "word_idx": word_idx,
+                "x": round(char_x + word_space, 2),
+                "y": round(cursor_y, 2),
+                "pressure": 0.0,
             }
-            stroke_index += 1
             cursor_x = char_x + word_space
+            char_index += 1
 
-            await asyncio.sleep(0.02)
+        layout["words"] = total_words
+        layout["lines"] = line_num + 1
 
-        # Completion event
-        elapsed_ms = (time.monotonic() - start_time) * 1000
-        yield {
-            "type": "complete",
-            "total_strokes": stroke_index,
-            "total_words": total_words,
-            "lines": line_num + 1,
-            "generation_time_ms": round(elapsed_ms, 1),
-        }
+    @staticmethod
+    def _create_inference_service(config: EngineConfig, checkpoint_path: Path, device: str) -> Any:
+        """Build the inference service of the configured backend (not yet loaded)."""
+        if config.engine_backend == "onnx":
+            from app.services.onnx_inference import OnnxInferenceService
+
+            return OnnxInferenceService(
+                checkpoint_path=str(checkpoint_path),
+                stroke_budget_multiplier=config.stroke_budget_multiplier,
+                num_threads=config.onnx_num_threads,
+                cache_dir=config.onnx_cache_dir or None,
+            )
 
-        logger.info(
-            f"[req-{request_id}] Complete (mock): {stroke_index} strokes, {line_num + 1} lines"
+        from app.services.inference import InferenceService
+
+        return InferenceService(
+            checkpoint_path=str(checkpoint_path),
+            device=device,
+            stroke_budget_multiplier=config.stroke_budget_multiplier,
+        )
+
+    def _create_batcher(self, config: EngineConfig) -> Any:
+        """
+        Build the decode worker pool over the loaded inference service.
+
+        The max_concurrent_requests batch slots are split across the
+        workers, and so are the cores unless a per-worker thread count is set.
+        """
+        from app.ml.batching import ContinuousBatcher
+
+        workers = max(1, config.decode_workers)
+        threads = config.decode_threads_per_worker
+        if threads <= 0 and workers > 1:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+
+        return ContinuousBatcher(
+            self._inference_service,
+            max_batch_size=math.ceil(config.max_concurrent_requests / workers),
+            num_workers=workers,
+            threads_per_worker=threads,
+            max_queue=config.decode_queue_size,
         )
 
+    def _create_document_generator(self, config: EngineConfig) -> Any:
+        """Document generator over the loaded model, with the shared word stroke cache."""
+        from app.services.inference import DocumentGenerator
+        from app.services.stroke_cache import StrokeCache
+
+        stroke_cache = None
+        if config.stroke_cache_mb > 0:
+            stroke_cache = StrokeCache(max_bytes=config.stroke_cache_mb * 1024 * 1024)
+            logger.info(f"  → Word stroke cache: {config.stroke_cache_mb} MiB")
+
+        self._document_workers = 0
+        if config.document_workers > 0:
+            if config.engine_backend == "lstm":
+                self._document_workers = config.document_workers
+                logger.info(
+                    f"  → Document workers: {config.document_workers} (started on first document)"
+                )
+            else:
+                logger.warning(
+                    f"  → DOCUMENT_WORKERS ignored: the {config.engine_backend} backend "
+                    "generates documents in-process"
+                )
+        return DocumentGenerator(
+            self._inference_service,
+            stroke_cache=stroke_cache,
+            max_strokes=config.max_strokes_per_char,
+        )
+
+    def _apply_quantization(self, config: EngineConfig) -> None:
+        """Serve the int8 model if requested and it passes the parity check."""
+        if self._inference_service.quantization == "int8":
+            return  # Compiled int8 artifact
+        if config.quantization_bits != 8:
+            logger.warning(
+                f"  → {config.quantization_bits}-bit quantization not supported — serving fp32"
+            )
+            return
+
+        try:
+            report = self._inference_service.quantize_int8(config.quantization_max_nll_delta)
+        except Exception as e:
+            logger.warning(f"  → Int8 quantization skipped: {e}")
+            return
+
+        if self._inference_service.quantization == "int8":
+            logger.info(f"  → Dynamic int8 quantization (NLL delta {report.delta:+.4f})")
+        else:
+            logger.warning(
+                f"  → Int8 model refused: NLL delta {report.delta:+.4f} exceeds "
+                f"{config.quantization_max_nll_delta} — serving fp32"
+            )
+
+    def _open_stroke_store(self, store_dir: str) -> None:
+        """Memory-map the pre-generated word store and attach it to the model."""
+        try:
+            from app.services.stroke_store import StrokeStore
+
+            store = StrokeStore(
+                store_dir,
+                checkpoint=self._checkpoint_fingerprint,
+                style_table=self._inference_service.style_table_fingerprint(),
+            )
+        except Exception as e:
+            logger.warning(f"  → Stroke store unavailable ({store_dir}): {e}")
+            return
+
+        self._inference_service.stroke_store = store
+        logger.info(f"  → Stroke store: {store.num_words} words across {len(store.styles)} styles")
+
     # --------------------------------------------------------
     # Status & Introspection
     # --------------------------------------------------------
@@ -601,13 +1326,12 @@ class LLMEngine:
     def get_status(self) -> EngineStatus:
         """Return a snapshot of the engine's current state."""
         config = self._config or EngineConfig()
-        quant = self._resolve_quantization(config.quantization_bits)
 
         uptime = 0.0
         if self._start_time > 0:
             uptime = time.monotonic() - self._start_time
 
-        backend = "lstm" if self._use_real_model else "mock"
+        backend = config.engine_backend if self._use_real_model else "mock"
 
         return EngineStatus(
             model_loaded=self._model_loaded,
@@ -619,24 +1343,64 @@ class LLMEngine:
             vram_total_gb=self._vram_total_gb,
             vram_allocated_gb=self._vram_allocated_gb,
             vram_reserved_gb=self._vram_reserved_gb,
-            quantization=quant.value,
+            quantization=self._quantization.value,
             kv_cache_gb=config.kv_cache_size_gb,
             max_seq_len=config.max_seq_len,
             active_requests=self._active_requests,
             total_requests_served=self._total_requests,
             uptime_seconds=round(uptime, 1),
+            stroke_budget_exceeded=(
+                self._inference_service.budget_exceeded if self._inference_service else 0
+            ),
+            **self._admission_status(),
         )
 
+    def _metrics_backend(self) -> str:
+        """Backend label of request metrics."""
+        if self._use_real_model and self._config is not None:
+            return self._config.engine_backend
+        return "mock"
+
+    def _record_bulk(self, backend: str, arrival: float, requests: int, strokes: int) -> None:
+        """Count a finished batch or document (generate_batch / generate_document)."""
+        metrics.GENERATION_TIME.observe(time.monotonic() - arrival, backend=backend)
+        metrics.REQUESTS.inc(requests, backend=backend, outcome="completed")
+        metrics.STROKES.inc(strokes, backend=backend)
+
+    def _collect_metrics(self) -> None:
+        """Copy cache, budget and queue state into the metrics registry (at scrape time)."""
+        if self._result_cache is not None:
+            stats = self._result_cache.stats()
+            metrics.set_cache_stats("result", stats["hits"] + stats["spill_hits"], stats["misses"])
+        service = self._inference_service
+        if service is not None:
+            if service.stroke_store is not None:
+                store = service.stroke_store
+                metrics.set_cache_stats("stroke_store", store.hits, store.misses)
+            metrics.STROKE_BUDGET_EXCEEDED.set_total(service.budget_exceeded)
+        if self._document_generator is not None:
+            stroke_cache = self._document_generator.stroke_cache
+            if stroke_cache is not None:
+                metrics.set_cache_stats("stroke_cache", stroke_cache.hits, stroke_cache.misses)
+        if self._admission is not None:
+            metrics.QUEUE_DEPTH.set(self._admission.queue_depth)
+        metrics.ACTIVE_REQUESTS.set(self._active_requests)
+
+    def _admission_status(self) -> dict[str, Any]:
+        """Admission queue fields of EngineStatus."""
+        if self._admission is None:
+            return {}
+        stats = self._admission.stats()
+        return {
+            "queue_depth": stats["queue_depth"],
+            "queue_wait_ms_p50": stats["queue_wait_ms_p50"],
+            "queue_wait_ms_p95": stats["queue_wait_ms_p95"],
+            "expected_wait_ms": stats["expected_wait_ms"],
+            "admitted_requests": stats["admitted"],
+            "rejected_requests": stats["rejected"],
+        }
+
     @property
     def is_ready(self) -> bool:
         """Whether the engine is loaded and ready for inference."""
         return self._model_loaded
-
-    @staticmethod
-    def _resolve_quantization(bits: int) -> QuantizationMode:
-        """Map quantization bits config to enum."""
-        if bits == 4:
-            return QuantizationMode.INT4
-        elif bits == 8:
-            return QuantizationMode.INT8
-        return QuantizationMode.NONE
@@ -12,6 +12,12 @@ Model Architecture:
     Output Head:      MDN with M=20 Gaussian mixtures
     Pen State:        Bernoulli (sigmoid × 3)
 
+Variants (model_config["architecture"]):
+    "lstm"      → HandwritingLSTM: text pre-aligned to strokes, one
+                  character per timestep
+    "attention" → HandwritingAttentionLSTM: Graves soft window over the
+                  unaligned text, ends when the window leaves the text
+
 Stroke Representation:
     (Δx, Δy, p1, p2, p3)
     Δx, Δy = relative pen displacements
@@ -22,6 +28,38 @@ Stroke Representation:
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as functional
+
+
+def sampling_noise(
+    batch_size: int,
+    device: torch.device,
+    dtype: torch.dtype,
+    generators: list[torch.Generator | None] | None = None,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Random draws consumed by one sample_batch() step.
+
+    Args:
+        batch_size: Rows to sample.
+        device: Device of the model outputs.
+        dtype: Dtype of the model outputs.
+        generators: Optional per-row RNGs (None entries use the global RNG).
+
+    Returns:
+        Tuple of (uniform [B, 2], normal [B, 2]).
+    """
+    if generators is None:
+        uniform = torch.rand(batch_size, 2, device=device, dtype=dtype)
+        normal = torch.randn(batch_size, 2, device=device, dtype=dtype)
+    else:
+        uniform = torch.stack(
+            [torch.rand(2, generator=g, device=device, dtype=dtype) for g in generators]
+        )
+        normal = torch.stack(
+            [torch.randn(2, generator=g, device=device, dtype=dtype) for g in generators]
+        )
+    return uniform, normal
 
 
 class HandwritingLSTM(nn.Module):
@@ -41,6 +79,8 @@ class HandwritingLSTM(nn.Module):
     DROPOUT = 0.2
     NUM_MIXTURES = 20  # M=20 Gaussian components
 
+    architecture = "lstm"
+
     def __init__(
         self,
         vocab_size: int,
@@ -66,6 +106,8 @@ class HandwritingLSTM(nn.Module):
         super().__init__()
 
         self.num_mixtures = num_mixtures
+        self.char_embed_dim = char_embed_dim
+        self.style_dim = style_dim
 
         # Character embedding: one-hot → d=256
         self.char_embedding = nn.Embedding(vocab_size, char_embed_dim)
@@ -94,6 +136,10 @@ class HandwritingLSTM(nn.Module):
         self.mdn_head = nn.Linear(hidden_dim, mdn_output_dim)
         self.pen_head = nn.Linear(hidden_dim, pen_state_dim)
 
+        # Fused per-layer gate GEMMs, set only on int8 serving copies
+        # (see app.ml.quantization); step() uses them instead of nn.LSTM
+        self.gate_layers: nn.ModuleList | None = None
+
     def forward(
         self,
         char_seq: torch.Tensor,
@@ -140,11 +186,100 @@ class HandwritingLSTM(nn.Module):
 
         return mdn_params, pen_logits, hidden
 
+    def char_projection_table(self) -> torch.Tensor:
+        """
+        Precompute the character part of input_projection for step() decoding.
+
+        input_projection acts on [char_embed ‖ style_z ‖ stroke], so its output
+        splits into W_char·E[c] + W_style·z + W_stroke·stroke + b. The first
+        term (with the bias folded in) depends only on the character.
+
+        Returns:
+            Table [vocab_size, hidden_dim] of W_char·E + b per character.
+        """
+        w_char = self.input_projection.weight[:, : self.char_embed_dim]
+        return torch.addmm(self.input_projection.bias, self.char_embedding.weight, w_char.t())
+
+    def style_projection(self, style_z: torch.Tensor) -> torch.Tensor:
+        """
+        Precompute the style part of input_projection (W_style·z) for step() decoding.
+
+        Args:
+            style_z: Style embedding [batch, style_dim].
+
+        Returns:
+            Style projection [batch, hidden_dim].
+        """
+        start = self.char_embed_dim
+        w_style = self.input_projection.weight[:, start : start + self.style_dim]
+        return style_z @ w_style.t()
+
+    def step(
+        self,
+        char_proj: torch.Tensor,
+        style_proj: torch.Tensor,
+        prev_stroke: torch.Tensor,
+        hidden: tuple[torch.Tensor, torch.Tensor],
+    ) -> tuple[torch.Tensor, torch.Tensor, tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Single-timestep decode (inference only).
+
+        Equivalent to forward() with seq_len=1 in eval mode, but skips the
+        embedding lookup, concat and full input projection, and runs each
+        LSTM layer as one fused-gate cell update on the nn.LSTM weights.
+
+        Args:
+            char_proj: Rows of char_projection_table() [batch, hidden_dim].
+            style_proj: Output of style_projection() [batch, hidden_dim].
+            prev_stroke: Previous stroke tuples [batch, 5].
+            hidden: LSTM hidden state tuple (h, c), each [num_layers, batch, hidden_dim].
+
+        Returns:
+            Tuple of (mdn_params, pen_logits, hidden_state).
+            - mdn_params: [batch, M*6] — mixture parameters.
+            - pen_logits: [batch, 3] — pen state logits.
+            - hidden_state: Updated LSTM hidden state.
+        """
+        w_stroke = self.input_projection.weight[:, self.char_embed_dim + self.style_dim :]
+
+        # Only the 5-wide stroke part of the input projection runs per step
+        x = torch.addmm(char_proj + style_proj, prev_stroke, w_stroke.t())
+
+        h_prev, c_prev = hidden
+        h_next = []
+        c_next = []
+        for layer in range(self.lstm.num_layers):
+            # Fused gates [batch, 4*hidden] in nn.LSTM order: input, forget, cell, output
+            if self.gate_layers is not None:
+                gates = self.gate_layers[layer](torch.cat([x, h_prev[layer]], dim=1))
+            else:
+                w_ih = getattr(self.lstm, f"weight_ih_l{layer}")
+                w_hh = getattr(self.lstm, f"weight_hh_l{layer}")
+                b_ih = getattr(self.lstm, f"bias_ih_l{layer}")
+                b_hh = getattr(self.lstm, f"bias_hh_l{layer}")
+                gates = torch.addmm(b_ih + b_hh, x, w_ih.t())
+                gates = gates.addmm_(h_prev[layer], w_hh.t())
+            in_gate, forget_gate, cell_gate, out_gate = gates.chunk(4, dim=1)
+
+            c = torch.sigmoid(forget_gate) * c_prev[layer]
+            c = c + torch.sigmoid(in_gate) * torch.tanh(cell_gate)
+            h = torch.sigmoid(out_gate) * torch.tanh(c)
+
+            h_next.append(h)
+            c_next.append(c)
+            x = h
+
+        mdn_params = self.mdn_head(x)
+        pen_logits = self.pen_head(x)
+
+        return mdn_params, pen_logits, (torch.stack(h_next), torch.stack(c_next))
+
     def sample(
         self,
         mdn_params: torch.Tensor,
         pen_logits: torch.Tensor,
         temperature: float = 1.0,
+        generator: torch.Generator | None = None,
     ) -> tuple[float, float, int, int, int]:
         """
         Sample a single stroke tuple from the MDN output.
@@ -153,6 +288,7 @@ class HandwritingLSTM(nn.Module):
             mdn_params: MDN parameters for current timestep [M*6].
             pen_logits: Pen state logits [3].
             temperature: Sampling temperature τ.
+            generator: Per-request RNG (global RNG if None).
 
         Returns:
             Single stroke tuple (Δx, Δy, p1, p2, p3).
@@ -177,7 +313,7 @@ class HandwritingLSTM(nn.Module):
         sigma_y = sigma_y * (temperature**0.5)
 
         # 3. Sample mixture component from categorical distribution
-        mixture_idx = torch.multinomial(pi, 1).item()
+        mixture_idx = torch.multinomial(pi, 1, generator=generator).item()
 
         # 4. Sample (Δx, Δy) from bivariate Gaussian
         mu_x_k = mu_x[mixture_idx].item()
@@ -189,15 +325,14 @@ class HandwritingLSTM(nn.Module):
         # Bivariate Gaussian sampling using conditional method
         # x ~ N(μx, σx²)
         # y | x ~ N(μy + ρ*σy/σx*(x - μx), σy²*(1 - ρ²))
-        z1 = torch.randn(1).item()
-        z2 = torch.randn(1).item()
+        z1, z2 = torch.randn(2, generator=generator, device=mdn_params.device).tolist()
 
         dx = mu_x_k + sigma_x_k * z1
         dy = mu_y_k + sigma_y_k * (rho_k * z1 + (1 - rho_k**2) ** 0.5 * z2)
 
         # 5. Sample pen state from Bernoulli
         pen_probs = torch.softmax(pen_logits / temperature, dim=0)
-        pen_state = torch.multinomial(pen_probs, 1).item()
+        pen_state = torch.multinomial(pen_probs, 1, generator=generator).item()
 
         # Convert to one-hot: p1=pen_down, p2=pen_up, p3=end
         p1 = 1 if pen_state == 0 else 0
@@ -206,6 +341,94 @@ class HandwritingLSTM(nn.Module):
 
         return (dx, dy, p1, p2, p3)
 
+    def sample_batch(
+        self,
+        mdn_params: torch.Tensor,
+        pen_logits: torch.Tensor,
+        temperature: torch.Tensor,
+        generators: list[torch.Generator | None] | None = None,
+    ) -> torch.Tensor:
+        """
+        Sample one stroke per batch row from the MDN output, on device.
+
+        Vectorized counterpart of sample(): no .item() calls, so the result
+        can be fed straight back into the model without a host round-trip.
+        Mixture and pen components are drawn by inverse-CDF sampling.
+
+        Args:
+            mdn_params: MDN parameters for current timestep [B, M*6].
+            pen_logits: Pen state logits [B, 3].
+            temperature: Per-row sampling temperature τ [B].
+            generators: Optional per-row RNGs. Each row then draws its noise
+                from its own stream, so its strokes do not depend on which
+                other rows share the batch (None entries use the global RNG).
+
+        Returns:
+            Stroke tensor [B, 5] of (Δx, Δy, p1, p2, p3), pen states one-hot.
+        """
+        uniform, normal = sampling_noise(
+            mdn_params.size(0), mdn_params.device, mdn_params.dtype, generators
+        )
+        return self.sample_from_noise(mdn_params, pen_logits, temperature, uniform, normal)
+
+    def sample_from_noise(
+        self,
+        mdn_params: torch.Tensor,
+        pen_logits: torch.Tensor,
+        temperature: torch.Tensor,
+        uniform: torch.Tensor,
+        normal: torch.Tensor,
+    ) -> torch.Tensor:
+        """
+        Deterministic part of sample_batch(), given its random draws.
+
+        Free of Python-side randomness and host syncs, so it can be traced
+        into a compiled decode step (see app.ml.decode_export).
+
+        Args:
+            mdn_params: MDN parameters for current timestep [B, M*6].
+            pen_logits: Pen state logits [B, 3].
+            temperature: Per-row sampling temperature τ [B].
+            uniform: Uniforms for the mixture and pen draws [B, 2].
+            normal: Standard normals for the Gaussian [B, 2].
+
+        Returns:
+            Stroke tensor [B, 5] of (Δx, Δy, p1, p2, p3), pen states one-hot.
+        """
+        batch_size = mdn_params.size(0)
+        num_m = self.num_mixtures
+
+        params = mdn_params.reshape(batch_size, num_m, 6)
+        temp = temperature.to(mdn_params.dtype).view(batch_size, 1)  # [B, 1]
+
+        # Temperature: scale mixture logits by 1/τ, sigmas by √τ
+        pi = torch.softmax(params[:, :, 0] / temp, dim=-1)  # [B, M]
+        pen_probs = torch.softmax(pen_logits / temp, dim=-1)  # [B, 3]
+
+        # Mixture component via inverse CDF: count of cumulative weights below u
+        mixture_idx = (pi.cumsum(dim=-1) < uniform[:, 0:1]).sum(dim=-1, keepdim=True)
+        mixture_idx = mixture_idx.clamp(max=num_m - 1)  # [B, 1]
+
+        # Gather the chosen component's parameters: [B, 6]
+        chosen = params.gather(1, mixture_idx.unsqueeze(-1).expand(-1, -1, 6)).squeeze(1)
+        mu_x = chosen[:, 1]
+        mu_y = chosen[:, 2]
+        sigma_x = torch.exp(chosen[:, 3]) * temp[:, 0].sqrt()
+        sigma_y = torch.exp(chosen[:, 4]) * temp[:, 0].sqrt()
+        rho = torch.tanh(chosen[:, 5])
+
+        # Bivariate Gaussian sampling using conditional method
+        z1 = normal[:, 0]
+        z2 = normal[:, 1]
+        dx = mu_x + sigma_x * z1
+        dy = mu_y + sigma_y * (rho * z1 + torch.sqrt(1 - rho**2) * z2)
+
+        # Pen state via inverse CDF, then one-hot: p1=pen_down, p2=pen_up, p3=end
+        pen_state = (pen_probs.cumsum(dim=-1) < uniform[:, 1:2]).sum(dim=-1).clamp(max=2)
+        pen = functional.one_hot(pen_state, num_classes=3).to(mdn_params.dtype)
+
+        return torch.cat([dx.unsqueeze(1), dy.unsqueeze(1), pen], dim=1)
+
     def get_initial_hidden(self, batch_size: int) -> tuple[torch.Tensor, torch.Tensor]:
         """
         Get zero-initialized hidden state for LSTM.
@@ -222,6 +445,215 @@ class HandwritingLSTM(nn.Module):
         return (h0, c0)
 
 
+class HandwritingAttentionLSTM(nn.Module):
+    """
+    LSTM + MDN with a Graves soft attention window over the text.
+
+    Instead of being fed one character per timestep (which needs the text
+    pre-aligned to the strokes), the model attends to the whole character
+    sequence through a mixture of K Gaussian windows whose position κ only
+    moves forward (Graves 2013, Section 5):
+
+        (α, β, κ̂) = exp(W_w·h¹ₜ + b_w)            each [K]
+        κₜ        = κₜ₋₁ + κ̂
+        φ(t, u)   = Σₖ αₖ · exp(-βₖ (κₜₖ - u)²)
+        wₜ        = Σᵤ φ(t, u) · E[cᵤ]
+
+    The first layer reads [strokeₜ₋₁ ‖ wₜ₋₁ ‖ z] and emits the window; the
+    layers above read [strokeₜ₋₁ ‖ wₜ ‖ z ‖ hˡ⁻¹ₜ]. Generation ends when the
+    window weight on the position one past the last character exceeds the
+    weight on every character (see InferenceService).
+    """
+
+    architecture = "attention"
+
+    # Gaussian components of the attention window
+    WINDOW_MIXTURES = 10
+
+    def __init__(
+        self,
+        vocab_size: int,
+        char_embed_dim: int = HandwritingLSTM.CHAR_EMBED_DIM,
+        style_dim: int = HandwritingLSTM.STYLE_DIM,
+        hidden_dim: int = HandwritingLSTM.HIDDEN_DIM,
+        num_layers: int = HandwritingLSTM.NUM_LAYERS,
+        dropout: float = HandwritingLSTM.DROPOUT,
+        num_mixtures: int = HandwritingLSTM.NUM_MIXTURES,
+        window_mixtures: int = WINDOW_MIXTURES,
+    ) -> None:
+        """
+        Initialize the attention LSTM+MDN model.
+
+        Args:
+            vocab_size: Number of unique characters in vocabulary.
+            char_embed_dim: Character embedding dimension (window width).
+            style_dim: Style latent vector dimension (z ∈ ℝ¹²⁸).
+            hidden_dim: LSTM hidden state dimension.
+            num_layers: Number of LSTM layers.
+            dropout: Dropout probability between layers.
+            num_mixtures: Number of MDN Gaussian components.
+            window_mixtures: Number of attention window Gaussians (K).
+        """
+        super().__init__()
+
+        self.num_mixtures = num_mixtures
+        self.char_embed_dim = char_embed_dim
+        self.style_dim = style_dim
+        self.hidden_dim = hidden_dim
+        self.num_layers = num_layers
+        self.window_mixtures = window_mixtures
+
+        self.char_embedding = nn.Embedding(vocab_size, char_embed_dim)
+
+        # Every layer sees the previous stroke, the window and the style
+        input_dim = 5 + char_embed_dim + style_dim
+        self.cells = nn.ModuleList(
+            nn.LSTMCell(input_dim + (hidden_dim if layer > 0 else 0), hidden_dim)
+            for layer in range(num_layers)
+        )
+        self.dropout = nn.Dropout(dropout)
+
+        # Window parameters (α, β, κ̂) per component, from the first layer
+        self.window_head = nn.Linear(hidden_dim, window_mixtures * 3)
+
+        self.mdn_head = nn.Linear(hidden_dim, num_mixtures * 6)
+        self.pen_head = nn.Linear(hidden_dim, 3)
+
+    def initial_state(
+        self, batch_size: int
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Get the zero-initialized recurrent state.
+
+        Args:
+            batch_size: Batch size.
+
+        Returns:
+            Tuple of (h [L, B, H], c [L, B, H], κ [B, K], window [B, E]).
+        """
+        device = self.window_head.weight.device
+        h0 = torch.zeros(self.num_layers, batch_size, self.hidden_dim, device=device)
+        c0 = torch.zeros(self.num_layers, batch_size, self.hidden_dim, device=device)
+        kappa = torch.zeros(batch_size, self.window_mixtures, device=device)
+        window = torch.zeros(batch_size, self.char_embed_dim, device=device)
+        return (h0, c0, kappa, window)
+
+    def step(
+        self,
+        prev_stroke: torch.Tensor,
+        style_z: torch.Tensor,
+        char_embed: torch.Tensor,
+        char_mask: torch.Tensor | None,
+        state: tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor],
+    ) -> tuple[
+        torch.Tensor,
+        torch.Tensor,
+        tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor],
+        torch.Tensor,
+    ]:
+        """
+        Advance one timestep.
+
+        Args:
+            prev_stroke: Previous stroke tuples [B, 5].
+            style_z: Style embedding [B, style_dim].
+            char_embed: Embedded text [B, U, char_embed_dim].
+            char_mask: 1 for real characters, 0 for padding [B, U] (None = no padding).
+            state: Recurrent state from initial_state() or a previous step().
+
+        Returns:
+            Tuple of (mdn_params, pen_logits, state, phi).
+            - mdn_params: [B, M*6] — mixture parameters.
+            - pen_logits: [B, 3] — pen state logits.
+            - state: Updated recurrent state.
+            - phi: Window weights [B, U + 1]; the last column is the position
+              one past the end of the text (padding positions are zeroed).
+        """
+        h_prev, c_prev, kappa, window = state
+        num_chars = char_embed.size(1)
+
+        h, c = self.cells[0](
+            torch.cat([prev_stroke, window, style_z], dim=-1), (h_prev[0], c_prev[0])
+        )
+        h_next = [h]
+        c_next = [c]
+
+        # Soft window from the first layer: κ only ever moves forward
+        alpha, beta, kappa_step = torch.exp(self.window_head(h)).chunk(3, dim=-1)  # [B, K] each
+        kappa = kappa + kappa_step
+        positions = torch.arange(num_chars + 1, device=h.device, dtype=h.dtype)  # [U + 1]
+        phi = (
+            alpha.unsqueeze(-1)
+            * torch.exp(-beta.unsqueeze(-1) * (kappa.unsqueeze(-1) - positions) ** 2)
+        ).sum(1)  # [B, U + 1]
+        if char_mask is not None:
+            phi = phi * torch.cat([char_mask.to(phi.dtype), torch.ones_like(phi[:, :1])], dim=1)
+        window = torch.bmm(phi[:, :num_chars].unsqueeze(1), char_embed).squeeze(1)  # [B, E]
+
+        x = h
+        for layer in range(1, self.num_layers):
+            layer_input = torch.cat([prev_stroke, window, style_z, self.dropout(x)], dim=-1)
+            x, c = self.cells[layer](layer_input, (h_prev[layer], c_prev[layer]))
+            h_next.append(x)
+            c_next.append(c)
+
+        mdn_params = self.mdn_head(x)
+        pen_logits = self.pen_head(x)
+
+        return (
+            mdn_params,
+            pen_logits,
+            (torch.stack(h_next), torch.stack(c_next), kappa, window),
+            phi,
+        )
+
+    def forward(
+        self,
+        char_seq: torch.Tensor,
+        stroke_seq: torch.Tensor,
+        style_z: torch.Tensor,
+        hidden: tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor] | None = None,
+        char_mask: torch.Tensor | None = None,
+    ) -> tuple[
+        torch.Tensor, torch.Tensor, tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]
+    ]:
+        """
+        Forward pass (teacher forcing).
+
+        Args:
+            char_seq: Unaligned character indices [batch, text_len].
+            stroke_seq: Previous stroke tuples [batch, seq_len, 5].
+            style_z: Style embedding [batch, style_dim].
+            hidden: Optional recurrent state from initial_state().
+            char_mask: 1 for real characters, 0 for padding [batch, text_len].
+
+        Returns:
+            Tuple of (mdn_params, pen_logits, state).
+            - mdn_params: [batch, seq_len, M*6] — mixture parameters.
+            - pen_logits: [batch, seq_len, 3] — pen state logits.
+            - state: Final recurrent state.
+        """
+        batch_size, seq_len, _ = stroke_seq.shape
+        char_embed = self.char_embedding(char_seq)  # [B, U, E]
+        state = hidden if hidden is not None else self.initial_state(batch_size)
+
+        mdn_steps = []
+        pen_steps = []
+        for t in range(seq_len):
+            mdn_params, pen_logits, state, _ = self.step(
+                stroke_seq[:, t], style_z, char_embed, char_mask, state
+            )
+            mdn_steps.append(mdn_params)
+            pen_steps.append(pen_logits)
+
+        return torch.stack(mdn_steps, dim=1), torch.stack(pen_steps, dim=1), state
+
+    # Same MDN head layout as HandwritingLSTM, so the samplers are shared
+    sample = HandwritingLSTM.sample
+    sample_batch = HandwritingLSTM.sample_batch
+    sample_from_noise = HandwritingLSTM.sample_from_noise
+
+
 class StyleEncoder(nn.Module):
     """
     CNN-based style encoder.
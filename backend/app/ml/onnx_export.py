@@ -0,0 +1,248 @@
+"""
+INKFORGE — ONNX Decode Step Export
+
+Exports HandwritingLSTM's single-step decode (step + MDN sampling +
+denormalization) to ONNX for the "onnx" engine backend, which runs it under
+onnxruntime's CPU execution provider.
+
+Graph (<checkpoint>.decode.onnx):
+    inputs:  chars [B] int64, style_ids [B] int64, prev_stroke [B, 5],
+             h [L, B, H], c [L, B, H], temperature [B],
+             uniform [B, 2], normal [B, 2]
+    outputs: stroke [B, 5], h_out [L, B, H], c_out [L, B, H]
+
+The recurrent state is an explicit input/output, and the recurrence runs
+through nn.LSTM (exported as an ONNX LSTM node) so ORT can use its fused
+LSTM kernel. Style presets are baked in as a W_style·z table indexed by
+style_ids. As with the TorchScript step, the random draws are inputs, so
+the caller keeps its per-request generators.
+
+Metadata the runtime needs (layer sizes, presets, stroke stats) is written
+to a JSON sidecar, <checkpoint>.decode.onnx.json, so reading it needs no
+onnx package.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+import torch
+import torch.nn as nn
+
+from .model import HandwritingLSTM
+
+# Bump when the graph signature or the sidecar layout changes
+ONNX_FORMAT_VERSION = 1
+
+INPUT_NAMES = ["chars", "style_ids", "prev_stroke", "h", "c", "temperature", "uniform", "normal"]
+OUTPUT_NAMES = ["stroke", "h_out", "c_out"]
+
+# Batch axis of every input/output (the recurrent state is [L, B, H])
+_DYNAMIC_AXES = {
+    name: {1 if name in ("h", "c", "h_out", "c_out") else 0: "batch"}
+    for name in INPUT_NAMES + OUTPUT_NAMES
+}
+
+
+def onnx_artifact_path(checkpoint_path: str | Path, cache_dir: str | Path | None = None) -> Path:
+    """
+    Where the ONNX decode step of a checkpoint is (or would be) stored.
+
+    Args:
+        checkpoint_path: Source checkpoint.
+        cache_dir: Export directory (None = next to the checkpoint).
+    """
+    checkpoint_path = Path(checkpoint_path)
+    name = f"{checkpoint_path.stem}.decode.onnx"
+    if cache_dir:
+        return Path(cache_dir) / name
+    return checkpoint_path.with_name(name)
+
+
+def metadata_path(onnx_path: str | Path) -> Path:
+    """JSON sidecar holding the metadata of an ONNX decode step."""
+    onnx_path = Path(onnx_path)
+    return onnx_path.with_name(f"{onnx_path.name}.json")
+
+
+class OnnxDecodeStep(nn.Module):
+    """Single decode step of a HandwritingLSTM in an ONNX-exportable form."""
+
+    def __init__(
+        self,
+        model: HandwritingLSTM,
+        style_embeddings: torch.Tensor,
+        stroke_mean: torch.Tensor,
+        stroke_std: torch.Tensor,
+    ) -> None:
+        """
+        Args:
+            model: Float HandwritingLSTM in eval mode.
+            style_embeddings: Style preset embeddings [num_presets, style_dim].
+            stroke_mean: Stroke delta mean [2].
+            stroke_std: Stroke delta std [2].
+        """
+        super().__init__()
+        self.model = model
+        stroke_start = model.char_embed_dim + model.style_dim
+        with torch.no_grad():
+            self.register_buffer("char_table", model.char_projection_table().clone())
+            self.register_buffer("preset_styles", model.style_projection(style_embeddings))
+            self.register_buffer(
+                "w_stroke", model.input_projection.weight[:, stroke_start:].t().clone()
+            )
+        self.register_buffer("stroke_mean", stroke_mean.clone())
+        self.register_buffer("stroke_std", stroke_std.clone())
+
+    def forward(
+        self,
+        chars: torch.Tensor,
+        style_ids: torch.Tensor,
+        prev_stroke: torch.Tensor,
+        h: torch.Tensor,
+        c: torch.Tensor,
+        temperature: torch.Tensor,
+        uniform: torch.Tensor,
+        normal: torch.Tensor,
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Advance B sequences by one stroke (see the module docstring for shapes)."""
+        x = self.char_table[chars] + self.preset_styles[style_ids] + prev_stroke @ self.w_stroke
+        out, (h, c) = self.model.lstm(x.unsqueeze(1), (h, c))
+        out = out[:, 0]
+
+        sampled = self.model.sample_from_noise(
+            self.model.mdn_head(out), self.model.pen_head(out), temperature, uniform, normal
+        )
+        stroke = torch.cat([sampled[:, :2] * self.stroke_std + self.stroke_mean, sampled[:, 2:]], 1)
+        return stroke, h, c
+
+
+def _example_inputs(step: OnnxDecodeStep, batch_size: int, generator: torch.Generator) -> tuple:
+    """Random decode-step inputs for export and parity checks."""
+    num_layers = step.model.lstm.num_layers
+    hidden = step.model.lstm.hidden_size
+    return (
+        torch.randint(0, step.char_table.size(0), (batch_size,), generator=generator),
+        torch.randint(0, step.preset_styles.size(0), (batch_size,), generator=generator),
+        torch.randn(batch_size, 5, generator=generator),
+        torch.randn(num_layers, batch_size, hidden, generator=generator),
+        torch.randn(num_layers, batch_size, hidden, generator=generator),
+        torch.rand(batch_size, generator=generator) + 0.1,
+        torch.rand(batch_size, 2, generator=generator),
+        torch.randn(batch_size, 2, generator=generator),
+    )
+
+
+def check_onnx_parity(
+    session: Any,
+    reference: OnnxDecodeStep,
+    batch_sizes: tuple[int, ...] = (1, 3, 8),
+    steps: int = 16,
+) -> float:
+    """
+    Largest difference between an onnxruntime session and the eager step.
+
+    Args:
+        session: onnxruntime.InferenceSession of the exported graph.
+        reference: Eager OnnxDecodeStep it was exported from.
+        batch_sizes: Batch sizes to check (the graph must generalize over B).
+        steps: Decode steps per batch size, feeding eager outputs back.
+
+    Returns:
+        Maximum absolute difference over strokes and recurrent states.
+    """
+    generator = torch.Generator().manual_seed(1)
+    worst = 0.0
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            inputs = list(_example_inputs(reference, batch_size, generator))
+            for _ in range(steps):
+                inputs[6] = torch.rand(batch_size, 2, generator=generator)
+                inputs[7] = torch.randn(batch_size, 2, generator=generator)
+                expected = reference(*inputs)
+                feeds = {
+                    name: value.numpy() for name, value in zip(INPUT_NAMES, inputs, strict=True)
+                }
+                actual = session.run(OUTPUT_NAMES, feeds)
+                for a, b in zip(actual, expected, strict=True):
+                    worst = max(worst, float(abs(a - b.numpy()).max()))
+                inputs[2], inputs[3], inputs[4] = expected
+    return worst
+
+
+def export_onnx_decode_step(
+    model: HandwritingLSTM,
+    output_path: str | Path,
+    style_embeddings: torch.Tensor,
+    stroke_mean: torch.Tensor,
+    stroke_std: torch.Tensor,
+    metadata: dict[str, Any],
+    atol: float = 1e-4,
+    opset_version: int = 17,
+) -> float:
+    """
+    Export, verify and save the ONNX decode step of a model.
+
+    The graph is written next to output_path first and only moved into
+    place once onnxruntime reproduces the eager step within atol.
+
+    Args:
+        model: Float HandwritingLSTM in eval mode.
+        output_path: Destination .onnx file (the sidecar goes next to it).
+        style_embeddings: Style preset embeddings [num_presets, style_dim].
+        stroke_mean: Stroke delta mean [2].
+        stroke_std: Stroke delta std [2].
+        metadata: JSON-serializable metadata (presets, stroke_stats, ...).
+        atol: Largest accepted difference.
+        opset_version: ONNX opset to export.
+
+    Returns:
+        Measured maximum difference.
+
+    Raises:
+        ValueError: If the model cannot be exported or parity fails.
+    """
+    import onnxruntime
+
+    if getattr(model, "architecture", "lstm") != "lstm" or model.gate_layers is not None:
+        raise ValueError("Only float LSTM models can be exported to ONNX")
+
+    model = model.cpu().eval()
+    reference = OnnxDecodeStep(
+        model, style_embeddings.cpu(), stroke_mean.cpu(), stroke_std.cpu()
+    ).eval()
+
+    output_path = Path(output_path)
+    tmp_path = output_path.with_suffix(".tmp")
+    generator = torch.Generator().manual_seed(0)
+    with torch.no_grad():
+        torch.onnx.export(
+            reference,
+            _example_inputs(reference, 2, generator),
+            str(tmp_path),
+            input_names=INPUT_NAMES,
+            output_names=OUTPUT_NAMES,
+            dynamic_axes=_DYNAMIC_AXES,
+            opset_version=opset_version,
+        )
+
+    session = onnxruntime.InferenceSession(str(tmp_path), providers=["CPUExecutionProvider"])
+    error = check_onnx_parity(session, reference)
+    if error > atol:
+        tmp_path.unlink()
+        raise ValueError(f"ONNX decode step differs from eager by {error:.2e} (atol {atol})")
+
+    sidecar = {
+        **metadata,
+        "format": ONNX_FORMAT_VERSION,
+        "num_layers": model.lstm.num_layers,
+        "hidden_dim": model.lstm.hidden_size,
+        "num_presets": reference.preset_styles.size(0),
+        "stroke_mean": stroke_mean.tolist(),
+        "stroke_std": stroke_std.tolist(),
+    }
+    metadata_path(output_path).write_text(json.dumps(sidecar), encoding="utf-8")
+    tmp_path.replace(output_path)
+    return error
@@ -0,0 +1,166 @@
+"""
+INKFORGE — Stream Pacing
+
+Controls how fast stream_generate() hands strokes to its consumer.
+
+Modes:
+    - "unpaced"  → no sleeps; strokes are yielded as fast as they are
+                   produced, with a zero-length yield to the event loop
+                   every UNPACED_YIELD_EVERY strokes so one stream cannot
+                   starve the others (batch jobs, tests, exports)
+    - "paced"    → fixed sleep after every stroke (the live animation)
+    - "adaptive" → paces against a deadline clock: sleeps only for the part
+                   of the interval the consumer has not already used up,
+                   and never adds delay on top of a consumer that is
+                   slower than the target rate
+
+A paced or adaptive request with a zero delay resolves to "unpaced".
+
+Usage:
+    pacer = StreamPacer.create("adaptive", delay_ms=20)
+    for stroke in strokes:
+        yield stroke
+        await pacer.pace()
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from enum import Enum
+from typing import Any
+
+from app.ml.profiling import RequestProfile
+
+# Strokes between event-loop yields in unpaced mode
+UNPACED_YIELD_EVERY = 64
+
+
+class PacingMode(str, Enum):
+    """Stroke pacing strategy for streamed generation."""
+
+    UNPACED = "unpaced"
+    PACED = "paced"
+    ADAPTIVE = "adaptive"
+
+
+def resolve_pacing_mode(mode: str | PacingMode, delay_ms: float) -> PacingMode:
+    """
+    Resolve a requested pacing mode against the configured delay.
+
+    Args:
+        mode: Requested mode name or enum.
+        delay_ms: Per-stroke delay in milliseconds.
+
+    Returns:
+        The effective PacingMode (UNPACED when there is no delay to apply).
+
+    Raises:
+        ValueError: If mode is not a known pacing mode.
+    """
+    mode = PacingMode(mode)
+    if delay_ms <= 0:
+        return PacingMode.UNPACED
+    return mode
+
+
+class StreamPacer:
+    """Per-request pacing state; call pace() once after every yielded stroke."""
+
+    def __init__(
+        self,
+        mode: PacingMode,
+        delay_s: float,
+        yield_every: int = UNPACED_YIELD_EVERY,
+        profile: RequestProfile | None = None,
+    ) -> None:
+        """
+        Args:
+            mode: Effective pacing mode.
+            delay_s: Target per-stroke interval in seconds.
+            yield_every: Strokes between event-loop yields when not sleeping.
+            profile: Timers of a profiled request (charged with pacing time).
+        """
+        self.mode = mode
+        self.delay = delay_s
+        self.yield_every = max(1, yield_every)
+        self.profile = profile
+
+        self._count = 0
+        self._clock = time.monotonic()
+
+    @classmethod
+    def create(
+        cls, mode: str | PacingMode, delay_ms: float, profile: RequestProfile | None = None
+    ) -> StreamPacer:
+        """Build a pacer from a mode name and a delay in milliseconds."""
+        return cls(resolve_pacing_mode(mode, delay_ms), delay_ms / 1000.0, profile=profile)
+
+    async def pace(self, delay: float | None = None) -> None:
+        """
+        Wait (or not) after one stroke, according to the mode.
+
+        Args:
+            delay: Interval override in seconds for this stroke (defaults to
+                the configured delay). Ignored in unpaced mode.
+        """
+        if self.profile is None:
+            await self._pace(delay)
+            return
+        started = time.perf_counter()
+        await self._pace(delay)
+        self.profile.add("pace", started)
+
+    async def _pace(self, delay: float | None) -> None:
+        self._count += 1
+
+        if self.mode is PacingMode.UNPACED:
+            await self._yield_periodically()
+            return
+
+        delay = self.delay if delay is None else delay
+
+        if self.mode is PacingMode.PACED:
+            await asyncio.sleep(delay)
+            return
+
+        # Adaptive: sleep only until this stroke's deadline
+        now = time.monotonic()
+        deadline = self._clock + delay
+        if deadline > now:
+            self._clock = deadline
+            await asyncio.sleep(deadline - now)
+        else:
+            # Consumer is already slower than the target rate — don't add delay
+            self._clock = now
+            await self._yield_periodically()
+
+    async def _yield_periodically(self) -> None:
+        """Give other tasks a turn every yield_every strokes."""
+        if self._count % self.yield_every == 0:
+            await asyncio.sleep(0)
+
+
+async def pace_events(
+    events: AsyncIterator[dict[str, Any]], pacer: StreamPacer
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Re-pace an already generated event stream (e.g. relayed from a worker).
+
+    Args:
+        events: Stream events.
+        pacer: Pacer applied after every stroke event.
+
+    Yields:
+        The same events, in order.
+    """
+    try:
+        async for event in events:
+            yield event
+            if event.get("type") == "stroke":
+                await pacer.pace()
+    finally:
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
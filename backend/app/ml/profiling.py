@@ -0,0 +1,152 @@
+"""
+INKFORGE — Request Profiling
+
+Opt-in, per-request wall-clock timers for the streaming hot path, to tell
+where a slow request's time went. Enabled per request with the
+X-Inkforge-Profile header (PROFILE_REQUESTS=header) or for every request
+(PROFILE_REQUESTS=all).
+
+Phases:
+    queue       admission queue wait
+    store       stroke store lookups (pre-generated words)
+    prepare     begin_decode(): tokenization, style projection, initial state
+    gather      stacking the batch's per-request tensors for one step
+    model_step  one batched model step (fused with sampling for compiled/onnx)
+    sample      MDN sampling + denormalization of one batched step
+    finish      host transfer and per-request state update of one step
+    pace        stream pacing (animation sleeps)
+    serialize   encoding outgoing events (JSON / binary frames)
+    send        handing encoded events to the connection
+
+Decode phases are batched: a request is charged the whole step it took
+part in, shared with the other requests of that batch.
+
+The summary is attached to the complete event as "profile". With
+PROFILE_TRACE=true every timed span is also kept and written as a Chrome
+trace-event JSON file (the format of torch.profiler's export_chrome_trace
+and py-spy --format chrometrace; open it in Perfetto or chrome://tracing).
+At most MAX_TRACE_SPANS spans are kept per request; later ones still count
+towards the phase totals and are reported as "dropped_spans".
+
+A request without a profile pays one `is None` check per stroke and one
+per batched step.
+
+Usage:
+    profile = RequestProfile(trace=True)
+    started = time.perf_counter()
+    ...
+    profile.add("serialize", started)
+    profile.summary()
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+# Request header that turns profiling on for one job (PROFILE_REQUESTS=header)
+PROFILE_HEADER = "X-Inkforge-Profile"
+
+# Values of PROFILE_REQUESTS
+PROFILE_MODES = ("off", "header", "all")
+
+# Spans kept per traced request (~100 bytes each); the rest are only summed
+MAX_TRACE_SPANS = 50_000
+
+
+class RequestProfile:
+    """
+    Accumulated per-phase time of one request.
+
+    Each phase is written by one thread only (decode phases by the decode
+    worker, the rest by the event loop), so no lock is needed.
+
+    Args:
+        trace: Keep spans for write_trace() (up to max_spans).
+        trace_path: Where write_trace() puts the file.
+        max_spans: Spans kept; later ones are counted in dropped_spans.
+    """
+
+    def __init__(
+        self,
+        trace: bool = False,
+        trace_path: str | Path | None = None,
+        max_spans: int = MAX_TRACE_SPANS,
+    ) -> None:
+        self.trace_path = Path(trace_path) if trace and trace_path else None
+        self.phases: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.spans: list[tuple[str, float, float, str]] | None = [] if trace else None
+        self.max_spans = max_spans
+        self.dropped_spans = 0
+        self._origin = time.perf_counter()
+
+    def add(self, phase: str, started: float, ended: float | None = None) -> None:
+        """
+        Charge one span to a phase.
+
+        Args:
+            phase: Phase name.
+            started: time.perf_counter() at the start of the span.
+            ended: time.perf_counter() at its end (default: now).
+        """
+        if ended is None:
+            ended = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (ended - started)
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+        if self.spans is not None:
+            if len(self.spans) < self.max_spans:
+                self.spans.append((phase, started, ended, threading.current_thread().name))
+            else:
+                self.dropped_spans += 1
+
+    def summary(self) -> dict[str, Any]:
+        """Total and per-phase milliseconds (and span counts) so far."""
+        summary: dict[str, Any] = {
+            "total_ms": round((time.perf_counter() - self._origin) * 1000, 2),
+            "phases": {
+                phase: {"ms": round(seconds * 1000, 2), "count": self.counts[phase]}
+                for phase, seconds in self.phases.items()
+            },
+        }
+        if self.trace_path is not None:
+            summary["trace"] = str(self.trace_path)
+        if self.dropped_spans:
+            summary["dropped_spans"] = self.dropped_spans
+        return summary
+
+    def write_trace(self) -> Path | None:
+        """
+        Write the recorded spans as Chrome trace-event JSON.
+
+        Returns:
+            The trace path, or None when tracing is off.
+        """
+        if self.spans is None or self.trace_path is None:
+            return None
+
+        threads: dict[str, int] = {}
+        events: list[dict[str, Any]] = []
+        for phase, started, ended, thread in self.spans:
+            tid = threads.setdefault(thread, len(threads))
+            events.append(
+                {
+                    "name": phase,
+                    "ph": "X",
+                    "ts": round((started - self._origin) * 1e6, 3),
+                    "dur": round((ended - started) * 1e6, 3),
+                    "pid": 0,
+                    "tid": tid,
+                }
+            )
+        for thread, tid in threads.items():
+            events.append(
+                {"name": "thread_name", "ph": "M", "pid": 0, "tid": tid, "args": {"name": thread}}
+            )
+
+        self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+        self.trace_path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+        return self.trace_path
@@ -0,0 +1,203 @@
+"""
+INKFORGE — Dynamic Int8 Quantization
+
+CPU serving copy of the handwriting model with int8 weights and fp32
+activations (torch dynamic quantization), plus the parity check that
+decides whether it may be served.
+
+What is quantized:
+    - HandwritingLSTM → the LSTM gate GEMMs, mdn_head and pen_head. The
+      decode path (step()) does not run nn.LSTM; each layer's [W_ih ‖ W_hh]
+      is fused into one Linear over [x ‖ h] (gate_layers) and that is what
+      gets int8 weights. nn.LSTM itself is quantized too, for forward().
+      input_projection stays fp32: ProjectionCache folds its character and
+      style blocks into per-request tables, leaving a 5-wide GEMM per step.
+    - HandwritingAttentionLSTM → the LSTMCells, mdn_head and pen_head. The
+      window head stays fp32; its output is exponentiated, so int8 error
+      there would move the window.
+
+Parity:
+    sequence_nll() runs a teacher-forced held-out batch through step() —
+    the path that is actually served — and the quantized model is only
+    accepted if its NLL is within max_nll_delta of the fp32 model's.
+"""
+
+from __future__ import annotations
+
+import copy
+import logging
+from dataclasses import dataclass
+
+import torch
+import torch.nn as nn
+
+from .model import HandwritingAttentionLSTM, HandwritingLSTM
+from .utils import compute_mdn_loss
+
+logger = logging.getLogger("inkforge.quantization")
+
+# Submodules given int8 weights, per architecture
+QUANTIZED_MODULES = {
+    "lstm": {"lstm", "gate_layers", "mdn_head", "pen_head"},
+    "attention": {"cells", "mdn_head", "pen_head"},
+}
+
+
+@dataclass
+class ParityReport:
+    """NLL of the held-out batch under the fp32 and int8 models."""
+
+    fp32_nll: float
+    int8_nll: float
+
+    @property
+    def delta(self) -> float:
+        return self.int8_nll - self.fp32_nll
+
+
+def fuse_gate_layers(model: HandwritingLSTM) -> nn.ModuleList:
+    """
+    Fuse each LSTM layer's input and recurrent weights into one Linear.
+
+    gates = W_ih·x + W_hh·h + b_ih + b_hh = [W_ih ‖ W_hh]·[x ‖ h] + b, so a
+    single (quantized) GEMM per layer replaces the two addmm calls of step().
+
+    Args:
+        model: Float HandwritingLSTM.
+
+    Returns:
+        One Linear(input + hidden → 4·hidden) per layer.
+    """
+    layers = nn.ModuleList()
+    for layer in range(model.lstm.num_layers):
+        w_ih = getattr(model.lstm, f"weight_ih_l{layer}")
+        w_hh = getattr(model.lstm, f"weight_hh_l{layer}")
+        b_ih = getattr(model.lstm, f"bias_ih_l{layer}")
+        b_hh = getattr(model.lstm, f"bias_hh_l{layer}")
+
+        fused = nn.Linear(w_ih.size(1) + w_hh.size(1), w_ih.size(0))
+        with torch.no_grad():
+            fused.weight.copy_(torch.cat([w_ih, w_hh], dim=1))
+            fused.bias.copy_(b_ih + b_hh)
+        layers.append(fused)
+    return layers
+
+
+def quantize_int8(
+    model: HandwritingLSTM | HandwritingAttentionLSTM,
+) -> HandwritingLSTM | HandwritingAttentionLSTM:
+    """
+    Build a dynamically int8-quantized copy of a model for CPU decoding.
+
+    Args:
+        model: Float model in eval mode (left unchanged).
+
+    Returns:
+        Quantized copy in eval mode, with the same step()/sample_batch() API.
+    """
+    quantized = copy.deepcopy(model).cpu().eval()
+    if quantized.architecture == "lstm":
+        quantized.gate_layers = fuse_gate_layers(quantized)
+
+    quantized = torch.ao.quantization.quantize_dynamic(
+        quantized, QUANTIZED_MODULES[quantized.architecture], dtype=torch.qint8
+    )
+    return quantized.eval()
+
+
+def sequence_nll(
+    model: HandwritingLSTM | HandwritingAttentionLSTM,
+    batch: dict[str, torch.Tensor],
+) -> float:
+    """
+    Teacher-forced MDN NLL of a batch, through the step() decode path.
+
+    Args:
+        model: Model in eval mode.
+        batch: "strokes" [B, T, 5] (normalized), "text_indices" [B, U], and
+            optionally "stroke_lengths" / "text_lengths" [B] and "style_z".
+
+    Returns:
+        Mean NLL per real timestep.
+    """
+    strokes = batch["strokes"].float()
+    text_indices = batch["text_indices"].long()
+    batch_size, seq_len, _ = strokes.shape
+    text_len = text_indices.size(1)
+
+    stroke_lengths = batch.get("stroke_lengths", torch.full((batch_size,), seq_len))
+    text_lengths = batch.get("text_lengths", torch.full((batch_size,), text_len))
+    style_z = batch.get("style_z")
+    if style_z is None:
+        style_z = torch.zeros(batch_size, model.style_dim)
+
+    prev_strokes = torch.zeros_like(strokes)
+    prev_strokes[:, 1:] = strokes[:, :-1]
+
+    mdn_steps = []
+    pen_steps = []
+    with torch.no_grad():
+        if model.architecture == "attention":
+            char_embed = model.char_embedding(text_indices)
+            char_mask = torch.arange(text_len) < text_lengths.unsqueeze(1)
+            state = model.initial_state(batch_size)
+            for t in range(seq_len):
+                mdn_params, pen_logits, state, _ = model.step(
+                    prev_strokes[:, t], style_z, char_embed, char_mask, state
+                )
+                mdn_steps.append(mdn_params)
+                pen_steps.append(pen_logits)
+        else:
+            # Same even character alignment as training
+            strokes_per_char = max(1, seq_len // text_len)
+            aligned = text_indices.repeat_interleave(strokes_per_char, dim=1)[:, :seq_len]
+            if aligned.size(1) < seq_len:
+                aligned = nn.functional.pad(aligned, (0, seq_len - aligned.size(1)))
+
+            char_table = model.char_projection_table()
+            style_proj = model.style_projection(style_z)
+            hidden = model.get_initial_hidden(batch_size)
+            for t in range(seq_len):
+                mdn_params, pen_logits, hidden = model.step(
+                    char_table[aligned[:, t]], style_proj, prev_strokes[:, t], hidden
+                )
+                mdn_steps.append(mdn_params)
+                pen_steps.append(pen_logits)
+
+        loss = compute_mdn_loss(
+            torch.stack(mdn_steps, dim=1),
+            torch.stack(pen_steps, dim=1),
+            strokes[:, :, :2],
+            strokes[:, :, 2:5].argmax(dim=-1),
+            num_mixtures=model.num_mixtures,
+            mask=torch.arange(seq_len) < stroke_lengths.unsqueeze(1),
+        )
+    return loss.item()
+
+
+def check_parity(
+    reference: HandwritingLSTM | HandwritingAttentionLSTM,
+    quantized: HandwritingLSTM | HandwritingAttentionLSTM,
+    batch: dict[str, torch.Tensor],
+) -> ParityReport:
+    """
+    Compare the held-out NLL of a quantized model against its fp32 reference.
+
+    Args:
+        reference: Float model (on CPU).
+        quantized: Output of quantize_int8(reference).
+        batch: Held-out batch (see sequence_nll).
+
+    Returns:
+        ParityReport with both NLLs.
+    """
+    batch = {key: value.cpu() for key, value in batch.items()}
+    report = ParityReport(
+        fp32_nll=sequence_nll(reference, batch),
+        int8_nll=sequence_nll(quantized, batch),
+    )
+    logger.info(
+        f"Int8 parity: NLL {report.fp32_nll:.4f} (fp32) → {report.int8_nll:.4f} (int8), "
+        f"delta {report.delta:+.4f}"
+    )
+    return report
@@ -0,0 +1,84 @@
+"""
+INKFORGE — Seeding
+
+Per-request random streams for reproducible generation.
+
+A request seed never touches the global torch/random state. Each request
+gets its own torch.Generator (model sampling) or random.Random (mock path,
+layout jitter), and the units of a request that may be generated out of
+order — the words of a document, the texts of a batch — each get a seed
+derived from the request seed and their index. Output is then identical
+whether the units are generated serially, batched together, or spread
+across worker processes.
+
+The style preset table is part of that: checkpoints store it (train.py),
+and older checkpoints without one get preset_style_embeddings(), drawn
+from a fixed seed, so every process serves the same presets.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import torch
+
+# Seeds accepted by the API: unsigned 32-bit (exact in JSON/JavaScript numbers)
+MAX_SEED = 2**32 - 1
+
+# Seed of the style preset table of checkpoints that do not store one
+STYLE_TABLE_SEED = 1_204_307
+
+
+def derive_seed(seed: int, index: int) -> int:
+    """
+    Derive the seed of one unit of a request (word, batch text).
+
+    Args:
+        seed: Request seed.
+        index: Position of the unit within the request.
+
+    Returns:
+        Independent 63-bit seed for that unit.
+    """
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") >> 1
+
+
+def make_generator(seed: int | None, device: str = "cpu") -> torch.Generator | None:
+    """
+    Build a seeded torch.Generator on the given device.
+
+    Args:
+        seed: Seed, or None for unseeded sampling (global RNG).
+        device: Device the sampled tensors live on.
+
+    Returns:
+        A seeded generator, or None when seed is None.
+    """
+    if seed is None:
+        return None
+
+    import torch
+
+    generator = torch.Generator(device=device)
+    generator.manual_seed(seed)
+    return generator
+
+
+def preset_style_embeddings(num_presets: int, style_dim: int = 128) -> torch.Tensor:
+    """
+    Default style preset table, identical in every process.
+
+    Args:
+        num_presets: Number of style presets.
+        style_dim: Style latent size of the model.
+
+    Returns:
+        Embeddings [num_presets, style_dim] drawn from STYLE_TABLE_SEED.
+    """
+    import torch
+
+    generator = torch.Generator().manual_seed(STYLE_TABLE_SEED)
+    return torch.randn(num_presets, style_dim, generator=generator)
@@ -0,0 +1,135 @@
+"""
+INKFORGE — Stroke Budget
+
+Per-character caps on the number of decode steps, learned from the
+training data, so a model that never emits pen-up for a character cannot
+spend thousands of steps on it.
+
+Statistics:
+    IAM lines are not segmented into characters, so strokes are attributed
+    the way train.py aligns them: every character of a line gets an equal
+    share, len(strokes) / len(text). Each character's distribution is the
+    set of shares from the lines it appears in.
+
+    Because every character of a line gets the same share, a character's
+    distribution is mostly the distribution of lines it appears in, and
+    common characters appear in nearly the same lines. Until the statistics
+    come from segmented (per-character aligned) data, the per-character caps
+    are therefore close to one global cap: they stop runaway characters but
+    do not tell a "w" from an "i".
+
+Caps:
+    cap(char) = ceil(p99(char) × multiplier), never below MIN_CAP. Characters
+    with too few observations fall back to the global distribution.
+
+compute_stroke_stats() runs in preprocess.py and train.py; the result is
+stored in the checkpoint under "stroke_stats" and turned into a
+StrokeBudget when InferenceService loads it.
+"""
+
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Any
+
+import numpy as np
+
+# Lowest cap, whatever the statistics say
+MIN_CAP = 4
+
+# Observations a character needs before its own p99 is trusted
+MIN_OBSERVATIONS = 20
+
+
+def compute_stroke_stats(
+    samples: Iterable[dict[str, Any]], max_seq_len: int | None = None
+) -> dict[str, Any]:
+    """
+    Compute per-character stroke-count distributions from training samples.
+
+    Args:
+        samples: Dicts with "text" and "strokes".
+        max_seq_len: Truncation applied to stroke sequences during training.
+
+    Returns:
+        {"alignment": "uniform",
+         "global": {"count", "p50", "p99"},
+         "chars": {char: {"count", "p50", "p99"}}}
+    """
+    shares: dict[str, list[float]] = defaultdict(list)
+    all_shares: list[float] = []
+
+    for sample in samples:
+        text = sample.get("text") or ""
+        num_strokes = len(sample.get("strokes", ()))
+        if max_seq_len is not None:
+            num_strokes = min(num_strokes, max_seq_len)
+        if not text or num_strokes == 0:
+            continue
+
+        share = num_strokes / len(text)
+        for char in text:
+            shares[char].append(share)
+        all_shares.extend([share] * len(text))
+
+    def _summary(values: list[float]) -> dict[str, float]:
+        p50, p99 = np.percentile(values, [50, 99])
+        return {"count": len(values), "p50": float(p50), "p99": float(p99)}
+
+    return {
+        "alignment": "uniform",
+        "global": _summary(all_shares) if all_shares else {"count": 0, "p50": 0.0, "p99": 0.0},
+        "chars": {char: _summary(values) for char, values in sorted(shares.items())},
+    }
+
+
+class StrokeBudget:
+    """Per-character decode step caps."""
+
+    def __init__(self, caps: dict[str, int], default_cap: int) -> None:
+        """
+        Args:
+            caps: Cap per character.
+            default_cap: Cap for characters without their own.
+        """
+        self.caps = caps
+        self.default_cap = default_cap
+
+    @classmethod
+    def from_stats(cls, stats: dict[str, Any], multiplier: float = 1.5) -> StrokeBudget | None:
+        """
+        Build caps of p99 × multiplier from compute_stroke_stats() output.
+
+        Args:
+            stats: Stroke statistics (as stored in the checkpoint).
+            multiplier: Headroom over the p99.
+
+        Returns:
+            A StrokeBudget, or None if the statistics are empty.
+        """
+        global_stats = stats.get("global", {})
+        if not global_stats.get("count"):
+            return None
+
+        def _cap(p99: float) -> int:
+            return max(MIN_CAP, math.ceil(p99 * multiplier))
+
+        caps = {
+            char: _cap(char_stats["p99"])
+            for char, char_stats in stats.get("chars", {}).items()
+            if char_stats["count"] >= MIN_OBSERVATIONS
+        }
+        return cls(caps, _cap(global_stats["p99"]))
+
+    def cap(self, char: str) -> int:
+        """Step cap for one character."""
+        return self.caps.get(char, self.default_cap)
+
+    def token_caps(self, vocab: dict[str, int]) -> list[int]:
+        """Caps indexed by token id (for tokenized decode states)."""
+        caps = [self.default_cap] * (max(vocab.values(), default=-1) + 1)
+        for char, index in vocab.items():
+            caps[index] = self.cap(char)
+        return caps
@@ -17,6 +17,7 @@ def compute_mdn_loss(
     target_strokes: torch.Tensor,
     target_pen: torch.Tensor,
     num_mixtures: int = 20,
+    mask: torch.Tensor | None = None,
 ) -> torch.Tensor:
     """
     Compute the MDN loss (negative log-likelihood) for stroke prediction.
@@ -27,6 +28,8 @@ def compute_mdn_loss(
         target_strokes: Ground truth (Δx, Δy) [batch, seq, 2].
         target_pen: Ground truth pen states [batch, seq] (class indices).
         num_mixtures: Number of Gaussian mixture components (M=20).
+        mask: Optional [batch, seq] weights, 1 for real timesteps and 0 for
+            padding. The loss is then averaged over real timesteps only.
 
     Returns:
         Scalar loss tensor.
@@ -80,15 +83,23 @@ def compute_mdn_loss(
     # Weighted sum using log-sum-exp: log(Σ π_k * N_k) = logsumexp(log π_k + log N_k)
     log_likelihood = torch.logsumexp(log_pi + log_gaussian, dim=-1)  # [batch, seq]
 
-    # Stroke loss: negative log-likelihood
-    stroke_loss = -log_likelihood.mean()
-
     # Pen state loss: cross-entropy (target must be long/int64)
-    pen_logits_flat = pen_logits.view(-1, 3)  # [batch*seq, 3]
-    target_pen_flat = target_pen.long().view(-1)  # [batch*seq]
-    pen_loss = functional.cross_entropy(
-        pen_logits_flat, target_pen_flat
-    )  # Corrected syntax from patch
+    pen_logits_flat = pen_logits.reshape(-1, 3)  # [batch*seq, 3]
+    target_pen_flat = target_pen.long().reshape(-1)  # [batch*seq]
+
+    if mask is None:
+        # Stroke loss: negative log-likelihood
+        stroke_loss = -log_likelihood.mean()
+        pen_loss = functional.cross_entropy(
+            pen_logits_flat, target_pen_flat
+        )  # Corrected syntax from patch
+    else:
+        # Padded timesteps contribute nothing
+        weights = mask.to(log_likelihood.dtype).reshape(-1)
+        denom = weights.sum().clamp(min=1.0)
+        stroke_loss = -(log_likelihood.reshape(-1) * weights).sum() / denom
+        pen_nll = functional.cross_entropy(pen_logits_flat, target_pen_flat, reduction="none")
+        pen_loss = (pen_nll * weights).sum() / denom
 
     # Total loss
     total_loss = stroke_loss + pen_loss
@@ -8,6 +8,9 @@ from enum import Enum
 
 from pydantic import BaseModel, Field, model_validator
 
+from app.ml.pacing import PacingMode
+from app.ml.seeding import MAX_SEED
+
 # ============================================================
 # Enums
 # ============================================================
@@ -122,6 +125,33 @@ class HumanizationParams(BaseModel):
         return values
 
 
+# ============================================================
+# Stream Framing
+# ============================================================
+
+
+class StreamFraming(BaseModel):
+    """
+    Groups streamed strokes into frames of column arrays (dx[], dy[], pen[]).
+
+    A frame is flushed after max_strokes strokes or once it spans
+    max_interval_ms, whichever comes first.
+    """
+
+    max_strokes: int = Field(
+        default=32,
+        ge=1,
+        le=4096,
+        description="Maximum strokes per frame.",
+    )
+    max_interval_ms: int = Field(
+        default=50,
+        ge=0,
+        le=5000,
+        description="Maximum time span of one frame in ms (0 = flush by count only).",
+    )
+
+
 # ============================================================
 # Style Preset
 # ============================================================
@@ -160,6 +190,20 @@ class GenerateRequest(BaseModel):
     paper_texture: PaperTexture = Field(default=PaperTexture.LINED)
     ink_color: InkColor = Field(default=InkColor.BLACK)
     font_size: FontSize = Field(default=FontSize.MEDIUM)
+    pacing: PacingMode | None = Field(
+        default=None,
+        description="Stroke pacing: unpaced | paced | adaptive (defaults to server setting).",
+    )
+    framing: StreamFraming | None = Field(
+        default=None,
+        description="Send strokes in frames of column arrays instead of one event per stroke.",
+    )
+    seed: int | None = Field(
+        default=None,
+        ge=0,
+        le=MAX_SEED,
+        description="Sampling seed: the same request and seed reproduce the same strokes.",
+    )
 
 
 class ExportRequest(BaseModel):
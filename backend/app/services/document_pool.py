@@ -0,0 +1,176 @@
+"""
+INKFORGE — Document Worker Pool
+
+Process pool for parallel word generation in DocumentGenerator. Words in
+a document start from a fresh hidden state, so once layout has assigned
+them to positions they can be generated independently.
+
+Each worker process loads the model once (pool initializer) and pins
+itself to a small number of intra-op threads, so N workers on N cores
+do not oversubscribe the CPU. Workers are handed the parent's style
+preset table, stroke budget and weight precision, so a word is written
+the same whichever process decodes it. Words are sent in batches and decoded
+together with InferenceService.generate_batch().
+
+Usage:
+    with DocumentWorkerPool("checkpoints/lstm_mdn_v1_best.pt", workers=32) as pool:
+        generator = DocumentGenerator(inference_service, worker_pool=pool)
+        layout = generator.generate_document(text)
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+from .inference import InferenceService
+
+logger = logging.getLogger("inkforge.document_pool")
+
+Stroke = tuple[float, float, int, int, int]
+
+# (word, style_id, temperature, seed)
+WordJob = tuple[str, str | int, float, int | None]
+
+# Per-process service, set by the pool initializer
+_worker_service: InferenceService | None = None
+
+
+def _init_worker(
+    checkpoint_path: str,
+    device: str,
+    vocab_path: str | None,
+    threads_per_worker: int,
+    style_embeddings: torch.Tensor | None,
+    stroke_budget_multiplier: float,
+    quantization: str,
+) -> None:
+    """Pool initializer: load the model once per worker process, matching the parent's."""
+    global _worker_service
+
+    torch.set_num_threads(threads_per_worker)
+    service = InferenceService(
+        checkpoint_path=checkpoint_path,
+        device=device,
+        vocab_path=vocab_path,
+        stroke_budget_multiplier=stroke_budget_multiplier,
+    )
+    service.load_model()
+    if style_embeddings is not None:
+        service.style_embeddings = style_embeddings
+    if quantization == "int8":
+        from ..ml.quantization import quantize_int8
+
+        # The parent already passed the parity check; the quantized weights are identical
+        service.model = quantize_int8(service.model)
+        service.quantization = "int8"
+    _worker_service = service
+
+
+def _generate_jobs(jobs: list[WordJob], max_strokes: int) -> list[list[Stroke]]:
+    """Pool task: decode one batch of words together."""
+    if _worker_service is None:
+        raise RuntimeError("Document worker not initialized")
+
+    words, style_ids, temperatures, seeds = zip(*jobs, strict=True)
+    return _worker_service.generate_batch(
+        list(words),
+        style_id=list(style_ids),
+        temperature=list(temperatures),
+        seed=list(seeds),
+        max_strokes=max_strokes,
+        max_batch_size=len(jobs),
+    )
+
+
+class DocumentWorkerPool:
+    """
+    Long-lived pool of model-holding worker processes.
+
+    Create once per process (model loading dominates pool startup) and
+    share it across documents.
+    """
+
+    def __init__(
+        self,
+        checkpoint_path: str,
+        workers: int | None = None,
+        device: str = "cpu",
+        vocab_path: str | None = None,
+        threads_per_worker: int = 1,
+        batch_size: int = 16,
+        style_embeddings: torch.Tensor | None = None,
+        stroke_budget_multiplier: float = 1.5,
+        quantization: str = "fp32",
+    ) -> None:
+        """
+        Start the worker processes.
+
+        Args:
+            checkpoint_path: Model checkpoint each worker loads.
+            workers: Number of worker processes (defaults to the CPU count).
+            device: PyTorch device string for the workers.
+            vocab_path: Optional path to vocabulary JSON file.
+            threads_per_worker: torch intra-op threads per worker.
+            batch_size: Maximum words per task (decoded as one batch).
+            style_embeddings: Style preset table to serve (None = the checkpoint's).
+            stroke_budget_multiplier: Per-character step cap of the workers.
+            quantization: Weight precision of the workers ("fp32" or "int8").
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+
+        # spawn: forking a process that already initialized torch's thread pools can deadlock
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                str(checkpoint_path),
+                device,
+                vocab_path,
+                threads_per_worker,
+                None if style_embeddings is None else style_embeddings.cpu(),
+                stroke_budget_multiplier,
+                quantization,
+            ),
+        )
+        logger.info(f"Document worker pool started ({self.workers} workers)")
+
+    def generate(self, jobs: list[WordJob], max_strokes: int = 2000) -> list[list[Stroke]]:
+        """
+        Generate strokes for a list of words across the pool.
+
+        Args:
+            jobs: (word, style_id, temperature, seed) per word.
+            max_strokes: Maximum number of strokes per character.
+
+        Returns:
+            One stroke list per job, in order.
+        """
+        if not jobs:
+            return []
+
+        # Small documents: split evenly so every worker gets a share
+        batch_size = min(self.batch_size, math.ceil(len(jobs) / self.workers))
+        batches = [jobs[i : i + batch_size] for i in range(0, len(jobs), batch_size)]
+
+        results: list[list[Stroke]] = []
+        for batch_result in self._executor.map(
+            _generate_jobs, batches, [max_strokes] * len(batches)
+        ):
+            results.extend(batch_result)
+        return results
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "DocumentWorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
@@ -3,15 +3,36 @@ INKFORGE — Inference Service
 
 Handles model loading, tokenization, and autoregressive stroke generation
 using the LSTM+MDN model.
+
+Two architectures decode through the same DecodeState/decode_step API:
+    - "lstm"      → the cursor moves to the next character on pen-up
+    - "attention" → the soft window tracks the text; a sequence ends when
+                    the window weight passes the end of the text
 """
 
+import hashlib
 import json
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
 import torch
+import torch.nn.functional as functional
 
-from ..ml.model import HandwritingLSTM
+from ..ml.model import HandwritingAttentionLSTM, HandwritingLSTM, sampling_noise
+from ..ml.profiling import RequestProfile
+from ..ml.seeding import derive_seed, make_generator, preset_style_embeddings
+from ..ml.stroke_budget import MIN_OBSERVATIONS, StrokeBudget
 from ..ml.utils import build_vocab, tokenize
+from .metrics import MODEL_STEP_TIME, SAMPLE_TIME
+from .stroke_cache import StrokeCache, style_cache_key
+from .stroke_store import StrokeStore
+
+if TYPE_CHECKING:
+    from ..ml.quantization import ParityReport
+    from .document_pool import DocumentWorkerPool
 
 # Precomputed style embeddings for MVP presets (z ∈ ℝ¹²⁸)
 # These would be clustered from IAM writer embeddings in production
@@ -23,6 +44,98 @@ STYLE_PRESETS = {
     "elegant_formal": 4,
 }
 
+# Texts sampled for the int8 parity check when the checkpoint has no held-out batch
+PARITY_TEXTS = ["the quick brown fox", "jumps over the", "lazy dog 1234"]
+
+
+@dataclass
+class DecodeState:
+    """
+    Autoregressive decode state for one generation request.
+
+    Holds everything needed to advance a single sequence by one stroke,
+    so several requests can be stepped together as one [B, 1] batch.
+    """
+
+    char_indices: list[int]
+    style_proj: torch.Tensor  # [1, hidden_dim] — W_style·z (attention: z itself, [1, style_dim])
+    hidden: tuple[torch.Tensor, torch.Tensor]  # (h, c), each [num_layers, 1, hidden_dim]
+    prev_stroke: torch.Tensor  # [1, 5]
+    temperature: float
+    max_strokes: int  # per character
+    cursor: int = 0  # index into char_indices
+    char_strokes: int = 0  # strokes emitted for the current character
+    finished: bool = False
+    generator: torch.Generator | None = None  # per-request RNG (None = global)
+    char_caps: list[int] | None = None  # per-character step caps (stroke budget)
+    budget_exceeded: int = 0  # characters cut off by their cap
+    style_index: int = 0  # style preset row (ONNX backend, which serves presets only)
+    profile: RequestProfile | None = None  # per-phase timers of a profiled request
+
+    # Attention models only
+    text_embed: torch.Tensor | None = None  # [1, len, char_embed_dim]
+    kappa: torch.Tensor | None = None  # [1, K] — window positions
+    window: torch.Tensor | None = None  # [1, char_embed_dim]
+    steps: int = 0
+    step_limit: int = 0  # steps before the sequence is cut off
+
+
+class ProjectionCache:
+    """
+    Inference-time split of HandwritingLSTM.input_projection.
+
+    The projection weight is split into its three column blocks
+    [W_char ‖ W_style ‖ W_stroke] once per model load:
+        - W_char·E + b → a [vocab, hidden] table indexed per step
+        - W_style·z    → computed once per request, memoized per style preset
+        - W_stroke     → the only (5-wide) block applied every step
+    """
+
+    def __init__(self, model: HandwritingLSTM) -> None:
+        """
+        Build the cache for a loaded model.
+
+        Args:
+            model: Model in eval mode whose input_projection is split.
+        """
+        self.model = model
+        with torch.no_grad():
+            self.char_table = model.char_projection_table()  # [vocab, hidden]
+        self._preset_styles: dict[int, torch.Tensor] = {}
+
+    def char_rows(self, chars: torch.Tensor) -> torch.Tensor:
+        """
+        Look up the character projections for a batch of token indices.
+
+        Args:
+            chars: Token indices [B].
+
+        Returns:
+            Character projections [B, hidden].
+        """
+        return self.char_table.index_select(0, chars)
+
+    def style(self, style_z: torch.Tensor, preset_idx: int | None = None) -> torch.Tensor:
+        """
+        Get W_style·z for a request, reusing the memoized value for presets.
+
+        Args:
+            style_z: Style embedding [1, style_dim].
+            preset_idx: Style preset index, or None for a custom embedding.
+
+        Returns:
+            Style projection [1, hidden].
+        """
+        if preset_idx is not None and preset_idx in self._preset_styles:
+            return self._preset_styles[preset_idx]
+
+        with torch.no_grad():
+            style_proj = self.model.style_projection(style_z)
+
+        if preset_idx is not None:
+            self._preset_styles[preset_idx] = style_proj
+        return style_proj
+
 
 class InferenceService:
     """
@@ -32,11 +145,14 @@ class InferenceService:
     converts text + style + params into stroke sequences.
     """
 
+    backend = "lstm"  # Label of this service's decode step timings
+
     def __init__(
         self,
         checkpoint_path: str | None = None,
         device: str = "cpu",
         vocab_path: str | None = None,
+        stroke_budget_multiplier: float = 1.5,
     ) -> None:
         """
         Initialize the inference service.
@@ -45,12 +161,38 @@ class InferenceService:
             checkpoint_path: Path to the trained model checkpoint (.pt).
             device: PyTorch device string ("cpu" or "cuda").
             vocab_path: Optional path to vocabulary JSON file.
+            stroke_budget_multiplier: Per-character step cap as a multiple of
+                the training p99 (needs "stroke_stats" in the checkpoint;
+                0 disables the budget).
         """
         self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
         self.device = torch.device(device)
-        self.model: HandwritingLSTM | None = None
+        self.model: HandwritingLSTM | HandwritingAttentionLSTM | None = None
         self.is_loaded = False
 
+        # Split input_projection for step() decoding (rebuilt on every model load)
+        self._projection_cache: ProjectionCache | None = None
+
+        # Traced decode step, when loaded from a .pts artifact (see app.ml.decode_export)
+        self.compiled_step: torch.jit.ScriptModule | None = None
+        self._compiled_layers = 0
+
+        # Optional persistent store of pre-generated word strokes
+        self.stroke_store: StrokeStore | None = None
+
+        # Per-character step caps from the checkpoint's training statistics
+        self.stroke_stats: dict[str, Any] | None = None  # compute_stroke_stats() output
+        self._token_strokes: list[float] | None = None  # median strokes per token id
+        self.stroke_budget_multiplier = stroke_budget_multiplier
+        self.stroke_budget: StrokeBudget | None = None
+        self._token_caps: list[int] | None = None
+        self.budget_exceeded = 0  # characters cut off by their cap, across requests
+        self._budget_lock = threading.Lock()  # decode workers finish steps concurrently
+
+        # Weight precision actually served ("fp32" or "int8", see quantize_int8())
+        self.quantization = "fp32"
+        self.parity_batch: dict[str, torch.Tensor] | None = None  # held-out batch from training
+
         # Build vocabulary
         if vocab_path and Path(vocab_path).exists():
             with open(vocab_path, encoding="utf-8") as f:
@@ -60,8 +202,8 @@ class InferenceService:
 
         self.vocab_size = len(self.vocab)
 
-        # Style embeddings (initialized with random, would be learned/clustered)
-        self.style_embeddings = torch.randn(len(STYLE_PRESETS), 128)
+        # Style preset table (the checkpoint's, else the fixed-seed default)
+        self.style_embeddings = preset_style_embeddings(len(STYLE_PRESETS))
 
         # Normalization stats (should match training data)
         self.stroke_mean = torch.tensor([0.0, 0.0])
@@ -71,7 +213,8 @@ class InferenceService:
         """
         Load the LSTM+MDN model from checkpoint.
 
-        Loads either TorchScript-exported model or regular checkpoint.
+        Loads either a compiled decode step (.pts, written by
+        scripts/export_decode_step.py) or a regular checkpoint.
         Sets model to eval mode and moves to target device.
         """
         if self.checkpoint_path is None:
@@ -80,44 +223,195 @@ class InferenceService:
         if not self.checkpoint_path.exists():
             raise FileNotFoundError(f"Checkpoint not found: {self.checkpoint_path}")
 
-        # Try loading as TorchScript first
+        self.compiled_step = None
+        self.quantization = "fp32"
+
         if self.checkpoint_path.suffix == ".pts":
-            self.model = torch.jit.load(self.checkpoint_path, map_location=self.device)
-        else:
-            # Load regular checkpoint
-            checkpoint = torch.load(
-                self.checkpoint_path, map_location=self.device, weights_only=True
-            )
+            self._load_compiled(self.checkpoint_path)
+            return
 
-            # Initialize model
-            model_config = checkpoint.get("model_config", {})
-            self.model = HandwritingLSTM(
-                vocab_size=model_config.get("vocab_size", self.vocab_size),
-                char_embed_dim=model_config.get("char_embed_dim", 256),
-                style_dim=model_config.get("style_dim", 128),
-                hidden_dim=model_config.get("hidden_dim", 512),
-                num_layers=model_config.get("num_layers", 3),
-                dropout=0.0,  # No dropout during inference
-                num_mixtures=model_config.get("num_mixtures", 20),
+        # Load regular checkpoint
+        checkpoint = torch.load(self.checkpoint_path, map_location=self.device, weights_only=True)
+
+        # Initialize model
+        model_config = checkpoint.get("model_config", {})
+        model_kwargs = dict(
+            vocab_size=model_config.get("vocab_size", self.vocab_size),
+            char_embed_dim=model_config.get("char_embed_dim", 256),
+            style_dim=model_config.get("style_dim", 128),
+            hidden_dim=model_config.get("hidden_dim", 512),
+            num_layers=model_config.get("num_layers", 3),
+            dropout=0.0,  # No dropout during inference
+            num_mixtures=model_config.get("num_mixtures", 20),
+        )
+        if model_config.get("architecture", "lstm") == "attention":
+            self.model = HandwritingAttentionLSTM(
+                **model_kwargs, window_mixtures=model_config.get("window_mixtures", 10)
             )
+        else:
+            self.model = HandwritingLSTM(**model_kwargs)
+
+        # Load state dict
+        self.model.load_state_dict(checkpoint["model_state_dict"])
+
+        # Load normalization stats if available
+        if "stroke_mean" in checkpoint:
+            self.stroke_mean = checkpoint["stroke_mean"]
+        if "stroke_std" in checkpoint:
+            self.stroke_std = checkpoint["stroke_std"]
 
-            # Load state dict
-            self.model.load_state_dict(checkpoint["model_state_dict"])
+        # Style preset table: stored by train.py; the fixed-seed default otherwise, so
+        # every process loading this checkpoint serves the same presets
+        if "style_embeddings" in checkpoint:
+            self.style_embeddings = checkpoint["style_embeddings"]
+        else:
+            self.style_embeddings = preset_style_embeddings(
+                len(STYLE_PRESETS), model_kwargs["style_dim"]
+            )
 
-            # Load normalization stats if available
-            if "stroke_mean" in checkpoint:
-                self.stroke_mean = checkpoint["stroke_mean"]
-            if "stroke_std" in checkpoint:
-                self.stroke_std = checkpoint["stroke_std"]
+        if "parity_batch" in checkpoint:
+            self.parity_batch = checkpoint["parity_batch"]
 
-            # Load style embeddings if available
-            if "style_embeddings" in checkpoint:
-                self.style_embeddings = checkpoint["style_embeddings"]
+        if "stroke_stats" in checkpoint:
+            self.load_stroke_stats(checkpoint["stroke_stats"])
 
         self.model.to(self.device)
         self.model.eval()
+        self.stroke_mean = self.stroke_mean.to(self.device)
+        self.stroke_std = self.stroke_std.to(self.device)
+        self._projection_cache = None
         self.is_loaded = True
 
+    def style_table_fingerprint(self) -> str:
+        """Hash of the style preset table (artifacts built with other presets don't match)."""
+        table = self.style_embeddings.detach().to("cpu", torch.float32).contiguous()
+        return hashlib.blake2b(table.numpy().tobytes(), digest_size=8).hexdigest()
+
+    def _load_compiled(self, path: Path) -> None:
+        """Load a compiled decode step; decode_step() then runs it instead of the model."""
+        from ..ml.decode_export import load_decode_step
+
+        module, metadata = load_decode_step(path, self.device)
+
+        self.compiled_step = module
+        self.model = None
+        self._projection_cache = None
+        self._compiled_layers = metadata["num_layers"]
+        self.quantization = metadata.get("quantization", "fp32")
+
+        self.stroke_mean = module.stroke_mean
+        self.stroke_std = module.stroke_std
+        self.style_embeddings = module.style_embeddings
+
+        if metadata.get("stroke_stats"):
+            self.load_stroke_stats(metadata["stroke_stats"])
+        self.is_loaded = True
+
+    def quantize_int8(self, max_nll_delta: float = 0.05) -> "ParityReport":
+        """
+        Switch to a dynamically int8-quantized model if it keeps parity.
+
+        The held-out NLL of the quantized copy is compared against the
+        current fp32 model; the copy is only served when it is at most
+        max_nll_delta worse.
+
+        Args:
+            max_nll_delta: Largest accepted NLL increase (nats per timestep).
+
+        Returns:
+            The parity report (self.quantization tells whether it was applied).
+
+        Raises:
+            RuntimeError: If the model is not loaded, not on CPU, or not an
+                eager (.pt) checkpoint.
+        """
+        from ..ml.quantization import check_parity, quantize_int8
+
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+        if self.device.type != "cpu":
+            raise RuntimeError("Dynamic int8 quantization only runs on CPU")
+        if not isinstance(self.model, (HandwritingLSTM, HandwritingAttentionLSTM)):
+            raise RuntimeError("Only eager (.pt) checkpoints can be quantized")
+
+        quantized = quantize_int8(self.model)
+        report = check_parity(self.model, quantized, self._parity_batch())
+        if report.delta <= max_nll_delta:
+            self.model = quantized
+            self._projection_cache = None
+            self.quantization = "int8"
+        return report
+
+    def _parity_batch(self) -> dict[str, torch.Tensor]:
+        """
+        Held-out batch for the int8 parity check.
+
+        Uses the batch stored in the checkpoint by train.py; otherwise samples
+        PARITY_TEXTS from the current model with a fixed seed.
+        """
+        if self.parity_batch is not None:
+            return self.parity_batch
+
+        sequences = self.generate_batch(PARITY_TEXTS, temperature=1.0, max_strokes=20, seed=0)
+        tokens = [self._tokenize(text) for text in PARITY_TEXTS]
+
+        strokes = torch.zeros(len(sequences), max(map(len, sequences)), 5)
+        text_indices = torch.zeros(len(tokens), max(map(len, tokens)), dtype=torch.long)
+        for i, (sequence, chars) in enumerate(zip(sequences, tokens, strict=True)):
+            strokes[i, : len(sequence)] = torch.tensor(sequence)
+            text_indices[i, : len(chars)] = torch.tensor(chars)
+        strokes[:, :, :2] = (strokes[:, :, :2] - self.stroke_mean.cpu()) / self.stroke_std.cpu()
+
+        return {
+            "strokes": strokes,
+            "text_indices": text_indices,
+            "stroke_lengths": torch.tensor([len(sequence) for sequence in sequences]),
+            "text_lengths": torch.tensor([len(chars) for chars in tokens]),
+        }
+
+    def load_stroke_stats(self, stats: dict[str, Any]) -> None:
+        """Keep the training stroke statistics and derive the stroke budget from them."""
+        self.stroke_stats = stats
+        self._token_strokes = None
+        global_stats = stats.get("global", {})
+        if global_stats.get("count"):
+            chars = stats.get("chars", {})
+            self._token_strokes = [global_stats["p50"]] * (max(self.vocab.values()) + 1)
+            for char, index in self.vocab.items():
+                if chars.get(char, {}).get("count", 0) >= MIN_OBSERVATIONS:
+                    self._token_strokes[index] = chars[char]["p50"]
+        if self.stroke_budget_multiplier > 0:
+            self.set_stroke_budget(StrokeBudget.from_stats(stats, self.stroke_budget_multiplier))
+
+    def estimate_strokes(self, text: str) -> float | None:
+        """
+        Expected stroke count of a text: the training median of each of its tokens, summed.
+
+        Returns:
+            Estimated strokes, or None without training statistics.
+        """
+        if self._token_strokes is None:
+            return None
+        return sum(self._token_strokes[i] for i in self._tokenize(text))
+
+    def word_gap(self) -> float | None:
+        """
+        Typical horizontal advance of a space: its median training strokes × mean stroke dx.
+
+        Returns:
+            Advance in stroke units, or None without training statistics.
+        """
+        strokes = self.estimate_strokes(" ")
+        if strokes is None:
+            return None
+        gap = strokes * float(self.stroke_mean[0])
+        return gap if gap > 0 else None
+
+    def set_stroke_budget(self, budget: StrokeBudget | None) -> None:
+        """Enforce per-character step caps from now on (None removes them)."""
+        self.stroke_budget = budget
+        self._token_caps = budget.token_caps(self.vocab) if budget is not None else None
+
     def get_style_embedding(self, style_id: str | int) -> torch.Tensor:
         """
         Get style embedding for a preset or custom style.
@@ -128,12 +422,18 @@ class InferenceService:
         Returns:
             Style embedding tensor [128].
         """
-        if isinstance(style_id, str):
-            idx = STYLE_PRESETS.get(style_id, 0)
-        else:
-            idx = min(style_id, len(STYLE_PRESETS) - 1)
+        return self.style_embeddings[self._style_index(style_id)].to(self.device)
 
-        return self.style_embeddings[idx].to(self.device)
+    def supports_style(self, style_id: str | int) -> bool:
+        """Whether style_id can be written (unknown names fall back to the first preset)."""
+        return True
+
+    @staticmethod
+    def _style_index(style_id: str | int) -> int:
+        """Resolve a style preset name or index to a row of style_embeddings."""
+        if isinstance(style_id, str):
+            return STYLE_PRESETS.get(style_id, 0)
+        return min(style_id, len(STYLE_PRESETS) - 1)
 
     def generate(
         self,
@@ -144,6 +444,7 @@ class InferenceService:
         temperature: float = 0.4,
         max_strokes: int = 2000,
         bias: float = 0.0,
+        seed: int | None = None,
     ) -> list[tuple[float, float, int, int, int]]:
         """
         Generate a stroke sequence for the given text.
@@ -156,15 +457,129 @@ class InferenceService:
             temperature: Sampling temperature τ (controls randomness).
             max_strokes: Maximum number of strokes to generate per character.
             bias: Writing bias (higher = more consistent, lower = more varied).
+            seed: Sampling seed; the same seed reproduces the same strokes.
 
         Returns:
             List of (Δx, Δy, p1, p2, p3) stroke tuples.
         """
+        state = self.begin_decode(
+            text,
+            style_embedding=style_embedding,
+            style_id=style_id,
+            temperature=temperature,
+            max_strokes=max_strokes,
+            seed=seed,
+        )
+
+        strokes = []
+        while not state.finished:
+            strokes.append(self.decode_step([state])[0])
+
+        return strokes
+
+    def generate_batch(
+        self,
+        texts: list[str],
+        style_id: str | int | list[str | int] = "neat_cursive",
+        temperature: float | list[float] = 0.4,
+        max_strokes: int = 2000,
+        max_batch_size: int = 32,
+        seed: int | list[int | None] | None = None,
+    ) -> list[list[tuple[float, float, int, int, int]]]:
+        """
+        Generate stroke sequences for many texts with batched decode steps.
+
+        Up to max_batch_size sequences are stepped together; as soon as one
+        finishes, the next pending text takes its slot.
+
+        Seeded texts sample from their own RNG streams, so each result equals
+        generate(text, seed=...) with the same seed, whatever the batch size.
+
+        Args:
+            texts: Input text strings.
+            style_id: Style preset for all texts, or one per text.
+            temperature: Sampling temperature for all texts, or one per text.
+            max_strokes: Maximum number of strokes to generate per character.
+            max_batch_size: Maximum number of sequences stepped together.
+            seed: One seed per text, or a request seed from which text i
+                gets derive_seed(seed, i). None for unseeded sampling.
+
+        Returns:
+            One list of (Δx, Δy, p1, p2, p3) stroke tuples per text, in order.
+        """
+        style_ids = style_id if isinstance(style_id, list) else [style_id] * len(texts)
+        temperatures = temperature if isinstance(temperature, list) else [temperature] * len(texts)
+        if isinstance(seed, list):
+            seeds = seed
+        elif seed is None:
+            seeds = [None] * len(texts)
+        else:
+            seeds = [derive_seed(seed, i) for i in range(len(texts))]
+        if (
+            len(style_ids) != len(texts)
+            or len(temperatures) != len(texts)
+            or len(seeds) != len(texts)
+        ):
+            raise ValueError("style_id, temperature and seed lists must match the number of texts")
+
+        results: list[list[tuple[float, float, int, int, int]]] = [[] for _ in texts]
+        next_text = 0
+        active: dict[int, DecodeState] = {}
+
+        while True:
+            # Refill free batch slots from the pending texts
+            while next_text < len(texts) and len(active) < max(1, max_batch_size):
+                i = next_text
+                next_text += 1
+                state = self.begin_decode(
+                    texts[i],
+                    style_id=style_ids[i],
+                    temperature=temperatures[i],
+                    max_strokes=max_strokes,
+                    seed=seeds[i],
+                )
+                if not state.finished:
+                    active[i] = state
+
+            if not active:
+                return results
+
+            strokes = self.decode_step(list(active.values()))
+            for (i, state), stroke in zip(list(active.items()), strokes, strict=True):
+                results[i].append(stroke)
+                if state.finished:
+                    del active[i]
+
+    def begin_decode(
+        self,
+        text: str,
+        style_embedding: torch.Tensor | None = None,
+        style_id: str | int = "neat_cursive",
+        temperature: float = 0.4,
+        max_strokes: int = 2000,
+        seed: int | None = None,
+    ) -> DecodeState:
+        """
+        Create the initial decode state for a generation request.
+
+        Args:
+            text: Input text string.
+            style_embedding: Style latent vector z ∈ ℝ¹²⁸. If None, uses style_id.
+            style_id: Style preset name or index.
+            temperature: Sampling temperature τ.
+            max_strokes: Maximum number of strokes to generate per character.
+            seed: Sampling seed (None = global RNG).
+
+        Returns:
+            DecodeState ready to be advanced with decode_step().
+        """
         if not self.is_loaded:
             raise RuntimeError("Model not loaded. Call load_model() first.")
 
         # Normalize style embedding dimensions
+        preset_idx = None
         if style_embedding is None:
+            preset_idx = self._style_index(style_id)
             style_embedding = self.get_style_embedding(style_id)
 
         if style_embedding.dim() == 1:
@@ -178,66 +593,361 @@ class InferenceService:
         else:
             raise ValueError(f"style_embedding must be 1D or 2D, got {style_embedding.dim()}D")
 
-        # Tokenize text
         char_indices = self._tokenize(text)
-        char_seq = torch.tensor(
-            [char_indices], dtype=torch.long, device=self.device
-        )  # [1, text_len]
 
-        # Generate strokes autoregressively
+        char_caps = self._char_caps(char_indices, max_strokes)
+
+        if self._uses_attention():
+            return self._begin_attention_decode(
+                char_indices, style_z, temperature, max_strokes, seed, char_caps
+            )
+
+        if self.compiled_step is not None:
+            with torch.no_grad():
+                if preset_idx is not None:
+                    style_proj = self.compiled_step.preset_styles[preset_idx : preset_idx + 1]
+                else:
+                    style_proj = self.compiled_step.style_projection(style_z)
+            hidden_shape = (self._compiled_layers, 1, style_proj.size(1))
+            hidden = (
+                torch.zeros(hidden_shape, device=self.device),
+                torch.zeros(hidden_shape, device=self.device),
+            )
+        else:
+            style_proj = self._get_projection_cache().style(style_z, preset_idx)
+            hidden = self.model.get_initial_hidden(batch_size=1)
+
+        return DecodeState(
+            char_indices=char_indices,
+            style_proj=style_proj,
+            hidden=hidden,
+            prev_stroke=torch.zeros(1, 5, device=self.device),  # Initial stroke (zeros)
+            temperature=temperature,
+            max_strokes=max_strokes,
+            finished=len(char_indices) == 0,
+            generator=make_generator(seed, str(self.device)),
+            char_caps=char_caps,
+        )
+
+    def _char_caps(self, char_indices: list[int], max_strokes: int) -> list[int] | None:
+        """Per-character step caps of a text under the stroke budget (None without one)."""
+        if self._token_caps is None:
+            return None
+
+        # The budget only ever tightens max_strokes
+        default_cap = self.stroke_budget.default_cap
+        return [
+            min(max_strokes, self._token_caps[i] if i < len(self._token_caps) else default_cap)
+            for i in char_indices
+        ]
+
+    def _uses_attention(self) -> bool:
+        """Whether the loaded model decodes with an attention window."""
+        return getattr(self.model, "architecture", "lstm") == "attention"
+
+    def _begin_attention_decode(
+        self,
+        char_indices: list[int],
+        style_z: torch.Tensor,
+        temperature: float,
+        max_strokes: int,
+        seed: int | None,
+        char_caps: list[int] | None,
+    ) -> DecodeState:
+        """
+        Create the initial decode state for an attention model.
+
+        There is no per-character cursor to cap, so the stroke budget (or
+        max_strokes) applies to the whole text: the sum of its characters' caps.
+        """
+        with torch.no_grad():
+            chars = torch.tensor(char_indices, dtype=torch.long, device=self.device)
+            text_embed = self.model.char_embedding(chars).unsqueeze(0)  # [1, len, E]
+        h, c, kappa, window = self.model.initial_state(batch_size=1)
+
+        return DecodeState(
+            char_indices=char_indices,
+            style_proj=style_z,
+            hidden=(h, c),
+            prev_stroke=torch.zeros(1, 5, device=self.device),
+            temperature=temperature,
+            max_strokes=max_strokes,
+            finished=len(char_indices) == 0,
+            generator=make_generator(seed, str(self.device)),
+            char_caps=char_caps,
+            text_embed=text_embed,
+            kappa=kappa,
+            window=window,
+            step_limit=sum(char_caps) if char_caps is not None else max_strokes * len(char_indices),
+        )
+
+    def decode_step(self, states: list[DecodeState]) -> list[tuple[float, float, int, int, int]]:
+        """
+        Advance a batch of decode states by one stroke each.
+
+        All states are merged into a single [B, 1] fused model step; each
+        keeps its own hidden state, character cursor and temperature.
+
+        Args:
+            states: Unfinished decode states (B >= 1).
+
+        Returns:
+            One (Δx, Δy, p1, p2, p3) stroke tuple per state, in order.
+        """
+        if self._uses_attention():
+            return self._decode_step_attention(states)
+
+        gathered = time.perf_counter()
+        chars = torch.tensor(
+            [state.char_indices[state.cursor] for state in states],
+            dtype=torch.long,
+            device=self.device,
+        )  # [B]
+        prev_strokes = torch.cat([state.prev_stroke for state in states])  # [B, 5]
+        style_proj = torch.cat([state.style_proj for state in states])  # [B, hidden]
+        hidden = (
+            torch.cat([state.hidden[0] for state in states], dim=1),
+            torch.cat([state.hidden[1] for state in states], dim=1),
+        )
+
+        temperature = torch.tensor(
+            [state.temperature for state in states], dtype=torch.float32, device=self.device
+        )  # [B]
+
+        generators = [state.generator for state in states]
+        if not any(generators):
+            generators = None  # All unseeded: one batched draw from the global RNG
+
+        with torch.no_grad():
+            started = time.perf_counter()
+            if self.compiled_step is not None:
+                # One graph call: step + sampling + denormalization
+                uniform, normal = sampling_noise(
+                    len(states), self.device, prev_strokes.dtype, generators
+                )
+                sampled, h, c = self.compiled_step(
+                    chars, style_proj, prev_strokes, *hidden, temperature, uniform, normal
+                )
+                self._record_step(states, gathered, started, time.perf_counter())
+            else:
+                char_proj = self._get_projection_cache().char_rows(chars)  # [B, hidden]
+                mdn_params, pen_logits, (h, c) = self.model.step(
+                    char_proj, style_proj, prev_strokes, hidden
+                )
+                stepped = time.perf_counter()
+
+                # Sample on device: [B, 5], then denormalize (Δx, Δy)
+                sampled = self.model.sample_batch(mdn_params, pen_logits, temperature, generators)
+                sampled[:, :2] = sampled[:, :2] * self.stroke_std + self.stroke_mean
+                self._record_step(states, gathered, started, stepped, time.perf_counter())
+
+        return self._finish_step(states, sampled, h, c)
+
+    def _record_step(
+        self,
+        states: list[DecodeState],
+        gathered: float,
+        started: float,
+        stepped: float,
+        sampled: float | None = None,
+    ) -> None:
+        """
+        Publish one batched step's timings to the metrics and to profiled requests.
+
+        Args:
+            states: States that were stepped.
+            gathered: perf_counter() before the batch tensors were built.
+            started: perf_counter() before the model step.
+            stepped: perf_counter() after the model step.
+            sampled: perf_counter() after sampling (None when fused into the step).
+        """
+        MODEL_STEP_TIME.observe(stepped - started, backend=self.backend)
+        if sampled is not None:
+            SAMPLE_TIME.observe(sampled - stepped, backend=self.backend)
+        for state in states:
+            if state.profile is not None:
+                state.profile.add("gather", gathered, started)
+                state.profile.add("model_step", started, stepped)
+                if sampled is not None:
+                    state.profile.add("sample", stepped, sampled)
+
+    @staticmethod
+    def _record_finish(states: list[DecodeState], started: float) -> None:
+        """Charge the step's host transfer and state updates to profiled requests."""
+        for state in states:
+            if state.profile is not None:
+                state.profile.add("finish", started)
+
+    def _finish_step(
+        self,
+        states: list[DecodeState],
+        sampled: torch.Tensor,
+        h: torch.Tensor,
+        c: torch.Tensor,
+    ) -> list[tuple[float, float, int, int, int]]:
+        """
+        Hand one batched step's outputs back to the decode states.
+
+        Args:
+            states: States that were stepped, in batch order.
+            sampled: Denormalized strokes [B, 5].
+            h: LSTM hidden state [num_layers, B, hidden].
+            c: LSTM cell state [num_layers, B, hidden].
+
+        Returns:
+            One (Δx, Δy, p1, p2, p3) stroke tuple per state, in order.
+        """
+        # Single host transfer per step — the output boundary
+        finishing = time.perf_counter()
+        rows = sampled.tolist()
+
         strokes = []
-        hidden = self.model.get_initial_hidden(batch_size=1)
+        for i, state in enumerate(states):
+            dx, dy, p1, p2, p3 = rows[i]
+            stroke = (dx, dy, int(p1), int(p2), int(p3))
+            strokes.append(stroke)
+
+            # Feed the sampled tensor straight back as the next input
+            state.hidden = (h[:, i : i + 1], c[:, i : i + 1])
+            state.prev_stroke = sampled[i : i + 1]
+            if self._advance(state, stroke[3], stroke[4]):
+                self._count_budget_exceeded(state)
+
+        self._record_finish(states, finishing)
+        return strokes
+
+    def _count_budget_exceeded(self, state: DecodeState) -> None:
+        """Count a character cut off by its cap (the service total is shared by decode workers)."""
+        state.budget_exceeded += 1
+        with self._budget_lock:
+            self.budget_exceeded += 1
 
-        # Initial stroke (zeros)
-        prev_stroke = torch.zeros(1, 1, 5, device=self.device)
+    def _decode_step_attention(
+        self, states: list[DecodeState]
+    ) -> list[tuple[float, float, int, int, int]]:
+        """
+        decode_step() for attention models.
+
+        Texts of different lengths are padded to the longest one and masked
+        out of the window. A state finishes when its window weight on the
+        position just past its last character exceeds the weight on every
+        character, on an end-of-sequence stroke, or at its step limit.
+        """
+        gathered = time.perf_counter()
+        lengths = [len(state.char_indices) for state in states]
+        max_len = max(lengths)
+
+        text_embed = torch.cat(
+            [
+                functional.pad(state.text_embed, (0, 0, 0, max_len - length))
+                for state, length in zip(states, lengths, strict=True)
+            ]
+        )  # [B, max_len, E]
+        length_t = torch.tensor(lengths, device=self.device)  # [B]
+        char_mask = torch.arange(max_len, device=self.device) < length_t.unsqueeze(
+            1
+        )  # [B, max_len]
+
+        prev_strokes = torch.cat([state.prev_stroke for state in states])  # [B, 5]
+        style_z = torch.cat([state.style_proj for state in states])  # [B, style_dim]
+        recurrent = (
+            torch.cat([state.hidden[0] for state in states], dim=1),
+            torch.cat([state.hidden[1] for state in states], dim=1),
+            torch.cat([state.kappa for state in states]),
+            torch.cat([state.window for state in states]),
+        )
+
+        temperature = torch.tensor(
+            [state.temperature for state in states], dtype=torch.float32, device=self.device
+        )  # [B]
+
+        generators = [state.generator for state in states]
+        if not any(generators):
+            generators = None
 
         with torch.no_grad():
-            for char_idx in range(len(char_indices)):
-                # Get current character
-                current_char = char_seq[:, char_idx : char_idx + 1]  # [1, 1]
-
-                # Generate strokes for this character
-                char_strokes = 0
-                while char_strokes < max_strokes:
-                    # Forward pass
-                    mdn_params, pen_logits, hidden = self.model(
-                        current_char, prev_stroke, style_z, hidden
-                    )
-
-                    # Sample stroke
-                    stroke = self.model.sample(
-                        mdn_params[0, 0],  # [M*6]
-                        pen_logits[0, 0],  # [3]
-                        temperature=temperature,
-                    )
-
-                    dx, dy, p1, p2, p3 = stroke
-
-                    # Denormalize
-                    dx = dx * self.stroke_std[0].item() + self.stroke_mean[0].item()
-                    dy = dy * self.stroke_std[1].item() + self.stroke_mean[1].item()
-
-                    strokes.append((dx, dy, p1, p2, p3))
-
-                    # Update previous stroke
-                    prev_stroke = torch.tensor(
-                        [[[dx, dy, p1, p2, p3]]],
-                        dtype=torch.float32,
-                        device=self.device,
-                    )
-
-                    char_strokes += 1
-
-                    # Check for pen-up (end of character)
-                    if p2 == 1:
-                        break
-
-                    # Check for end-of-sequence
-                    if p3 == 1:
-                        return strokes
+            started = time.perf_counter()
+            mdn_params, pen_logits, (h, c, kappa, window), phi = self.model.step(
+                prev_strokes, style_z, text_embed, char_mask, recurrent
+            )
+            stepped = time.perf_counter()
+
+            sampled = self.model.sample_batch(mdn_params, pen_logits, temperature, generators)
+            sampled[:, :2] = sampled[:, :2] * self.stroke_std + self.stroke_mean
+            self._record_step(states, gathered, started, stepped, time.perf_counter())
+
+            # Window past the end: weight one past the last character beats all characters
+            char_weight, focus = phi[:, :max_len].masked_fill(~char_mask, -1.0).max(dim=1)
+            end_weight = phi.gather(1, length_t.unsqueeze(1)).squeeze(1)
+            past_end = end_weight > char_weight
+
+            host = torch.cat(
+                [
+                    sampled,
+                    past_end.unsqueeze(1).to(sampled.dtype),
+                    focus.unsqueeze(1).to(sampled.dtype),
+                ],
+                dim=1,
+            )
+
+        # Single host transfer per step
+        finishing = time.perf_counter()
+        rows = host.tolist()
 
+        strokes = []
+        for i, state in enumerate(states):
+            dx, dy, p1, p2, p3, done, cursor = rows[i]
+            stroke = (dx, dy, int(p1), int(p2), int(p3))
+            strokes.append(stroke)
+
+            state.hidden = (h[:, i : i + 1], c[:, i : i + 1])
+            state.kappa = kappa[i : i + 1]
+            state.window = window[i : i + 1]
+            state.prev_stroke = sampled[i : i + 1]
+            state.cursor = int(cursor)
+            state.steps += 1
+
+            if stroke[4] == 1 or done:
+                state.finished = True
+            elif state.steps >= state.step_limit:
+                state.finished = True
+                self._count_budget_exceeded(state)
+
+        self._record_finish(states, finishing)
         return strokes
 
+    def _get_projection_cache(self) -> ProjectionCache:
+        """Return the input projection cache for the current model, building it on first use."""
+        if self._projection_cache is None or self._projection_cache.model is not self.model:
+            self._projection_cache = ProjectionCache(self.model)
+        return self._projection_cache
+
+    @staticmethod
+    def _advance(state: DecodeState, p2: int, p3: int) -> bool:
+        """
+        Move a decode state's character cursor after emitting one stroke.
+
+        Returns:
+            True if the character hit its step cap without a pen-up.
+        """
+        state.char_strokes += 1
+
+        # End-of-sequence stops generation for the whole text
+        if p3 == 1:
+            state.finished = True
+            return False
+
+        cap = state.max_strokes if state.char_caps is None else state.char_caps[state.cursor]
+        capped = p2 != 1 and state.char_strokes >= cap
+
+        # Pen-up (end of character) or per-character cap moves to the next character
+        if p2 == 1 or capped:
+            state.cursor += 1
+            state.char_strokes = 0
+            if state.cursor >= len(state.char_indices):
+                state.finished = True
+        return capped
+
     def generate_word(
         self,
         word: str,
@@ -317,6 +1027,9 @@ class DocumentGenerator:
         margin_bottom: float = 25.0,
         line_height: float = 8.0,
         char_width: float = 3.0,  # Average character width
+        stroke_cache: StrokeCache | None = None,
+        worker_pool: "DocumentWorkerPool | None" = None,
+        max_strokes: int = 2000,
     ) -> None:
         """
         Initialize document generator.
@@ -331,8 +1044,14 @@ class DocumentGenerator:
             margin_bottom: Bottom margin in mm.
             line_height: Line height in mm.
             char_width: Average character width in mm.
+            stroke_cache: Optional word-level stroke cache shared across documents.
+            worker_pool: Optional process pool that generates words in parallel.
+            max_strokes: Maximum number of strokes per character of a word.
         """
         self.inference = inference_service
+        self.stroke_cache = stroke_cache
+        self.worker_pool = worker_pool
+        self.max_strokes = max_strokes
         self.page_width = page_width
         self.page_height = page_height
         self.margin_left = margin_left
@@ -352,26 +1071,71 @@ class DocumentGenerator:
         temperature: float = 0.4,
         fatigue: float = 0.3,
         baseline_drift: float = 0.3,
+        seed: int | None = None,
     ) -> list[dict]:
         """
         Generate a full document with page layout.
 
+        Runs in two stages: plan_layout() assigns every word a position and
+        temperature, then all words are generated together — across the
+        worker pool if one is attached, else as in-process batched decode.
+
+        With a seed, layout jitter and every word (seeded by its index) are
+        reproducible, with or without a worker pool. Seeded documents bypass
+        the stroke cache, whose entries come from earlier requests.
+
         Args:
             text: Full document text.
             style_id: Style preset.
             temperature: Sampling temperature.
             fatigue: Fatigue simulation intensity (0-1).
             baseline_drift: Baseline drift intensity (0-1).
+            seed: Document seed (None = global RNG).
 
         Returns:
             List of stroke data dicts with position information.
         """
+        layout = self.plan_layout(
+            text, temperature, fatigue, baseline_drift, generator=make_generator(seed)
+        )
+        strokes = self._generate_words(
+            [(slot["word"], slot.pop("temperature")) for slot in layout], style_id, seed
+        )
+
+        for slot, word_strokes in zip(layout, strokes, strict=True):
+            slot["strokes"] = word_strokes
+        return layout
+
+    def plan_layout(
+        self,
+        text: str,
+        temperature: float = 0.4,
+        fatigue: float = 0.3,
+        baseline_drift: float = 0.3,
+        generator: torch.Generator | None = None,
+    ) -> list[dict]:
+        """
+        Assign every word a page position and sampling temperature.
+
+        Layout only depends on estimated word widths, not on the generated
+        strokes, so it runs before any generation.
+
+        Args:
+            text: Full document text.
+            temperature: Base sampling temperature.
+            fatigue: Fatigue simulation intensity (0-1).
+            baseline_drift: Baseline drift intensity (0-1).
+            generator: RNG for spacing jitter (global RNG if None).
+
+        Returns:
+            List of dicts with word, position, line_number and temperature.
+        """
         import math
 
         # Split text into paragraphs
         paragraphs = text.split("\n\n")
 
-        all_strokes = []
+        layout = []
         cursor_x = self.margin_left
         cursor_y = self.margin_top
         line_number = 0
@@ -394,8 +1158,9 @@ class DocumentGenerator:
                 # Check if word fits on current line
                 if cursor_x + word_width > self.page_width - self.margin_right:
                     # Line wrap
-                    cursor_x = self.margin_left + (torch.randn(1).item() * 2)  # Slight variation
-                    cursor_y += self.line_height + (torch.randn(1).item() * 0.5 * baseline_drift)
+                    jitter_x, jitter_y = torch.randn(2, generator=generator).tolist()
+                    cursor_x = self.margin_left + (jitter_x * 2)  # Slight variation
+                    cursor_y += self.line_height + (jitter_y * 0.5 * baseline_drift)
                     line_number += 1
 
                 # Apply fatigue: increase temperature slightly over document
@@ -403,27 +1168,21 @@ class DocumentGenerator:
                 current_temp = temperature + (fatigue * 0.2 * progress)
                 current_temp = min(current_temp, 1.0)
 
-                # Generate strokes for word
-                strokes = self.inference.generate(
-                    word,
-                    style_id=style_id,
-                    temperature=current_temp,
-                )
-
                 # Apply baseline drift (sine wave)
                 y_offset = baseline_drift * 2 * math.sin(line_number * 0.5 + para_idx)
 
-                all_strokes.append(
+                layout.append(
                     {
                         "word": word,
-                        "strokes": strokes,
                         "position": (cursor_x, cursor_y + y_offset),
                         "line_number": line_number,
+                        "temperature": current_temp,
                     }
                 )
 
                 # Advance cursor
-                cursor_x += word_width + 4.0 + (torch.randn(1).item() * 1.5)  # Word spacing
+                spacing = torch.randn(1, generator=generator).item()
+                cursor_x += word_width + 4.0 + (spacing * 1.5)  # Word spacing
 
                 # Check for page break
                 if cursor_y > self.page_height - self.margin_bottom:
@@ -435,4 +1194,58 @@ class DocumentGenerator:
             # Inner loop broke (page full) — stop outer loop too
             break
 
-        return all_strokes
+        return layout
+
+    def _generate_words(
+        self, words: list[tuple[str, float]], style_id: str, seed: int | None = None
+    ) -> list[list[tuple[float, float, int, int, int]]]:
+        """
+        Generate strokes for (word, temperature) pairs, in order.
+
+        Words are served from the stroke store, then the stroke cache; the
+        remaining misses are generated in one go and written back to the cache.
+        With a seed, word i uses derive_seed(seed, i) for both its store
+        variant and its sampling, and the stroke cache is skipped.
+        """
+        results: list[list[tuple[float, float, int, int, int]] | None] = [None] * len(words)
+        misses: list[tuple[int, int | None]] = []  # (index, cache slot)
+        store = self.inference.stroke_store
+        style_key = style_cache_key(style_id)
+        stroke_cache = self.stroke_cache if seed is None else None
+        word_seeds = [None if seed is None else derive_seed(seed, i) for i in range(len(words))]
+
+        for i, (word, temperature) in enumerate(words):
+            if store is not None and isinstance(style_id, str):
+                results[i] = store.lookup(word, style_id, temperature, variant=word_seeds[i])
+                if results[i] is not None:
+                    continue
+
+            slot = None
+            if stroke_cache is not None:
+                slot = stroke_cache.choose_slot()
+                results[i] = stroke_cache.lookup(word, style_key, temperature, slot)
+                if results[i] is not None:
+                    continue
+
+            misses.append((i, slot))
+
+        if misses:
+            jobs = [(words[i][0], style_id, words[i][1], word_seeds[i]) for i, _ in misses]
+            if self.worker_pool is not None:
+                generated = self.worker_pool.generate(jobs, max_strokes=self.max_strokes)
+            else:
+                generated = self.inference.generate_batch(
+                    [word for word, _, _, _ in jobs],
+                    style_id=style_id,
+                    temperature=[temperature for _, _, temperature, _ in jobs],
+                    seed=[word_seed for _, _, _, word_seed in jobs],
+                    max_strokes=self.max_strokes,
+                )
+
+            for (i, slot), strokes in zip(misses, generated, strict=True):
+                results[i] = strokes
+                if stroke_cache is not None:
+                    word, temperature = words[i]
+                    stroke_cache.put(word, style_key, temperature, slot, strokes)
+
+        return results
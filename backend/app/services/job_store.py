@@ -0,0 +1,242 @@
+"""
+INKFORGE — Job Store
+
+Pluggable storage for generation job metadata (text, params, status),
+shared between POST /generate and the stream routes that run the job.
+
+Backends:
+    - "memory" → InMemoryJobStore: per-process OrderedDict, for development
+                 and single-worker deployments
+    - "redis"  → RedisJobStore: one hash per job with a native TTL, so any
+                 API process behind a load balancer can serve the stream
+
+Expiry is sliding: every update() pushes a job's expiry back by the TTL.
+In memory the OrderedDict is kept in expiry order (updates move the job
+to the end), so expired and over-capacity jobs are dropped from the
+front in O(1) each — no scans or sorts.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger("inkforge.job_store")
+
+
+class JobStore(ABC):
+    """Async key-value store for job dicts with time-based expiry."""
+
+    @abstractmethod
+    async def create(self, job_id: str, job: dict[str, Any]) -> None:
+        """Store a new job."""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        """Return a copy of a job, or None if it is unknown or expired."""
+
+    @abstractmethod
+    async def update(self, job_id: str, **fields: Any) -> None:
+        """Set fields on an existing job and refresh its expiry."""
+
+    @abstractmethod
+    async def claim(self, job_id: str, field: str, value: Any) -> bool:
+        """
+        Set one field of an existing job only if it is not set yet.
+
+        Atomic, so of several processes claiming the same job field exactly
+        one succeeds (e.g. to dispatch a job once).
+
+        Returns:
+            True if this call set the field.
+        """
+
+    async def close(self) -> None:  # noqa: B027 — optional hook, no-op by default
+        """Release backend resources."""
+
+
+class InMemoryJobStore(JobStore):
+    """Process-local job store (jobs do not survive restarts or cross processes)."""
+
+    def __init__(self, ttl_seconds: int = 3600, max_jobs: int = 500) -> None:
+        """
+        Args:
+            ttl_seconds: Seconds after the last write before a job expires.
+            max_jobs: Capacity; the job closest to expiry is dropped beyond it.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        # job_id → (expires_at, job), ordered by expires_at
+        self._jobs: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired jobs, then enforce the size cap (oldest first)."""
+        while self._jobs:
+            expires_at, _ = next(iter(self._jobs.values()))
+            if expires_at > now and len(self._jobs) <= self.max_jobs:
+                break
+            self._jobs.popitem(last=False)
+
+    async def create(self, job_id: str, job: dict[str, Any]) -> None:
+        now = time.monotonic()
+        self._jobs[job_id] = (now + self.ttl_seconds, dict(job))
+        self._jobs.move_to_end(job_id)
+        self._evict(now)
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._jobs[job_id]
+            return None
+        return dict(entry[1])
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            return
+        entry[1].update(fields)
+        self._jobs[job_id] = (time.monotonic() + self.ttl_seconds, entry[1])
+        self._jobs.move_to_end(job_id)
+
+    async def claim(self, job_id: str, field: str, value: Any) -> bool:
+        # Never suspends between the check and the write: atomic on the event loop
+        entry = self._jobs.get(job_id)
+        if entry is None or entry[0] <= time.monotonic() or entry[1].get(field) is not None:
+            return False
+        entry[1][field] = value
+        self._jobs[job_id] = (time.monotonic() + self.ttl_seconds, entry[1])
+        self._jobs.move_to_end(job_id)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+
+class RedisJobStore(JobStore):
+    """
+    Redis-backed job store shared by all API processes.
+
+    Each job is a hash at "<prefix><job_id>" whose field values are JSON,
+    so update() writes only the fields that changed. update() is a
+    WATCH/MULTI transaction, retried if the job changes or expires between
+    its existence check and the write.
+    """
+
+    def __init__(
+        self,
+        redis_url: str | None = None,
+        ttl_seconds: int = 3600,
+        prefix: str = "inkforge:job:",
+        client: Any = None,
+    ) -> None:
+        """
+        Args:
+            redis_url: Redis connection URL (ignored if client is given).
+            ttl_seconds: Seconds after the last write before a job expires.
+            prefix: Key prefix for job hashes.
+            client: Existing redis.asyncio client.
+        """
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.Redis.from_url(redis_url)
+
+        self._redis = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}{job_id}"
+
+    async def _write(self, job_id: str, fields: dict[str, Any]) -> None:
+        key = self._key(job_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={k: json.dumps(v) for k, v in fields.items()})
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def create(self, job_id: str, job: dict[str, Any]) -> None:
+        await self._write(job_id, job)
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        raw = await self._redis.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        return {(k.decode() if isinstance(k, bytes) else k): json.loads(v) for k, v in raw.items()}
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        from redis.exceptions import WatchError
+
+        key = self._key(job_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    # Don't resurrect a job that already expired as a partial hash
+                    if not await pipe.exists(key):
+                        return
+                    pipe.multi()
+                    pipe.hset(key, mapping={k: json.dumps(v) for k, v in fields.items()})
+                    pipe.expire(key, self.ttl_seconds)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    async def claim(self, job_id: str, field: str, value: Any) -> bool:
+        from redis.exceptions import WatchError
+
+        key = self._key(job_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    if not await pipe.exists(key):
+                        return False
+                    current = await pipe.hget(key, field)
+                    if current is not None and json.loads(current) is not None:
+                        return False
+                    pipe.multi()
+                    pipe.hset(key, field, json.dumps(value))
+                    pipe.expire(key, self.ttl_seconds)
+                    await pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_job_store(
+    backend: str = "memory",
+    redis_url: str = "",
+    ttl_seconds: int = 3600,
+    max_jobs: int = 500,
+) -> JobStore:
+    """
+    Build the configured job store.
+
+    Args:
+        backend: "memory" or "redis".
+        redis_url: Redis connection URL (redis backend).
+        ttl_seconds: Job expiry in seconds.
+        max_jobs: Capacity of the in-memory backend.
+
+    Returns:
+        A JobStore instance.
+    """
+    if backend == "redis":
+        logger.info(f"Job store: redis ({redis_url}, ttl={ttl_seconds}s)")
+        return RedisJobStore(redis_url, ttl_seconds=ttl_seconds)
+
+    if backend != "memory":
+        logger.warning(f"Unknown job store backend: {backend}, using memory")
+    logger.info(f"Job store: memory (ttl={ttl_seconds}s, max_jobs={max_jobs})")
+    return InMemoryJobStore(ttl_seconds=ttl_seconds, max_jobs=max_jobs)
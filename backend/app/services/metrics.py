@@ -0,0 +1,316 @@
+"""
+INKFORGE — Prometheus Metrics
+
+Process-local counters, gauges and histograms, rendered in the Prometheus
+text exposition format (0.0.4) by GET /metrics on the API and by a small
+HTTP server on Celery workers (WORKER_METRICS_PORT).
+
+Hot-path cost is one lock and a bisect per observation. Values that
+already live elsewhere (cache hit counts, admission queue depth, stroke
+budget cut-offs) are not double-counted: collectors registered with
+REGISTRY.on_collect() copy them in at scrape time (the engine registers
+its collector while a model is loaded).
+
+Histograms (seconds):
+    inkforge_queue_wait_seconds{backend}           admission queue wait
+    inkforge_time_to_first_stroke_seconds{backend} request arrival → first stroke
+    inkforge_generation_seconds{backend}           request arrival → completion
+    inkforge_model_step_seconds{backend}           one batched decode step (fused
+                                                   step + sampling for compiled/onnx)
+    inkforge_sample_seconds{backend}               MDN sampling of one batched step
+    inkforge_serialization_seconds{format}         encoding one outgoing event
+
+Counters:
+    inkforge_requests_total{backend, outcome}      completed | cached | rejected | failed
+                                                   (streams, batch texts and documents)
+    inkforge_strokes_total{backend}                strokes generated
+    inkforge_cache_{hits,misses}_total{cache}      result cache, stroke store, stroke cache
+    inkforge_stroke_budget_exceeded_total          characters cut off by their cap
+
+Gauges:
+    inkforge_cache_hit_ratio{cache}, inkforge_queue_depth, inkforge_active_requests
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import math
+import threading
+from collections.abc import Callable, Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TypeVar
+
+logger = logging.getLogger("inkforge.metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request-level latencies: 5 ms … 2 min
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Per-step latencies: 50 µs … 250 ms
+STEP_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.25)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """Base for labeled metrics: one value (or histogram state) per label combination."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key: tuple[str, ...], value: object) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels: str) -> None:
+        """Mirror a count kept elsewhere (collectors only)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (usually set by a collector at scrape time)."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last = +Inf), then sum
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def _render_sample(self, key: tuple[str, ...], value: object) -> list[str]:
+        counts, total = value[:-1], value[-1]
+        names = (*self.labelnames, "le")
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+            cumulative += count
+            lines.append(
+                f"{self.name}_bucket{_format_labels(names, (*key, _format_value(bound)))} "
+                f"{cumulative}"
+            )
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+MetricT = TypeVar("MetricT", bound=_Metric)
+
+
+class Registry:
+    """The metrics of this process, plus scrape-time collectors."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: MetricT) -> MetricT:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def on_collect(self, collector: Callable[[], None]) -> None:
+        """Run collector before every render (it sets gauges from live state)."""
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]) -> None:
+        """Stop running collector (its state is going away)."""
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format."""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- Latencies ---
+QUEUE_WAIT = REGISTRY.register(
+    Histogram("inkforge_queue_wait_seconds", "Time spent in the admission queue.", ["backend"])
+)
+TIME_TO_FIRST_STROKE = REGISTRY.register(
+    Histogram(
+        "inkforge_time_to_first_stroke_seconds",
+        "Request arrival to first stroke.",
+        ["backend"],
+    )
+)
+GENERATION_TIME = REGISTRY.register(
+    Histogram("inkforge_generation_seconds", "Request arrival to completion.", ["backend"])
+)
+MODEL_STEP_TIME = REGISTRY.register(
+    Histogram(
+        "inkforge_model_step_seconds",
+        "One batched decode step (including sampling for compiled/onnx steps).",
+        ["backend"],
+        buckets=STEP_BUCKETS,
+    )
+)
+SAMPLE_TIME = REGISTRY.register(
+    Histogram(
+        "inkforge_sample_seconds",
+        "MDN sampling of one batched decode step.",
+        ["backend"],
+        buckets=STEP_BUCKETS,
+    )
+)
+SERIALIZATION_TIME = REGISTRY.register(
+    Histogram(
+        "inkforge_serialization_seconds",
+        "Encoding one outgoing stream event.",
+        ["format"],
+        buckets=STEP_BUCKETS,
+    )
+)
+
+# --- Throughput ---
+REQUESTS = REGISTRY.register(
+    Counter("inkforge_requests_total", "Stream requests by outcome.", ["backend", "outcome"])
+)
+STROKES = REGISTRY.register(Counter("inkforge_strokes_total", "Strokes streamed.", ["backend"]))
+
+# --- Scrape-time state (set by collectors) ---
+CACHE_HITS = REGISTRY.register(Counter("inkforge_cache_hits_total", "Cache hits.", ["cache"]))
+CACHE_MISSES = REGISTRY.register(Counter("inkforge_cache_misses_total", "Cache misses.", ["cache"]))
+CACHE_HIT_RATIO = REGISTRY.register(
+    Gauge("inkforge_cache_hit_ratio", "Cache hits / lookups since start.", ["cache"])
+)
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge("inkforge_queue_depth", "Requests waiting in the admission queue.")
+)
+ACTIVE_REQUESTS = REGISTRY.register(
+    Gauge("inkforge_active_requests", "Requests currently generating.")
+)
+STROKE_BUDGET_EXCEEDED = REGISTRY.register(
+    Counter("inkforge_stroke_budget_exceeded_total", "Characters cut off by their stroke budget.")
+)
+
+
+def set_cache_stats(cache: str, hits: int, misses: int) -> None:
+    """Publish one cache's hit/miss counts and hit ratio."""
+    CACHE_HITS.set_total(hits, cache=cache)
+    CACHE_MISSES.set_total(misses, cache=cache)
+    lookups = hits + misses
+    CACHE_HIT_RATIO.set(hits / lookups if lookups else 0.0, cache=cache)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802 — BaseHTTPRequestHandler API
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass  # Scrapes are not worth a log line each
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serve GET /metrics from a daemon thread (for processes without FastAPI).
+
+    Args:
+        port: TCP port to listen on.
+        host: Interface to bind.
+
+    Returns:
+        The running server (call shutdown() to stop it).
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="inkforge-metrics", daemon=True)
+    thread.start()
+    logger.info(f"Metrics server listening on {host}:{port}/metrics")
+    return server
@@ -0,0 +1,252 @@
+"""
+INKFORGE — ONNX Runtime Inference Service
+
+InferenceService variant for the "onnx" engine backend: the per-stroke
+decode step runs as an exported ONNX graph under onnxruntime's CPU
+execution provider, with the number of intra-op threads under our control.
+
+It accepts the same float LSTM checkpoints as the PyTorch backend. A .pt
+checkpoint is exported to <checkpoint>.decode.onnx on first load (and again
+whenever the checkpoint is newer than the export), next to the checkpoint or
+in ONNX_CACHE_DIR; a .onnx path is served directly. Checkpoints that cannot
+be exported (attention models, compiled .pts artifacts, an unwritable
+export directory) raise ArtifactExportError instead of being served.
+Everything around the step — tokenization, stroke budget, batching,
+seeding — is inherited, so strokes match the PyTorch backend's up to
+floating-point differences between the kernels.
+
+Only style presets are served: their projections are baked into the graph.
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+
+import torch
+
+from ..ml.artifacts import ArtifactExportError
+from ..ml.model import sampling_noise
+from ..ml.onnx_export import (
+    INPUT_NAMES,
+    ONNX_FORMAT_VERSION,
+    OUTPUT_NAMES,
+    metadata_path,
+    onnx_artifact_path,
+)
+from ..ml.seeding import make_generator
+from .inference import STYLE_PRESETS, DecodeState, InferenceService
+
+logger = logging.getLogger("inkforge.onnx")
+
+
+class OnnxInferenceService(InferenceService):
+    """InferenceService whose decode step runs under onnxruntime."""
+
+    backend = "onnx"
+
+    def __init__(
+        self,
+        checkpoint_path: str | None = None,
+        vocab_path: str | None = None,
+        stroke_budget_multiplier: float = 1.5,
+        num_threads: int = 0,
+        cache_dir: str | None = None,
+    ) -> None:
+        """
+        Initialize the ONNX inference service.
+
+        Args:
+            checkpoint_path: Checkpoint (.pt) or exported graph (.onnx).
+            vocab_path: Optional path to vocabulary JSON file.
+            stroke_budget_multiplier: Per-character step cap as a multiple of
+                the training p99 (0 disables the budget).
+            num_threads: onnxruntime intra-op threads (0 = onnxruntime default).
+            cache_dir: Directory of exported graphs (None = next to the checkpoint).
+        """
+        super().__init__(
+            checkpoint_path=checkpoint_path,
+            device="cpu",
+            vocab_path=vocab_path,
+            stroke_budget_multiplier=stroke_budget_multiplier,
+        )
+        self.num_threads = num_threads
+        self.cache_dir = cache_dir or None
+        self.session = None
+        self._num_layers = 0
+        self._hidden_dim = 0
+        self._num_presets = 0
+
+    def load_model(self) -> None:
+        """
+        Load (exporting first if needed) the ONNX decode step.
+
+        Raises:
+            ValueError: If no checkpoint is set or the graph is of an unsupported format.
+            FileNotFoundError: If the checkpoint does not exist.
+            ArtifactExportError: If the checkpoint cannot be exported.
+        """
+        import onnxruntime
+
+        if self.checkpoint_path is None:
+            raise ValueError("No checkpoint path provided")
+        if not self.checkpoint_path.exists():
+            raise FileNotFoundError(f"Checkpoint not found: {self.checkpoint_path}")
+
+        if self.checkpoint_path.suffix == ".onnx":
+            onnx_path = self.checkpoint_path
+        elif self.checkpoint_path.suffix == ".pts":
+            raise ArtifactExportError(
+                f"{self.checkpoint_path}: compiled decode steps cannot be served by the onnx "
+                "backend — point MODEL_CHECKPOINT_PATH at the .pt checkpoint"
+            )
+        else:
+            onnx_path = onnx_artifact_path(self.checkpoint_path, self.cache_dir)
+            if (
+                not onnx_path.exists()
+                or onnx_path.stat().st_mtime < self.checkpoint_path.stat().st_mtime
+            ):
+                self._export(onnx_path)
+
+        metadata = json.loads(metadata_path(onnx_path).read_text(encoding="utf-8"))
+        if metadata.get("format") != ONNX_FORMAT_VERSION:
+            raise ValueError(
+                f"{onnx_path}: unsupported ONNX decode format {metadata.get('format')}"
+            )
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.num_threads
+        options.inter_op_num_threads = 1  # The graph is a single sequential step
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            str(onnx_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+
+        self._num_layers = metadata["num_layers"]
+        self._hidden_dim = metadata["hidden_dim"]
+        self._num_presets = metadata["num_presets"]
+        self.stroke_mean = torch.tensor(metadata["stroke_mean"])
+        self.stroke_std = torch.tensor(metadata["stroke_std"])
+        if metadata.get("stroke_stats"):
+            self.load_stroke_stats(metadata["stroke_stats"])
+
+        self.model = None  # The PyTorch weights are not kept once the graph is loaded
+        self.quantization = "fp32"
+        self.is_loaded = True
+        logger.info(f"ONNX decode step loaded: {onnx_path} (threads={self.num_threads or 'auto'})")
+
+    def _export(self, onnx_path: Path) -> None:
+        """Export the checkpoint's decode step to onnx_path."""
+        from ..ml.onnx_export import export_onnx_decode_step
+
+        logger.info(f"Exporting ONNX decode step: {self.checkpoint_path} → {onnx_path}")
+        super().load_model()
+        checkpoint = torch.load(self.checkpoint_path, map_location="cpu", weights_only=True)
+        try:
+            onnx_path.parent.mkdir(parents=True, exist_ok=True)
+            error = export_onnx_decode_step(
+                self.model,
+                onnx_path,
+                style_embeddings=self.style_embeddings,
+                stroke_mean=self.stroke_mean,
+                stroke_std=self.stroke_std,
+                metadata={
+                    "source": self.checkpoint_path.name,
+                    "model_config": checkpoint.get("model_config", {}),
+                    "stroke_stats": checkpoint.get("stroke_stats"),
+                },
+            )
+        except OSError as e:
+            raise ArtifactExportError(
+                f"Cannot write the ONNX decode step to {onnx_path.parent} ({e}) — "
+                "set ONNX_CACHE_DIR to a writable directory"
+            ) from e
+        except ValueError as e:
+            raise ArtifactExportError(f"{self.checkpoint_path}: {e}") from e
+        logger.info(f"ONNX parity: max |onnx - eager| = {error:.2e}")
+
+    def quantize_int8(self, max_nll_delta: float = 0.05):
+        """Not available: the ONNX backend serves the exported fp32 graph."""
+        raise RuntimeError("The onnx backend serves the exported fp32 graph")
+
+    def supports_style(self, style_id: str | int) -> bool:
+        """Only the presets baked into the graph can be written."""
+        if isinstance(style_id, str):
+            return style_id in STYLE_PRESETS
+        return 0 <= style_id < self._num_presets
+
+    def begin_decode(
+        self,
+        text: str,
+        style_embedding: torch.Tensor | None = None,
+        style_id: str | int = "neat_cursive",
+        temperature: float = 0.4,
+        max_strokes: int = 2000,
+        seed: int | None = None,
+    ) -> DecodeState:
+        """
+        Create the initial decode state for a generation request.
+
+        Same arguments as InferenceService.begin_decode(), except that
+        custom style embeddings are not supported.
+
+        Raises:
+            ValueError: If a custom style_embedding is passed.
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+        if style_embedding is not None:
+            raise ValueError("The onnx backend only serves style presets")
+
+        char_indices = self._tokenize(text)
+        hidden_shape = (self._num_layers, 1, self._hidden_dim)
+
+        return DecodeState(
+            char_indices=char_indices,
+            style_proj=torch.empty(0),  # Preset projections live in the graph
+            hidden=(torch.zeros(hidden_shape), torch.zeros(hidden_shape)),
+            prev_stroke=torch.zeros(1, 5),
+            temperature=temperature,
+            max_strokes=max_strokes,
+            finished=len(char_indices) == 0,
+            generator=make_generator(seed),  # Noise is drawn on CPU; the graph has no RNG
+            char_caps=self._char_caps(char_indices, max_strokes),
+            style_index=min(self._style_index(style_id), self._num_presets - 1),
+        )
+
+    def decode_step(self, states: list[DecodeState]) -> list[tuple[float, float, int, int, int]]:
+        """
+        Advance a batch of decode states by one stroke each, in one session run.
+
+        Args:
+            states: Unfinished decode states (B >= 1).
+
+        Returns:
+            One (Δx, Δy, p1, p2, p3) stroke tuple per state, in order.
+        """
+        gathered = time.perf_counter()
+        generators = [state.generator for state in states]
+        if not any(generators):
+            generators = None
+        uniform, normal = sampling_noise(
+            len(states), torch.device("cpu"), torch.float32, generators
+        )
+
+        inputs = (
+            torch.tensor([state.char_indices[state.cursor] for state in states]),
+            torch.tensor([state.style_index for state in states]),
+            torch.cat([state.prev_stroke for state in states]),
+            torch.cat([state.hidden[0] for state in states], dim=1),
+            torch.cat([state.hidden[1] for state in states], dim=1),
+            torch.tensor([state.temperature for state in states], dtype=torch.float32),
+            uniform,
+            normal,
+        )
+        feeds = {name: value.numpy() for name, value in zip(INPUT_NAMES, inputs, strict=True)}
+        started = time.perf_counter()
+        outputs = self.session.run(OUTPUT_NAMES, feeds)
+        self._record_step(states, gathered, started, time.perf_counter())
+        sampled, h, c = (torch.from_numpy(out) for out in outputs)
+
+        return self._finish_step(states, sampled, h, c)
@@ -0,0 +1,273 @@
+"""
+INKFORGE — Result Cache
+
+Content-addressed cache of finished generations, so identical seeded
+requests (templated letters, re-renders of the same document) replay stored
+strokes instead of running the model again. Unseeded requests are not
+cached: repeating one is expected to give a fresh sample.
+
+Key:
+    sha256 over the canonical JSON of everything that determines the
+    strokes — text, style_id, humanization params, seed and the model
+    identity. Rendering-only options (paper, ink, font size, pacing,
+    framing) are left out, so they share one entry.
+
+Tiers:
+    - memory → LRU of compressed entries, bounded in bytes
+    - spill  → optional second tier ("disk" or "redis"); entries evicted
+               from memory stay there and are promoted again on a hit
+
+Entries hold the stroke data dicts of a completed stream plus its
+completion event; see LLMEngine.stream_generate for the replay.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger("inkforge.result_cache")
+
+# Bump when the cached payload or the stroke semantics change
+CACHE_FORMAT_VERSION = 1
+
+
+def request_key(
+    text: str,
+    style_id: str,
+    params: dict[str, Any],
+    seed: int | None = None,
+    model: str = "",
+) -> str:
+    """
+    Canonical hash of a generation request.
+
+    Args:
+        text: Input text.
+        style_id: Style preset identifier.
+        params: Humanization parameters dict.
+        seed: Sampling seed (None for unseeded requests).
+        model: Identity of the model producing the strokes.
+
+    Returns:
+        Hex digest identifying the request.
+    """
+    canonical = json.dumps(
+        {
+            "v": CACHE_FORMAT_VERSION,
+            "model": model,
+            "text": text,
+            "style_id": style_id,
+            "params": params,
+            "seed": seed,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    """A completed generation: stroke data dicts and the completion event."""
+
+    strokes: tuple[dict[str, Any], ...]
+    complete: dict[str, Any]
+
+    def to_bytes(self) -> bytes:
+        payload = {"strokes": self.strokes, "complete": self.complete}
+        return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> CachedResult:
+        payload = json.loads(zlib.decompress(data))
+        return cls(tuple(payload["strokes"]), payload["complete"])
+
+
+class DiskSpill:
+    """Spill tier storing one compressed file per entry under a directory."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json.z"
+
+    def load(self, key: str) -> bytes | None:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)  # Atomic, so readers never see a partial file
+
+
+class RedisSpill:
+    """Spill tier storing entries as Redis strings with a TTL."""
+
+    def __init__(
+        self,
+        redis_url: str | None = None,
+        ttl_seconds: int = 86400,
+        prefix: str = "inkforge:result:",
+        client: Any = None,
+    ) -> None:
+        """
+        Args:
+            redis_url: Redis connection URL (ignored if client is given).
+            ttl_seconds: Expiry of each entry.
+            prefix: Key prefix for entries.
+            client: Existing synchronous redis client.
+        """
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(redis_url)
+
+        self._redis = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def load(self, key: str) -> bytes | None:
+        return self._redis.get(f"{self.prefix}{key}")
+
+    def save(self, key: str, data: bytes) -> None:
+        self._redis.set(f"{self.prefix}{key}", data, ex=self.ttl_seconds)
+
+
+class ResultCache:
+    """
+    Two-tier LRU of completed generations, bounded by compressed size.
+
+    Entries are held as compressed payloads (a few bytes per stroke rather
+    than a dict each) and decoded on a hit. Thread-safe: spill I/O can run
+    in a worker thread (asyncio.to_thread) while the event loop reads the
+    memory tier.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, spill: Any = None) -> None:
+        """
+        Args:
+            max_bytes: Memory-tier capacity in compressed bytes.
+            spill: Optional DiskSpill / RedisSpill second tier.
+        """
+        self.max_bytes = max_bytes
+        self.spill = spill
+
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._spill_hits = 0
+        self._misses = 0
+
+    def get(self, key: str) -> CachedResult | None:
+        """Return a cached result (promoting spilled entries), or None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+
+        if data is None and self.spill is not None:
+            try:
+                data = self.spill.load(key)
+            except Exception as e:
+                logger.warning(f"Result spill read failed: {e}")
+            if data is not None:
+                with self._lock:
+                    self._spill_hits += 1
+                    self._insert(key, data)
+
+        if data is None:
+            with self._lock:
+                self._misses += 1
+            return None
+        return CachedResult.from_bytes(data)
+
+    def put(self, key: str, result: CachedResult) -> None:
+        """Store a result in memory and, if configured, in the spill tier."""
+        data = result.to_bytes()
+        with self._lock:
+            self._insert(key, data)
+
+        if self.spill is not None:
+            try:
+                self.spill.save(key, data)
+            except Exception as e:
+                logger.warning(f"Result spill write failed: {e}")
+
+    def _insert(self, key: str, data: bytes) -> None:
+        """Add to the memory tier and evict least recently used entries (lock held)."""
+        if len(data) > self.max_bytes:
+            return  # Larger than the whole tier — spill only
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+
+        self._entries[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def stats(self) -> dict[str, int]:
+        """Entry/byte counts and hit statistics."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "spill_hits": self._spill_hits,
+                "misses": self._misses,
+            }
+
+
+def create_result_cache(
+    max_mb: int = 64,
+    spill: str = "",
+    spill_dir: str = "./cache/results",
+    redis_url: str = "",
+    ttl_seconds: int = 86400,
+) -> ResultCache | None:
+    """
+    Build the configured result cache.
+
+    Args:
+        max_mb: Memory-tier capacity in MiB of compressed entries (0 disables the cache).
+        spill: "" (memory only), "disk" or "redis".
+        spill_dir: Directory of the disk spill tier.
+        redis_url: Redis connection URL (redis spill tier).
+        ttl_seconds: Entry expiry in the redis spill tier.
+
+    Returns:
+        A ResultCache, or None when disabled.
+    """
+    if max_mb <= 0:
+        return None
+
+    spill_tier = None
+    if spill == "disk":
+        spill_tier = DiskSpill(spill_dir)
+    elif spill == "redis":
+        spill_tier = RedisSpill(redis_url, ttl_seconds=ttl_seconds)
+    elif spill:
+        logger.warning(f"Unknown result cache spill: {spill}, using memory only")
+
+    return ResultCache(max_bytes=max_mb * 1024 * 1024, spill=spill_tier)
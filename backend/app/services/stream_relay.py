@@ -0,0 +1,160 @@
+"""
+INKFORGE — Distributed Stream Relay
+
+Carries a job's stream events from a Celery worker to whichever API
+process holds the client's WebSocket/SSE connection, over one Redis
+Stream per job ("inkforge:stream:<job_id>").
+
+    worker: engine.stream_generate(pacing="unpaced")
+              → StreamPublisher.add(event)      (XADD chunks of events)
+    API:    StreamRelay.events(job_id)          (XREAD from the start)
+              → pacing / framing / binary encoding as for local jobs
+
+A Redis Stream (not pub/sub) is used so the relay can attach before or
+after the worker starts publishing without losing events, and a client
+that reconnects replays the job from the beginning. Stream keys expire
+with the job TTL; the stream of a failed job is dropped (StreamRelay.reset)
+so the job can be dispatched again.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+logger = logging.getLogger("inkforge.stream_relay")
+
+STREAM_KEY_PREFIX = "inkforge:stream:"
+
+# Events that end a job's stream
+_TERMINAL_EVENTS = ("complete", "error")
+
+
+def stream_key(job_id: str) -> str:
+    """Redis key of a job's event stream."""
+    return f"{STREAM_KEY_PREFIX}{job_id}"
+
+
+class StreamPublisher:
+    """
+    Worker side: appends a job's stream events to its Redis Stream in chunks.
+
+    Events are buffered and written as one stream entry per chunk, flushed
+    when the chunk is full, when it has been open for max_interval_ms, or
+    on a terminal (complete/error) event.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        job_id: str,
+        chunk_size: int = 32,
+        max_interval_ms: float = 50.0,
+        ttl_seconds: int = 3600,
+    ) -> None:
+        """
+        Args:
+            client: Synchronous redis client.
+            job_id: Job whose stream is written.
+            chunk_size: Maximum events per stream entry.
+            max_interval_ms: Maximum age of a buffered chunk before it is flushed.
+            ttl_seconds: Expiry of the stream key.
+        """
+        self._redis = client
+        self.key = stream_key(job_id)
+        self.chunk_size = max(1, chunk_size)
+        self.max_interval = max_interval_ms / 1000.0
+        self.ttl_seconds = ttl_seconds
+
+        self._buffer: list[dict[str, Any]] = []
+        self._opened = 0.0
+        self.published = 0
+
+    def add(self, event: dict[str, Any]) -> None:
+        """Buffer one event, flushing the chunk when due."""
+        if not self._buffer:
+            self._opened = time.monotonic()
+        self._buffer.append(event)
+
+        if (
+            len(self._buffer) >= self.chunk_size
+            or event.get("type") in _TERMINAL_EVENTS
+            or time.monotonic() - self._opened >= self.max_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered events as one stream entry."""
+        if not self._buffer:
+            return
+        pipe = self._redis.pipeline()
+        pipe.xadd(self.key, {"events": json.dumps(self._buffer, ensure_ascii=False)})
+        pipe.expire(self.key, self.ttl_seconds)
+        pipe.execute()
+        self.published += len(self._buffer)
+        self._buffer = []
+
+
+class StreamRelay:
+    """API side: reads a job's Redis Stream and yields its events in order."""
+
+    def __init__(
+        self,
+        client: Any,
+        block_ms: int = 1000,
+        idle_timeout_s: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            client: redis.asyncio client.
+            block_ms: XREAD blocking time per poll.
+            idle_timeout_s: Give up after this long without a new entry.
+        """
+        self._redis = client
+        self.block_ms = block_ms
+        self.idle_timeout = idle_timeout_s
+
+    async def events(self, job_id: str) -> AsyncIterator[dict[str, Any]]:
+        """
+        Yield a job's events from the start of its stream until it completes.
+
+        Args:
+            job_id: Job to relay.
+
+        Yields:
+            Stream event dicts, ending with a complete or error event.
+        """
+        key = stream_key(job_id)
+        last_id = "0-0"
+        last_entry = time.monotonic()
+
+        while True:
+            response = await self._redis.xread({key: last_id}, count=64, block=self.block_ms)
+
+            if not response:
+                if time.monotonic() - last_entry > self.idle_timeout:
+                    logger.warning(f"Job {job_id}: no worker output for {self.idle_timeout}s")
+                    yield {"type": "error", "message": "Timed out waiting for a worker"}
+                    return
+                continue
+
+            last_entry = time.monotonic()
+            for _stream, entries in response:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    payload = fields.get(b"events", fields.get("events"))
+                    for event in json.loads(payload):
+                        yield event
+                        if event.get("type") in _TERMINAL_EVENTS:
+                            return
+
+    async def reset(self, job_id: str) -> None:
+        """Drop a failed job's stream, so a re-dispatched worker starts a fresh one."""
+        await self._redis.delete(stream_key(job_id))
+
+    async def close(self) -> None:
+        """Close the Redis connection."""
+        await self._redis.aclose()
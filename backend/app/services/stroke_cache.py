@@ -0,0 +1,200 @@
+"""
+INKFORGE — Word-Level Stroke Cache
+
+LRU cache of generated stroke sequences that sits in front of
+InferenceService.generate for document generation, where common words
+("the", "and", "of") repeat hundreds of times per job.
+
+Cache layout:
+    entry key = (word, style key, temperature bucket)
+    entry     = up to N variants, one per variation slot
+
+Each lookup picks a variation slot, so a cached word still comes back in
+N different shapes instead of being stamped identically across the page.
+Eviction is least-recently-used by entry, bounded by an estimated memory
+budget.
+"""
+
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+
+import torch
+
+Stroke = tuple[float, float, int, int, int]
+
+# Rough resident size of one cached stroke tuple (tuple header + two floats)
+_BYTES_PER_STROKE = 128
+
+
+def style_cache_key(style_id: str | int, style_embedding: torch.Tensor | None = None) -> str:
+    """
+    Build the style part of a cache key.
+
+    Args:
+        style_id: Style preset name or index.
+        style_embedding: Custom style vector. If given, it is hashed instead of style_id.
+
+    Returns:
+        Stable string identifying the style.
+    """
+    if style_embedding is None:
+        return f"preset:{style_id}"
+    digest = hashlib.sha1(style_embedding.detach().cpu().float().numpy().tobytes()).hexdigest()
+    return f"z:{digest[:16]}"
+
+
+class StrokeCache:
+    """
+    Memory-bounded LRU cache of per-word stroke variants.
+
+    Thread-safe; the generator callback runs outside the lock so a slow
+    miss does not block hits for other words.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        variants: int = 4,
+        temperature_step: float = 0.05,
+        rng: random.Random | None = None,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Estimated memory budget for cached strokes.
+            variants: Number of variation slots (pre-sampled variants) per entry.
+            temperature_step: Temperature quantization step for keys.
+            rng: Random source for slot selection (defaults to a private Random).
+        """
+        self.max_bytes = max_bytes
+        self.variants = max(1, variants)
+        self.temperature_step = temperature_step
+        self._rng = rng or random.Random()
+
+        self._entries: OrderedDict[tuple, dict[int, tuple[Stroke, ...]]] = OrderedDict()
+        self._entry_bytes: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+
+    def make_key(self, word: str, style_key: str, temperature: float) -> tuple:
+        """Build the entry key (word, style, temperature bucket)."""
+        bucket = round(temperature / self.temperature_step) if self.temperature_step > 0 else 0
+        return (word, style_key, bucket)
+
+    def get_or_generate(
+        self,
+        word: str,
+        style_key: str,
+        temperature: float,
+        generate_fn: Callable[[], list[Stroke]],
+        slot: int | None = None,
+    ) -> list[Stroke]:
+        """
+        Return cached strokes for a word, generating and storing them on a miss.
+
+        Args:
+            word: Word being written.
+            style_key: Style identifier from style_cache_key().
+            temperature: Sampling temperature (quantized into the key).
+            generate_fn: Called with no arguments to produce strokes on a miss.
+            slot: Variation slot in [0, variants). Chosen at random if None.
+
+        Returns:
+            List of (Δx, Δy, p1, p2, p3) stroke tuples.
+        """
+        if slot is None:
+            slot = self.choose_slot()
+
+        strokes = self.lookup(word, style_key, temperature, slot)
+        if strokes is None:
+            strokes = generate_fn()
+            self.put(word, style_key, temperature, slot, strokes)
+        return strokes
+
+    def choose_slot(self) -> int:
+        """Pick a random variation slot."""
+        with self._lock:
+            return self._rng.randrange(self.variants)
+
+    def lookup(
+        self, word: str, style_key: str, temperature: float, slot: int
+    ) -> list[Stroke] | None:
+        """
+        Return the cached variant for a slot, or None on a miss.
+
+        Args:
+            word: Word being written.
+            style_key: Style identifier from style_cache_key().
+            temperature: Sampling temperature (quantized into the key).
+            slot: Variation slot (taken modulo the number of variants).
+
+        Returns:
+            List of stroke tuples, or None if the variant is not cached.
+        """
+        key = self.make_key(word, style_key, temperature)
+        with self._lock:
+            entry = self._entries.get(key)
+            strokes = entry.get(slot % self.variants) if entry is not None else None
+            if strokes is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(strokes)
+
+    def put(
+        self, word: str, style_key: str, temperature: float, slot: int, strokes: list[Stroke]
+    ) -> None:
+        """Store a generated variant in a slot (counterpart of a missed lookup())."""
+        key = self.make_key(word, style_key, temperature)
+        self._store(key, slot % self.variants, tuple(strokes))
+
+    def _store(self, key: tuple, slot: int, strokes: tuple[Stroke, ...]) -> None:
+        """Insert one variant and evict least-recently-used entries over budget."""
+        size = len(strokes) * _BYTES_PER_STROKE
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            previous = entry.get(slot)
+            if previous is not None:
+                size -= len(previous) * _BYTES_PER_STROKE
+            entry[slot] = strokes
+            self._entries.move_to_end(key)
+            self._entry_bytes[key] = self._entry_bytes.get(key, 0) + size
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, _ = self._entries.popitem(last=False)
+                self.current_bytes -= self._entry_bytes.pop(old_key)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all cached entries (metrics are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._entry_bytes.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict[str, float | int]:
+        """Return hit/miss metrics and current occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
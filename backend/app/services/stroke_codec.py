@@ -0,0 +1,131 @@
+"""
+INKFORGE — Binary Stroke Codec
+
+Packed binary encoding of stroke frames for the WebSocket route, negotiated
+with the "inkforge.strokes.v1" subprotocol. Clients that do not offer the
+subprotocol keep receiving JSON events.
+
+Session:
+    1. Server accepts with subprotocol "inkforge.strokes.v1"
+    2. Server sends one JSON text message: the header (schema + version)
+    3. Stroke frames arrive as binary messages (layout below)
+    4. Non-stroke events (complete, error) stay JSON text messages
+
+Binary frame layout (little-endian, 9-byte fixed header):
+    u8   kind        — FRAME_KIND_STROKES (1)
+    u32  index       — stream index of the first stroke
+    u16  count       — N strokes
+    u16  num_chars   — C char-table entries
+    f16  dx[N]
+    f16  dy[N]
+    u8   pen[ceil(N/4)] — 2 bits per stroke, LSB first; 0=down, 1=up, 2=end
+    C × (u16 offset, u32 codepoint) — frame offsets where a new char starts
+
+About 4.25 bytes per stroke, against ~150 bytes for a JSON stroke event.
+Absolute x/y are not sent; clients integrate dx/dy.
+"""
+
+import struct
+from typing import Any
+
+import numpy as np
+
+STROKE_SUBPROTOCOL = "inkforge.strokes.v1"
+PROTOCOL_VERSION = 1
+
+FRAME_KIND_STROKES = 1
+
+_FRAME_HEADER = struct.Struct("<BIHH")
+_CHAR_ENTRY = np.dtype([("offset", "<u2"), ("codepoint", "<u4")])
+
+
+def header_message() -> dict[str, Any]:
+    """Describe the binary frame schema (sent once, as JSON, after accept)."""
+    return {
+        "type": "header",
+        "protocol": STROKE_SUBPROTOCOL,
+        "version": PROTOCOL_VERSION,
+        "byte_order": "little",
+        "frame": {
+            "kind": FRAME_KIND_STROKES,
+            "header": ["kind:u8", "index:u32", "count:u16", "num_chars:u16"],
+            "body": [
+                "dx:f16[count]",
+                "dy:f16[count]",
+                "pen:u2[count] (4 per byte, LSB first; 0=down 1=up 2=end)",
+                "chars:(offset:u16, codepoint:u32)[num_chars]",
+            ],
+        },
+    }
+
+
+def encode_frame(frame: dict[str, Any]) -> bytes:
+    """
+    Pack a frame event (see stroke_framer) into a binary message.
+
+    Args:
+        frame: A type="frame" event with dx/dy/pen/chars column arrays.
+
+    Returns:
+        Encoded frame bytes.
+    """
+    data = frame["data"]
+    count = frame["count"]
+    chars = data.get("chars", [])
+
+    pen = np.zeros(-(-count // 4) * 4, dtype=np.uint8)
+    pen[:count] = data["pen"]
+    pen = pen.reshape(-1, 4)
+    packed_pen = pen[:, 0] | (pen[:, 1] << 2) | (pen[:, 2] << 4) | (pen[:, 3] << 6)
+
+    char_table = np.array([(offset, ord(char[0])) for offset, char in chars], dtype=_CHAR_ENTRY)
+
+    return b"".join(
+        (
+            _FRAME_HEADER.pack(FRAME_KIND_STROKES, frame["index"], count, len(chars)),
+            np.asarray(data["dx"], dtype="<f2").tobytes(),
+            np.asarray(data["dy"], dtype="<f2").tobytes(),
+            packed_pen.astype(np.uint8).tobytes(),
+            char_table.tobytes(),
+        )
+    )
+
+
+def decode_frame(payload: bytes) -> dict[str, Any]:
+    """
+    Unpack a binary frame (inverse of encode_frame, minus x/y).
+
+    Args:
+        payload: Encoded frame bytes.
+
+    Returns:
+        Frame event with dx/dy/pen/chars column arrays.
+    """
+    kind, index, count, num_chars = _FRAME_HEADER.unpack_from(payload)
+    if kind != FRAME_KIND_STROKES:
+        raise ValueError(f"Unknown frame kind: {kind}")
+
+    offset = _FRAME_HEADER.size
+    dx = np.frombuffer(payload, dtype="<f2", count=count, offset=offset)
+    offset += 2 * count
+    dy = np.frombuffer(payload, dtype="<f2", count=count, offset=offset)
+    offset += 2 * count
+
+    pen_bytes = -(-count // 4)
+    packed = np.frombuffer(payload, dtype=np.uint8, count=pen_bytes, offset=offset)
+    offset += pen_bytes
+    pen = np.stack([(packed >> shift) & 0b11 for shift in (0, 2, 4, 6)], axis=1).reshape(-1)
+
+    char_table = np.frombuffer(payload, dtype=_CHAR_ENTRY, count=num_chars, offset=offset)
+
+    return {
+        "type": "frame",
+        "index": index,
+        "count": count,
+        "data": {
+            "dx": dx.astype(np.float32).tolist(),
+            "dy": dy.astype(np.float32).tolist(),
+            "pen": pen[:count].tolist(),
+            "chars": [[int(o), chr(c)] for o, c in char_table.tolist()],
+        },
+    }
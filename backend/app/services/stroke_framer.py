@@ -0,0 +1,166 @@
+"""
+INKFORGE — Stroke Framing
+
+Groups per-stroke stream events into frames of column arrays, so a
+WebSocket or SSE stream sends one message per K strokes (or per T ms of
+strokes) instead of one JSON message per stroke.
+
+Frame event:
+    {
+        "type": "frame",
+        "index": 120,             # stream index of the first stroke in the frame
+        "count": 32,
+        "data": {
+            "dx":  [...], "dy": [...],
+            "pen": [...],         # 0 = pen down, 1 = pen up, 2 = end of sequence
+            "x":   [...], "y":  [...],
+            "chars": [[0, "h"], [14, "e"]]   # sparse: frame offset where a new char starts
+        }
+    }
+
+A character starts wherever a stroke's "char_index" (the engine's cursor
+into the text) changes, so repeated letters ("ll") each get their entry.
+Events without char_index fall back to comparing "char" with the previous
+stroke's, which cannot tell repeated letters apart.
+
+Flush policy: a frame is emitted once it holds max_strokes strokes, or
+when a stroke arrives max_interval_ms or more after the frame's first
+stroke. Any non-stroke event (complete, error) flushes the pending frame
+first, so frames never reorder the stream.
+
+There is no timer: max_interval_ms is checked when a stroke arrives, so
+if the producer stalls mid-frame (e.g. a slow decode step) the strokes
+already framed wait for the next stroke or the complete event.
+"""
+
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+
+class StrokeFramer:
+    """Accumulates stroke events into column-array frames."""
+
+    def __init__(self, max_strokes: int = 32, max_interval_ms: float = 50.0) -> None:
+        """
+        Args:
+            max_strokes: Maximum strokes per frame (K).
+            max_interval_ms: Maximum time span of one frame in ms (T); 0 = count only.
+        """
+        self.max_strokes = max(1, max_strokes)
+        self.max_interval = max_interval_ms / 1000.0
+        self._reset()
+        self._last_char = ""
+        self._last_char_index: int | None = None
+
+    def _reset(self) -> None:
+        self._index: int | None = None
+        self._started = 0.0
+        self._dx: list[float] = []
+        self._dy: list[float] = []
+        self._pen: list[int] = []
+        self._x: list[float] = []
+        self._y: list[float] = []
+        self._chars: list[list[int | str]] = []
+
+    def add(self, event: dict[str, Any]) -> dict[str, Any] | None:
+        """
+        Add one stroke event.
+
+        Args:
+            event: A type="stroke" stream event.
+
+        Returns:
+            A completed frame event, or None if the frame is still filling.
+        """
+        data = event["data"]
+        if self._index is None:
+            self._index = event.get("index", 0)
+            self._started = time.monotonic()
+
+        char = data.get("char", "")
+        char_index = data.get("char_index")
+        if char_index is None:
+            starts = char != self._last_char
+        else:
+            starts = char_index != self._last_char_index
+        if char and starts:
+            self._chars.append([len(self._dx), char])
+        self._last_char = char
+        self._last_char_index = char_index
+
+        self._dx.append(data["dx"])
+        self._dy.append(data["dy"])
+        self._pen.append(2 if data.get("p3") else 1 if data.get("p2") else 0)
+        self._x.append(data.get("x", 0.0))
+        self._y.append(data.get("y", 0.0))
+
+        if len(self._dx) >= self.max_strokes or (
+            self.max_interval > 0 and time.monotonic() - self._started >= self.max_interval
+        ):
+            return self.flush()
+        return None
+
+    def flush(self) -> dict[str, Any] | None:
+        """Emit the pending frame, if any."""
+        if not self._dx:
+            return None
+
+        frame = {
+            "type": "frame",
+            "index": self._index,
+            "count": len(self._dx),
+            "data": {
+                "dx": self._dx,
+                "dy": self._dy,
+                "pen": self._pen,
+                "x": self._x,
+                "y": self._y,
+                "chars": self._chars,
+            },
+        }
+        self._reset()
+        return frame
+
+
+async def frame_events(
+    events: AsyncIterator[dict[str, Any]],
+    max_strokes: int = 32,
+    max_interval_ms: float = 50.0,
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Re-chunk a stream_generate() event stream into frames.
+
+    Frames are only cut when events arrive (see the module docstring).
+
+    Args:
+        events: Per-stroke event stream.
+        max_strokes: Maximum strokes per frame.
+        max_interval_ms: Maximum time span of one frame in ms.
+
+    Yields:
+        Frame events, with non-stroke events passed through in order.
+    """
+    framer = StrokeFramer(max_strokes, max_interval_ms)
+
+    try:
+        async for event in events:
+            if event.get("type") == "stroke":
+                frame = framer.add(event)
+                if frame is not None:
+                    yield frame
+                continue
+
+            frame = framer.flush()
+            if frame is not None:
+                yield frame
+            yield event
+
+        frame = framer.flush()
+        if frame is not None:
+            yield frame
+    finally:
+        # Consumer stopped early — release the engine stream now, not at GC
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,260 @@
+"""
+INKFORGE — Persistent Word Stroke Store
+
+Pre-generated stroke sequences for frequent words, one directory per
+style preset, memory-mapped read-only at startup. Because the pages come
+from the OS page cache, every API process and Celery worker on a node
+shares one copy of the vocabulary.
+
+On-disk layout (per style):
+    <root>/<style_id>/deltas.f16   float16 [N, 2] — (Δx, Δy) for all strokes
+    <root>/<style_id>/pen.u8       uint8   [N]    — pen state (0=down, 1=up, 2=end)
+    <root>/<style_id>/index.json   {"version", "temperature", "checkpoint", "style_table",
+                                    "words": {word: [[offset, length], ...]}}
+
+Each word maps to one or more variants (offset/length spans into the
+arrays). Populate a store offline with scripts/build_stroke_store.py.
+
+"checkpoint" and "style_table" fingerprint the model and preset table the
+strokes were generated with. The engine refuses a store built for another
+checkpoint or preset table, so a retrain never serves stale words.
+"""
+
+import json
+import logging
+import random
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger("inkforge.stroke_store")
+
+STORE_VERSION = 1
+
+_DELTAS_FILE = "deltas.f16"
+_PEN_FILE = "pen.u8"
+_INDEX_FILE = "index.json"
+
+Stroke = tuple[float, float, int, int, int]
+
+
+class _StyleShard:
+    """Memory-mapped arrays and word index for one style preset."""
+
+    def __init__(self, style_dir: Path) -> None:
+        with open(style_dir / _INDEX_FILE, encoding="utf-8") as f:
+            index = json.load(f)
+
+        if index.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported stroke store version: {index.get('version')}")
+
+        self.temperature: float = index.get("temperature", 0.4)
+        self.checkpoint: str | None = index.get("checkpoint")
+        self.style_table: str | None = index.get("style_table")
+        self.words: dict[str, list[list[int]]] = index["words"]
+
+        num_strokes = index.get("num_strokes", 0)
+        if num_strokes > 0:
+            self.deltas = np.memmap(
+                style_dir / _DELTAS_FILE, dtype=np.float16, mode="r", shape=(num_strokes, 2)
+            )
+            self.pen = np.memmap(
+                style_dir / _PEN_FILE, dtype=np.uint8, mode="r", shape=(num_strokes,)
+            )
+        else:
+            self.deltas = np.zeros((0, 2), dtype=np.float16)
+            self.pen = np.zeros((0,), dtype=np.uint8)
+
+    def read(self, offset: int, length: int) -> list[Stroke]:
+        """Decode one variant span into stroke tuples."""
+        deltas = self.deltas[offset : offset + length].astype(np.float32).tolist()
+        pens = self.pen[offset : offset + length].tolist()
+        return [
+            (dx, dy, int(pen == 0), int(pen == 1), int(pen == 2))
+            for (dx, dy), pen in zip(deltas, pens, strict=True)
+        ]
+
+
+class StrokeStore:
+    """
+    Read-only store of pre-generated word strokes, keyed by (style, word).
+
+    Lookups that miss (unknown word, unknown style, or a request temperature
+    too far from the one the store was built at) return None so callers can
+    fall back to the model.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        max_temperature_delta: float = 0.15,
+        rng: random.Random | None = None,
+        checkpoint: str | None = None,
+        style_table: str | None = None,
+    ) -> None:
+        """
+        Open all style shards under a store directory.
+
+        Args:
+            root: Store root directory (one sub-directory per style preset).
+            max_temperature_delta: Largest |request τ − store τ| still served from disk.
+            rng: Random source for variant selection.
+            checkpoint: Fingerprint of the serving checkpoint (None = not checked).
+            style_table: Fingerprint of the serving style table (None = not checked).
+
+        Raises:
+            FileNotFoundError: If root does not exist.
+            ValueError: If a shard was built for another checkpoint or style table.
+        """
+        self.root = Path(root)
+        self.max_temperature_delta = max_temperature_delta
+        self._rng = rng or random.Random()
+        self._shards: dict[str, _StyleShard] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        if not self.root.is_dir():
+            raise FileNotFoundError(f"Stroke store not found: {self.root}")
+
+        for style_dir in sorted(self.root.iterdir()):
+            if (style_dir / _INDEX_FILE).exists():
+                shard = _StyleShard(style_dir)
+                for name, expected, actual in (
+                    ("checkpoint", checkpoint, shard.checkpoint),
+                    ("style table", style_table, shard.style_table),
+                ):
+                    if expected is not None and actual != expected:
+                        raise ValueError(
+                            f"{style_dir} was built for {name} {actual}, not {expected} — "
+                            "rebuild it with scripts/build_stroke_store.py"
+                        )
+                self._shards[style_dir.name] = shard
+
+        logger.info(
+            f"Stroke store opened: {self.root} ({len(self._shards)} styles, {self.num_words} words)"
+        )
+
+    @property
+    def styles(self) -> list[str]:
+        """Style presets present in the store."""
+        return list(self._shards)
+
+    @property
+    def num_words(self) -> int:
+        """Total number of (style, word) entries."""
+        return sum(len(shard.words) for shard in self._shards.values())
+
+    def lookup(
+        self,
+        word: str,
+        style_id: str,
+        temperature: float | None = None,
+        variant: int | None = None,
+    ) -> list[Stroke] | None:
+        """
+        Fetch stored strokes for a word.
+
+        Args:
+            word: Word to look up (exact match).
+            style_id: Style preset name.
+            temperature: Request temperature; misses if too far from the store's.
+            variant: Variant index; chosen at random if None.
+
+        Returns:
+            List of (Δx, Δy, p1, p2, p3) tuples, or None on a miss.
+        """
+        shard = self._shards.get(style_id)
+        spans = shard.words.get(word) if shard is not None else None
+        if spans is None or (
+            temperature is not None
+            and abs(temperature - shard.temperature) > self.max_temperature_delta
+        ):
+            self.misses += 1
+            return None
+
+        if variant is None:
+            variant = self._rng.randrange(len(spans))
+        offset, length = spans[variant % len(spans)]
+
+        self.hits += 1
+        return shard.read(offset, length)
+
+    def stats(self) -> dict[str, int | float]:
+        """Return hit/miss counters and store size."""
+        lookups = self.hits + self.misses
+        return {
+            "styles": len(self._shards),
+            "words": self.num_words,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class StrokeStoreWriter:
+    """
+    Builds one style shard of a stroke store.
+
+    Usage:
+        writer = StrokeStoreWriter("stroke_store/", "neat_cursive", temperature=0.4)
+        writer.add("the", strokes)
+        writer.close()
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        style_id: str,
+        temperature: float,
+        checkpoint: str | None = None,
+        style_table: str | None = None,
+    ) -> None:
+        """
+        Args:
+            root: Store root directory.
+            style_id: Style preset this shard belongs to.
+            temperature: Sampling temperature the strokes were generated at.
+            checkpoint: Fingerprint of the generating checkpoint.
+            style_table: Fingerprint of the generating style preset table.
+        """
+        self.style_dir = Path(root) / style_id
+        self.temperature = temperature
+        self.checkpoint = checkpoint
+        self.style_table = style_table
+        self._deltas: list[tuple[float, float]] = []
+        self._pen: list[int] = []
+        self._words: dict[str, list[list[int]]] = {}
+
+    def add(self, word: str, strokes: list[Stroke]) -> None:
+        """Append one variant of a word."""
+        if not strokes:
+            return
+        offset = len(self._pen)
+        for dx, dy, _p1, p2, p3 in strokes:
+            self._deltas.append((dx, dy))
+            self._pen.append(2 if p3 else 1 if p2 else 0)
+        self._words.setdefault(word, []).append([offset, len(strokes)])
+
+    def close(self) -> None:
+        """Write the arrays and index to disk."""
+        self.style_dir.mkdir(parents=True, exist_ok=True)
+
+        np.asarray(self._deltas, dtype=np.float16).reshape(-1, 2).tofile(
+            self.style_dir / _DELTAS_FILE
+        )
+        np.asarray(self._pen, dtype=np.uint8).tofile(self.style_dir / _PEN_FILE)
+
+        with open(self.style_dir / _INDEX_FILE, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": STORE_VERSION,
+                    "temperature": self.temperature,
+                    "checkpoint": self.checkpoint,
+                    "style_table": self.style_table,
+                    "num_strokes": len(self._pen),
+                    "words": self._words,
+                },
+                f,
+                ensure_ascii=False,
+            )
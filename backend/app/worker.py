@@ -25,7 +25,12 @@ import logging
 import time
 
 from celery import Celery
-from celery.signals import worker_init, worker_shutdown
+from celery.signals import (
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
 
 from app.config import settings
 
@@ -93,6 +98,10 @@ def on_worker_init(**kwargs):
     NOTE: In production, the Celery worker and FastAPI server may run
     in separate processes (or even separate machines). Each gets its
     own LLMEngine instance — this is by design for GPU isolation.
+
+    This runs in the parent, before the prefork pool forks. The model's
+    decode threads do not survive the fork; the batcher restarts them in
+    each pool process on its first request.
     """
     global _worker_engine
 
@@ -109,14 +118,31 @@ def on_worker_init(**kwargs):
     config = EngineConfig(
         model_name=settings.model_name,
         checkpoint_path=settings.model_checkpoint_path,
+        compiled_decode=settings.compiled_decode,
         device=settings.device,
         engine_backend=settings.engine_backend,
+        onnx_num_threads=settings.onnx_num_threads,
+        onnx_cache_dir=settings.onnx_cache_dir,
         gpu_memory_fraction=settings.gpu_memory_fraction,
         quantization_bits=settings.quantization_bits,
+        quantization_max_nll_delta=settings.quantization_max_nll_delta,
         kv_cache_size_gb=settings.kv_cache_size_gb,
         max_seq_len=settings.max_seq_len,
         max_concurrent_requests=1,  # Celery worker: always 1
+        decode_threads_per_worker=settings.decode_threads_per_worker,  # One decode worker
         stream_chunk_delay_ms=0,  # No delay needed for batch processing
+        stream_pacing="unpaced",  # Never sleep between strokes
+        stroke_store_dir=settings.stroke_store_dir,  # memory-mapped, shared with the API
+        stroke_cache_mb=settings.stroke_cache_mb,
+        document_workers=settings.document_workers,  # Started per pool process
+        batch_decode_size=settings.batch_decode_size,
+        max_strokes_per_char=settings.max_strokes_per_char,
+        stroke_budget_multiplier=settings.stroke_budget_multiplier,
+        result_cache_mb=settings.result_cache_mb,
+        result_cache_spill=settings.result_cache_spill,
+        result_cache_dir=settings.result_cache_dir,
+        result_cache_ttl_seconds=settings.result_cache_ttl_seconds,
+        redis_url=settings.redis_url,
     )
 
     # Run async init in sync context
@@ -129,6 +155,34 @@ def on_worker_init(**kwargs):
     logger.info("CELERY WORKER — Engine ready, accepting tasks")
 
 
+@worker_process_init.connect
+def on_worker_process_init(**kwargs):
+    """
+    Serve Prometheus metrics from the pool process that runs the tasks.
+
+    Metrics live in process memory, so the server starts in the forked
+    child, not in the parent that loaded the model. A recycled child
+    (worker_max_tasks_per_child) rebinds the port and starts from zero,
+    which Prometheus treats as a counter reset.
+    """
+    if settings.worker_metrics_port <= 0:
+        return
+
+    from app.services.metrics import start_metrics_server
+
+    try:
+        start_metrics_server(settings.worker_metrics_port)
+    except OSError as e:
+        logger.warning(f"Metrics server unavailable on port {settings.worker_metrics_port}: {e}")
+
+
+@worker_process_shutdown.connect
+def on_worker_process_shutdown(**kwargs):
+    """Stop the document worker processes this pool process started."""
+    if _worker_engine is not None:
+        _worker_engine.close_document_pool()
+
+
 @worker_shutdown.connect
 def on_worker_shutdown(**kwargs):
     """Release GPU resources when the worker shuts down."""
@@ -163,6 +217,7 @@ def generate_handwriting(
     text: str,
     style_id: str,
     params: dict,
+    seed: int | None = None,
 ) -> dict:
     """
     Async task: Generate handwriting strokes for the given text.
@@ -177,6 +232,7 @@ def generate_handwriting(
         text: Input text to synthesize.
         style_id: ID of the style preset to use.
         params: Humanization parameters dict.
+        seed: Optional sampling seed for reproducible output.
 
     Returns:
         Dict containing stroke sequence and metadata.
@@ -203,6 +259,8 @@ def generate_handwriting(
             text=text,
             style_id=style_id,
             params=params,
+            pacing="unpaced",
+            seed=seed,
         ):
             if event.get("type") == "stroke":
                 strokes.append(event["data"])
@@ -234,3 +292,263 @@ def generate_handwriting(
             "style_id": style_id,
         },
     }
+
+
+@worker.task(
+    bind=True,
+    name="inkforge.generate_batch",
+    max_retries=2,
+    default_retry_delay=5,
+    # Thousands of short texts can outlast the single-document limits
+    time_limit=900,
+    soft_time_limit=840,
+)
+def generate_handwriting_batch(
+    self,
+    texts: list[str],
+    style_id: str,
+    params: dict,
+    seed: int | None = None,
+) -> dict:
+    """
+    Batch task: Generate handwriting strokes for many texts in one pass.
+
+    Calls the engine's synchronous batched API directly — no event loop,
+    no streaming events, no per-stroke delay — so per-text overhead is a
+    share of a batched model step instead of a whole task.
+
+    Strokes are returned as compact column arrays per text:
+        dx, dy: float lists (rounded to 3 decimals)
+        pen:    int list — 0 = pen down, 1 = pen up, 2 = end of sequence
+
+    Args:
+        texts: Input texts to synthesize.
+        style_id: ID of the style preset to use (shared by all texts).
+        params: Humanization parameters dict (shared by all texts).
+        seed: Optional batch seed; each text's output is reproducible and
+            independent of batch composition.
+
+    Returns:
+        Dict containing one compact stroke record per text and metadata.
+    """
+    global _worker_engine
+
+    if _worker_engine is None or not _worker_engine.is_ready:
+        raise RuntimeError(
+            "LLM Engine not initialized. Ensure worker_init signal loaded the model."
+        )
+
+    task_id = self.request.id
+    logger.info(f"Task {task_id}: starting batch generation ({len(texts)} texts)")
+
+    start_time = time.monotonic()
+
+    batch = _worker_engine.generate_batch(texts, style_id=style_id, params=params, seed=seed)
+
+    results = []
+    total_strokes = 0
+    for strokes in batch:
+        results.append(
+            {
+                "dx": [round(dx, 3) for dx, _, _, _, _ in strokes],
+                "dy": [round(dy, 3) for _, dy, _, _, _ in strokes],
+                "pen": [2 if p3 else 1 if p2 else 0 for _, _, _, p2, p3 in strokes],
+            }
+        )
+        total_strokes += len(strokes)
+
+    elapsed_ms = round((time.monotonic() - start_time) * 1000, 1)
+
+    logger.info(
+        f"Task {task_id}: complete — {len(texts)} texts, {total_strokes} strokes in {elapsed_ms}ms"
+    )
+
+    return {
+        "job_id": task_id,
+        "status": "complete",
+        "results": results,
+        "metadata": {
+            "total_texts": len(texts),
+            "total_strokes": total_strokes,
+            "generation_time_ms": elapsed_ms,
+            "style_id": style_id,
+        },
+    }
+
+
+@worker.task(
+    bind=True,
+    name="inkforge.generate_document",
+    max_retries=2,
+    default_retry_delay=5,
+    time_limit=900,
+    soft_time_limit=840,
+)
+def generate_handwriting_document(
+    self,
+    text: str,
+    style_id: str,
+    params: dict,
+    seed: int | None = None,
+) -> dict:
+    """
+    Document task: Lay out and generate a full page.
+
+    Words are placed by the document generator and decoded together; the
+    worker's word stroke cache (STROKE_CACHE_MB) serves repeated words of
+    unseeded documents, across every document this worker process handles.
+
+    Args:
+        text: Full document text.
+        style_id: ID of the style preset to use.
+        params: Humanization parameters dict.
+        seed: Optional document seed (bypasses the stroke cache).
+
+    Returns:
+        Dict containing one positioned, compact stroke record per word.
+    """
+    global _worker_engine
+
+    if _worker_engine is None or not _worker_engine.is_ready:
+        raise RuntimeError(
+            "LLM Engine not initialized. Ensure worker_init signal loaded the model."
+        )
+
+    task_id = self.request.id
+    logger.info(f"Task {task_id}: starting document generation ({len(text)} chars)")
+
+    start_time = time.monotonic()
+
+    layout = _worker_engine.generate_document(text, style_id=style_id, params=params, seed=seed)
+
+    words = []
+    total_strokes = 0
+    for slot in layout:
+        strokes = slot["strokes"]
+        words.append(
+            {
+                "word": slot["word"],
+                "position": slot["position"],
+                "line_number": slot["line_number"],
+                "dx": [round(dx, 3) for dx, _, _, _, _ in strokes],
+                "dy": [round(dy, 3) for _, dy, _, _, _ in strokes],
+                "pen": [2 if p3 else 1 if p2 else 0 for _, _, _, p2, p3 in strokes],
+            }
+        )
+        total_strokes += len(strokes)
+
+    elapsed_ms = round((time.monotonic() - start_time) * 1000, 1)
+
+    logger.info(
+        f"Task {task_id}: complete — {len(words)} words, {total_strokes} strokes in {elapsed_ms}ms"
+    )
+
+    return {
+        "job_id": task_id,
+        "status": "complete",
+        "words": words,
+        "metadata": {
+            "total_words": len(words),
+            "total_strokes": total_strokes,
+            "generation_time_ms": elapsed_ms,
+            "text_length": len(text),
+            "style_id": style_id,
+        },
+    }
+
+
+@worker.task(
+    bind=True,
+    name="inkforge.generate_stream",
+    # A retry would replay events into a stream a client is already reading
+    max_retries=0,
+)
+def generate_handwriting_stream(
+    self,
+    job_id: str,
+    text: str,
+    style_id: str,
+    params: dict,
+    seed: int | None = None,
+    profile: bool = False,
+) -> dict:
+    """
+    Streaming task: Generate a job's strokes and publish them as they are produced.
+
+    Used when STREAM_MODE=distributed. Events are appended to the job's
+    Redis Stream (see app.services.stream_relay) in small chunks, and the
+    API process holding the client's WebSocket/SSE connection relays,
+    paces, and frames them. Generation itself is unpaced.
+
+    Args:
+        job_id: API job ID (names the Redis Stream).
+        text: Input text to synthesize.
+        style_id: ID of the style preset to use.
+        params: Humanization parameters dict.
+        seed: Optional sampling seed for reproducible output.
+        profile: Add per-phase generation timers to the complete event.
+
+    Returns:
+        Dict with the number of events published and timing metadata.
+    """
+    import asyncio
+
+    import redis
+
+    from app.ml.profiling import RequestProfile
+    from app.services.stream_relay import StreamPublisher
+
+    global _worker_engine
+
+    client = redis.Redis.from_url(settings.redis_url)
+    publisher = StreamPublisher(client, job_id, ttl_seconds=settings.job_ttl_seconds)
+
+    task_id = self.request.id
+    logger.info(f"Task {task_id}: streaming job {job_id} ({len(text)} chars)")
+
+    start_time = time.monotonic()
+
+    async def _publish_events():
+        async for event in _worker_engine.stream_generate(
+            text=text,
+            style_id=style_id,
+            params=params,
+            pacing="unpaced",
+            seed=seed,
+            profile=RequestProfile() if profile else None,
+        ):
+            publisher.add(event)
+
+    try:
+        if _worker_engine is None or not _worker_engine.is_ready:
+            raise RuntimeError(
+                "LLM Engine not initialized. Ensure worker_init signal loaded the model."
+            )
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(_publish_events())
+        finally:
+            loop.close()
+    except Exception as e:
+        logger.error(f"Task {task_id}: stream for job {job_id} failed — {e}")
+        publisher.add({"type": "error", "message": str(e)})
+        raise
+    finally:
+        publisher.flush()
+        client.close()
+
+    elapsed_ms = round((time.monotonic() - start_time) * 1000, 1)
+
+    logger.info(
+        f"Task {task_id}: job {job_id} published {publisher.published} events in {elapsed_ms}ms"
+    )
+
+    return {
+        "job_id": job_id,
+        "status": "complete",
+        "metadata": {
+            "events_published": publisher.published,
+            "generation_time_ms": elapsed_ms,
+        },
+    }
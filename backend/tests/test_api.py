@@ -1,12 +1,34 @@
 """
 INKFORGE — API Tests
 
-Tests for FastAPI endpoints: /generate, /export, /styles, /health.
+Tests for FastAPI endpoints: /generate, /export, /styles, /health, /metrics.
 """
 
+import asyncio
+import json
+import multiprocessing
+import time
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
 from fastapi.testclient import TestClient
 
+from app.config import Settings, settings
 from app.main import app
+from app.ml import pacing
+from app.ml.admission import AdmissionController, AdmissionRejectedError
+from app.ml.batching import ContinuousBatcher
+from app.ml.llm_engine import EngineConfig, LLMEngine, UnsupportedStyleError
+from app.ml.pacing import PacingMode, StreamPacer, pace_events
+from app.ml.profiling import RequestProfile
+from app.services import metrics
+from app.services.job_store import InMemoryJobStore, RedisJobStore
+from app.services.metrics import Counter, Histogram, Registry
+from app.services.result_cache import CachedResult, DiskSpill, ResultCache, request_key
+from app.services.stream_relay import StreamPublisher, StreamRelay
+from app.services.stroke_codec import decode_frame, encode_frame
+from app.services.stroke_framer import StrokeFramer
 
 client = TestClient(app)
 
@@ -65,3 +87,777 @@ class TestExportEndpoint:
         """Should return 422 if job_id is missing."""
         # TODO: Implement
         pass
+
+
+class TestStreamFraming:
+    """Tests for grouping stroke events into column-array frames."""
+
+    def test_frames_flush_by_count(self) -> None:
+        """Strokes should be grouped K at a time with pen states encoded as 0/1/2."""
+        framer = StrokeFramer(max_strokes=2, max_interval_ms=0)
+        strokes = [
+            {"dx": 1.0, "dy": 0.5, "p1": 1, "p2": 0, "p3": 0, "char": "h"},
+            {"dx": 2.0, "dy": 0.0, "p1": 0, "p2": 1, "p3": 0, "char": ""},
+            {"dx": 0.5, "dy": 0.1, "p1": 0, "p2": 0, "p3": 1, "char": "i"},
+        ]
+        frames = [
+            framer.add({"type": "stroke", "index": i, "data": d}) for i, d in enumerate(strokes)
+        ]
+
+        assert frames[0] is None
+        assert frames[1]["count"] == 2
+        assert frames[1]["data"]["pen"] == [0, 1]
+        assert frames[1]["data"]["chars"] == [[0, "h"]]
+        assert frames[2] is None
+
+        tail = framer.flush()
+        assert tail["index"] == 2
+        assert tail["data"]["pen"] == [2]
+        assert framer.flush() is None
+
+    def test_repeated_characters_each_start(self) -> None:
+        """Consecutive identical letters should each get an entry in "chars"."""
+        framer = StrokeFramer(max_strokes=16, max_interval_ms=0)
+        # "all": one pen-up stroke per character, the same letter twice in a row
+        for i, char in enumerate("all"):
+            for p2 in (0, 1):
+                data = {"dx": 1.0, "dy": 0.0, "p1": 0, "p2": p2, "p3": 0}
+                framer.add(
+                    {
+                        "type": "stroke",
+                        "index": 2 * i + p2,
+                        "data": {**data, "char": char, "char_index": i},
+                    }
+                )
+
+        assert framer.flush()["data"]["chars"] == [[0, "a"], [2, "l"], [4, "l"]]
+
+    async def test_mock_stream_marks_repeated_characters(self) -> None:
+        """Framed mock output should start a character for each letter of the text."""
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+
+        framer = StrokeFramer(max_strokes=10_000, max_interval_ms=0)
+        async for event in engine.stream_generate("hello", pacing="unpaced", seed=1):
+            if event["type"] == "stroke":
+                framer.add(event)
+
+        assert "".join(char for _, char in framer.flush()["data"]["chars"]).strip() == "hello"
+
+    def test_binary_frame_round_trip(self) -> None:
+        """Packed binary frames should decode to the same columns (float16 precision)."""
+        frame = {
+            "type": "frame",
+            "index": 70000,
+            "count": 5,
+            "data": {
+                "dx": [1.5, -2.25, 8.0, 0.125, 3.0],
+                "dy": [0.5, 0.0, -1.0, 2.0, 0.0],
+                "pen": [0, 0, 1, 0, 2],
+                "x": [0.0] * 5,
+                "y": [0.0] * 5,
+                "chars": [[0, "h"], [3, "é"]],
+            },
+        }
+
+        decoded = decode_frame(encode_frame(frame))
+
+        assert decoded["index"] == 70000
+        assert decoded["data"]["dx"] == frame["data"]["dx"]
+        assert decoded["data"]["dy"] == frame["data"]["dy"]
+        assert decoded["data"]["pen"] == frame["data"]["pen"]
+        assert decoded["data"]["chars"] == frame["data"]["chars"]
+
+
+class TestJobStore:
+    """Tests for the pluggable job store backends."""
+
+    async def test_memory_store_caps_size_oldest_first(self) -> None:
+        """Beyond max_jobs, the job created first should be dropped."""
+        store = InMemoryJobStore(ttl_seconds=60, max_jobs=2)
+        for job_id in ("a", "b", "c"):
+            await store.create(job_id, {"status": "queued"})
+
+        assert await store.get("a") is None
+        assert (await store.get("c"))["status"] == "queued"
+        assert len(store) == 2
+
+    async def test_memory_store_expires_jobs(self) -> None:
+        """Jobs past their TTL should no longer be returned."""
+        store = InMemoryJobStore(ttl_seconds=0)
+        await store.create("a", {"status": "queued"})
+        assert await store.get("a") is None
+
+    async def test_redis_store_round_trip(self) -> None:
+        """Redis jobs should round-trip through JSON hash fields and carry a TTL."""
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeAsyncRedis()
+        store = RedisJobStore(ttl_seconds=60, client=client)
+
+        await store.create("a", {"status": "queued", "params": {"slant_angle": 5.0}})
+        await store.update("a", status="complete", result={"total_strokes": 12})
+        await store.update("missing", status="complete")
+
+        job = await store.get("a")
+        assert job["status"] == "complete"
+        assert job["params"] == {"slant_angle": 5.0}
+        assert job["result"] == {"total_strokes": 12}
+        assert 0 < await client.ttl("inkforge:job:a") <= 60
+        assert await store.get("missing") is None
+
+    async def test_claim_succeeds_once(self) -> None:
+        """Concurrent claims of the same job field should let exactly one through."""
+        fakeredis = pytest.importorskip("fakeredis")
+        for store in (InMemoryJobStore(), RedisJobStore(client=fakeredis.FakeAsyncRedis())):
+            await store.create("a", {"status": "queued", "dispatched_at": None})
+
+            claims = await asyncio.gather(*(store.claim("a", "dispatched_at", i) for i in range(5)))
+
+            assert sorted(claims) == [False] * 4 + [True]
+            assert (await store.get("a"))["dispatched_at"] == claims.index(True)
+            assert await store.claim("missing", "dispatched_at", 1) is False
+
+    async def test_redis_update_does_not_resurrect_expired_job(self) -> None:
+        """An update landing after the job expired should not recreate a partial job."""
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeAsyncRedis()
+        store = RedisJobStore(ttl_seconds=60, client=client)
+
+        await store.create("a", {"status": "streaming", "text": "hi"})
+        await client.delete("inkforge:job:a")  # Expired
+        await store.update("a", status="complete")
+
+        assert await client.exists("inkforge:job:a") == 0
+
+
+class TestStreamRelay:
+    """Tests for relaying worker stream events through Redis."""
+
+    async def test_published_events_relay_in_order(self) -> None:
+        """Events published by a worker should be relayed in order, up to completion."""
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        publisher = StreamPublisher(fakeredis.FakeRedis(server=server), "job-1", chunk_size=4)
+        relay = StreamRelay(fakeredis.FakeAsyncRedis(server=server), block_ms=10)
+
+        for i in range(10):
+            publisher.add({"type": "stroke", "data": {"index": i}})
+        publisher.add({"type": "complete", "data": {"total_strokes": 10}})
+
+        events = [event async for event in relay.events("job-1")]
+
+        assert [e["data"]["index"] for e in events[:-1]] == list(range(10))
+        assert events[-1]["type"] == "complete"
+        assert publisher.published == 11
+        await relay.close()
+
+    async def test_silent_worker_times_out(self) -> None:
+        """With no worker output, the relay should end with an error event."""
+        fakeredis = pytest.importorskip("fakeredis")
+        relay = StreamRelay(fakeredis.FakeAsyncRedis(), block_ms=10, idle_timeout_s=0)
+
+        events = [event async for event in relay.events("job-2")]
+
+        assert events == [{"type": "error", "message": "Timed out waiting for a worker"}]
+        await relay.close()
+
+    def test_relayed_error_fails_job_and_allows_redispatch(self, monkeypatch) -> None:
+        """A worker's error event should fail the job and release its dispatch claim."""
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        monkeypatch.setattr(settings, "stream_mode", "distributed")
+
+        with TestClient(app) as client:
+            app.state.stream_relay = StreamRelay(
+                fakeredis.FakeAsyncRedis(server=server), block_ms=10
+            )
+            job_id = client.post("/api/generate", json={"text": "hi"}).json()["job_id"]
+            store = app.state.job_store
+            # Already dispatched; the worker then fails
+            client.portal.call(lambda: store.update(job_id, dispatched_at=1.0))
+            publisher = StreamPublisher(fakeredis.FakeRedis(server=server), job_id)
+            publisher.add({"type": "error", "message": "worker crashed"})
+
+            with client.websocket_connect(f"/api/ws/{job_id}") as websocket:
+                assert websocket.receive_json() == {"type": "error", "message": "worker crashed"}
+
+            status = client.get(f"/api/job/{job_id}").json()
+            job = client.portal.call(store.get, job_id)
+
+        assert (status["status"], status["error"]) == ("failed", "worker crashed")
+        assert job["dispatched_at"] is None
+        assert fakeredis.FakeRedis(server=server).exists(publisher.key) == 0
+
+
+class TestAdmissionControl:
+    """Tests for the bounded, deadline-aware admission queue."""
+
+    async def test_full_queue_rejects_with_retry_after(self) -> None:
+        """Past max_queue waiters, a request should be refused up front."""
+        controller = AdmissionController(max_active=1, max_queue=1, max_wait_s=60.0)
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with controller.admit(10):
+                started.set()
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await started.wait()
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert controller.stats()["queue_depth"] == 1
+
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            async with controller.admit(10):
+                pass
+        assert rejected.value.retry_after >= 1
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        stats = controller.stats()
+        assert (stats["admitted"], stats["rejected"], stats["queue_depth"]) == (2, 1, 0)
+
+    async def test_waiter_times_out_at_deadline(self) -> None:
+        """A queued request that never starts should be rejected after max_wait_s."""
+        controller = AdmissionController(
+            max_active=1, max_queue=4, max_wait_s=0.05, seconds_per_stroke=0.001
+        )
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with controller.admit(1):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejectedError):
+            async with controller.admit(1):
+                pass
+        assert controller.timed_out == 1
+        assert controller.stats()["queue_depth"] == 0
+
+        release.set()
+        await holder
+
+    async def test_shortest_job_first_with_aging(self) -> None:
+        """Freed slots go to the cheapest waiter, unless a costlier one has aged enough."""
+        order: list[str] = []
+
+        async def run(controller: AdmissionController, name: str, cost: float) -> None:
+            async with controller.admit(1, cost=cost):
+                order.append(name)
+
+        for half_life, expected in ((60.0, ["short", "long"]), (1e-3, ["long", "short"])):
+            controller = AdmissionController(
+                max_active=1, max_wait_s=60.0, seconds_per_stroke=1e-6, aging_half_life_s=half_life
+            )
+            order.clear()
+            async with controller.admit(1):
+                long = asyncio.create_task(run(controller, "long", 5000.0))
+                await asyncio.sleep(0.05)
+                short = asyncio.create_task(run(controller, "short", 5.0))
+                await asyncio.sleep(0)
+            await asyncio.gather(long, short)
+            assert order == expected
+
+    async def test_expected_wait_rejects_long_backlog(self) -> None:
+        """check() should refuse when the estimated work ahead exceeds the deadline."""
+        controller = AdmissionController(
+            max_active=1, max_queue=8, max_wait_s=1.0, seconds_per_stroke=0.1
+        )
+        controller.check(5000)  # Idle: always admitted
+
+        async with controller.admit(1000):
+            with pytest.raises(AdmissionRejectedError) as rejected:
+                controller.check(1)
+        assert rejected.value.retry_after > 1
+
+        controller.record(num_chars=10, strokes=200, seconds=20.0)
+        assert controller.strokes_per_char > 12.0
+
+
+class TestResultCache:
+    """Tests for the content-addressed result cache."""
+
+    @staticmethod
+    def _result(num_strokes: int) -> CachedResult:
+        strokes = tuple(
+            {"dx": float(i), "dy": 0.0, "p1": 1, "p2": 0, "p3": 0} for i in range(num_strokes)
+        )
+        return CachedResult(strokes, {"type": "complete", "total_strokes": num_strokes})
+
+    def test_key_is_canonical(self) -> None:
+        """Param order should not matter; text, params and seed should."""
+        key = request_key("hi", "neat_cursive", {"a": 1, "b": 2})
+
+        assert key == request_key("hi", "neat_cursive", {"b": 2, "a": 1})
+        assert key != request_key("hi", "neat_cursive", {"a": 1, "b": 3})
+        assert key != request_key("hi", "neat_cursive", {"a": 1, "b": 2}, seed=7)
+
+    def test_lru_bounded_by_bytes_with_disk_spill(self, tmp_path) -> None:
+        """Evicted entries should drop out of memory but come back from the spill tier."""
+        entry_size = len(self._result(200).to_bytes())
+        cache = ResultCache(max_bytes=entry_size * 2, spill=DiskSpill(str(tmp_path)))
+        for key in ("a", "b", "c"):
+            cache.put(key, self._result(200))
+
+        assert cache.stats()["entries"] == 2
+        assert cache.get("a") == self._result(200)
+        assert cache.stats()["spill_hits"] == 1
+        assert cache.get("missing") is None
+
+    async def test_engine_replays_identical_request(self) -> None:
+        """A repeated seeded request should replay the same strokes, flagged as cached."""
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+
+        runs = []
+        for _ in range(2):
+            events = [
+                event
+                async for event in engine.stream_generate(
+                    "cache me twice", params={"slant_angle": 3.0}, pacing="unpaced", seed=99
+                )
+            ]
+            runs.append(events)
+
+        first, second = runs
+        assert [e["data"] for e in first[:-1]] == [e["data"] for e in second[:-1]]
+        assert second[-1]["cached"] is True
+        assert second[-1]["total_strokes"] == first[-1]["total_strokes"]
+        assert second[-1]["lines"] == first[-1]["lines"]
+
+    async def test_retrained_checkpoint_misses(self, monkeypatch) -> None:
+        """Another checkpoint or output-changing setting should not replay cached strokes."""
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+        monkeypatch.setattr(engine, "_use_real_model", True)
+        monkeypatch.setattr(engine, "_checkpoint_fingerprint", "0f1e2d3c4b5a6978")
+
+        def key() -> str:
+            return request_key("hi", "neat_cursive", {}, seed=1, model=engine._model_identity())
+
+        cache = ResultCache(max_bytes=1 << 20)
+        cache.put(key(), self._result(3))
+        assert cache.get(key()) == self._result(3)
+
+        # Retrained in place: same path, new content
+        monkeypatch.setattr(engine, "_checkpoint_fingerprint", "8796a5b4c3d2e1f0")
+        assert cache.get(key()) is None
+
+        monkeypatch.setattr(engine, "_checkpoint_fingerprint", "0f1e2d3c4b5a6978")
+        monkeypatch.setattr(engine, "_config", replace(engine._config, max_strokes_per_char=10))
+        assert cache.get(key()) is None
+
+
+class _FailingBatcher:
+    """Batcher stand-in whose model fails before producing a stroke."""
+
+    async def generate(self, **kwargs):
+        raise RuntimeError("model failed")
+        yield
+
+
+class TestMockFallback:
+    """Tests for the mock fallback of a failing model."""
+
+    async def test_fallback_is_marked_and_not_cached(self, monkeypatch) -> None:
+        """Mock output standing in for a failed model should never be cached as its result."""
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+        monkeypatch.setattr(engine, "_use_real_model", True)
+        monkeypatch.setattr(
+            engine,
+            "_inference_service",
+            SimpleNamespace(
+                stroke_store=None,
+                estimate_strokes=lambda text: None,
+                supports_style=lambda style_id: True,
+            ),
+        )
+        monkeypatch.setattr(engine, "_batcher", _FailingBatcher())
+
+        for _ in range(2):
+            events = [
+                event
+                async for event in engine.stream_generate("fall back", pacing="unpaced", seed=5)
+            ]
+            assert events[-1]["fallback"] == "mock"
+            assert "cached" not in events[-1]
+
+
+class TestUnsupportedStyle:
+    """Tests for styles the serving backend cannot write."""
+
+    async def test_engine_raises_instead_of_mock_output(self, monkeypatch) -> None:
+        """A preset-only backend should refuse custom styles, not serve mock strokes."""
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+        monkeypatch.setattr(engine, "_use_real_model", True)
+        monkeypatch.setattr(
+            engine,
+            "_inference_service",
+            SimpleNamespace(supports_style=lambda style_id: style_id == "neat_cursive"),
+        )
+
+        with pytest.raises(UnsupportedStyleError):
+            [event async for event in engine.stream_generate("hi", style_id="my_style")]
+        with pytest.raises(UnsupportedStyleError):
+            engine.generate_batch(["hi"], style_id="my_style")
+
+    def test_generate_answers_422(self, monkeypatch) -> None:
+        """POST /generate should refuse an unsupported style with a 422."""
+
+        def check_style(style_id: str) -> None:
+            raise UnsupportedStyleError(
+                f"The onnx backend only serves style presets, not {style_id!r}"
+            )
+
+        with TestClient(app) as client:
+            monkeypatch.setattr(app.state.engine, "check_style", check_style)
+            response = client.post("/api/generate", json={"text": "hi", "style_id": "my_style"})
+        assert response.status_code == 422
+        assert "my_style" in response.json()["detail"]
+
+
+class TestSeededGeneration:
+    """Tests for reproducible, per-request seeded generation."""
+
+    async def test_same_seed_same_strokes(self) -> None:
+        """Seeded batches should repeat exactly; another seed should differ."""
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+
+        texts = ["seeded text", "another one"]
+        first = engine.generate_batch(texts, seed=1234)
+
+        assert engine.generate_batch(texts, seed=1234) == first
+        assert engine.generate_batch(texts, seed=1235) != first
+
+    def test_seed_out_of_range_rejected(self) -> None:
+        """Seeds outside the unsigned 32-bit range should fail validation."""
+        with TestClient(app) as client:
+            response = client.post("/api/generate", json={"text": "hi", "seed": 2**32})
+        assert response.status_code == 422
+
+
+class TestStreamPacer:
+    """Tests for per-stroke stream pacing."""
+
+    @pytest.fixture
+    def sleeps(self, monkeypatch) -> list[float]:
+        """Record asyncio.sleep() calls of the pacer instead of sleeping."""
+        recorded: list[float] = []
+
+        async def fake_sleep(delay: float) -> None:
+            recorded.append(delay)
+
+        monkeypatch.setattr(pacing.asyncio, "sleep", fake_sleep)
+        return recorded
+
+    async def test_paced_sleeps_delay_per_stroke(self, sleeps) -> None:
+        """Paced mode should sleep stream_chunk_delay_ms after every stroke."""
+        pacer = StreamPacer.create("paced", settings.stream_chunk_delay_ms)
+        for _ in range(5):
+            await pacer.pace()
+
+        assert sleeps == [pytest.approx(settings.stream_chunk_delay_ms / 1000)] * 5
+
+    async def test_unpaced_never_sleeps(self, sleeps) -> None:
+        """Unpaced mode should only yield to the event loop, never wait."""
+        pacer = StreamPacer.create("unpaced", 20)
+        for _ in range(3 * pacing.UNPACED_YIELD_EVERY):
+            await pacer.pace()
+
+        assert sleeps == [0] * 3
+        assert StreamPacer.create("paced", 0).mode is PacingMode.UNPACED
+
+    async def test_adaptive_catches_up_after_slow_producer(self, sleeps) -> None:
+        """Adaptive mode should sleep only the unused part of the interval, never extra."""
+        pacer = StreamPacer.create("adaptive", 100)
+
+        pacer._clock -= 0.04  # Producer took 40 ms of the 100 ms interval
+        await pacer.pace()
+        assert sleeps[-1] == pytest.approx(0.06, abs=0.01)
+
+        pacer._clock -= 1.0  # A stroke that took a second
+        await pacer.pace()
+        assert len(sleeps) == 1  # Behind schedule: no added delay
+
+        await pacer.pace()  # Back on schedule: a full interval, no burst to make up time
+        assert sleeps[-1] == pytest.approx(0.1, abs=0.01)
+
+    async def test_pace_events_paces_stroke_events_only(self, sleeps) -> None:
+        """pace_events() should pass every event through and pace only strokes."""
+        events = [
+            {"type": "stroke", "index": 0},
+            {"type": "stroke", "index": 1},
+            {"type": "complete"},
+        ]
+
+        async def source():
+            for event in events:
+                yield event
+
+        pacer = StreamPacer.create("paced", 10)
+        assert [event async for event in pace_events(source(), pacer)] == events
+        assert sleeps == [pytest.approx(0.01)] * 2
+
+
+class TestBatchTask:
+    """Tests for the inkforge.generate_batch Celery task."""
+
+    async def test_one_result_per_text_in_order(self, monkeypatch) -> None:
+        """The task should return one compact stroke record per text, in input order."""
+        pytest.importorskip("celery")
+        from app import worker as worker_module
+
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+        monkeypatch.setattr(worker_module, "_worker_engine", engine)
+
+        texts = ["a", "much longer text", "mid"]
+        result = worker_module.generate_handwriting_batch.apply(
+            args=(texts, "neat_cursive", {}), kwargs={"seed": 3}
+        ).get()
+
+        expected = engine.generate_batch(texts, seed=3)
+        assert result["metadata"]["total_texts"] == len(texts)
+        assert [record["dx"] for record in result["results"]] == [
+            [round(dx, 3) for dx, _, _, _, _ in strokes] for strokes in expected
+        ]
+
+
+class TestMetrics:
+    """Tests for the Prometheus metrics registry and GET /metrics."""
+
+    def test_render_text_format(self) -> None:
+        """Histograms should render cumulative buckets, sum and count; counters their value."""
+        registry = Registry()
+        latency = registry.register(
+            Histogram("test_latency_seconds", "Latency.", ["backend"], buckets=(0.1, 1.0))
+        )
+        requests = registry.register(Counter("test_requests_total", "Requests.", ["outcome"]))
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, backend="mock")
+        requests.inc(outcome="completed")
+
+        lines = registry.render().splitlines()
+        assert "# TYPE test_latency_seconds histogram" in lines
+        assert 'test_latency_seconds_bucket{backend="mock",le="0.1"} 1' in lines
+        assert 'test_latency_seconds_bucket{backend="mock",le="1"} 2' in lines
+        assert 'test_latency_seconds_bucket{backend="mock",le="+Inf"} 3' in lines
+        assert 'test_latency_seconds_sum{backend="mock"} 5.55' in lines
+        assert 'test_latency_seconds_count{backend="mock"} 3' in lines
+        assert 'test_requests_total{outcome="completed"} 1' in lines
+
+        with pytest.raises(ValueError):
+            requests.inc(backend="mock")
+
+    async def test_stream_is_counted(self) -> None:
+        """A completed stream should show up in the request, stroke and latency metrics."""
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+
+        async for _ in engine.stream_generate("metrics", pacing="unpaced"):
+            pass
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert 'inkforge_requests_total{backend="mock",outcome="completed"}' in body
+        assert 'inkforge_strokes_total{backend="mock"}' in body
+        assert 'inkforge_time_to_first_stroke_seconds_count{backend="mock"}' in body
+        assert "inkforge_active_requests 0" in body
+
+    async def test_batch_is_counted(self) -> None:
+        """Each text of a batch should count as a completed request with its strokes."""
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+        completed = metrics.REQUESTS._values.get(("mock", "completed"), 0)
+        strokes = metrics.STROKES._values.get(("mock",), 0)
+
+        batch = engine.generate_batch(["one", "two"], seed=3)
+
+        assert metrics.REQUESTS._values[("mock", "completed")] == completed + 2
+        assert metrics.STROKES._values[("mock",)] == strokes + sum(map(len, batch))
+        assert 'inkforge_generation_seconds_count{backend="mock"}' in metrics.REGISTRY.render()
+
+    async def test_collector_follows_engine_lifecycle(self) -> None:
+        """The engine's collector is registered while a model is loaded, and only then."""
+        engine = LLMEngine.get_instance()
+        if not engine.is_ready:
+            await engine.initialize_model(EngineConfig(engine_backend="mock"))
+        assert engine._collect_metrics in metrics.REGISTRY._collectors
+
+        await engine.shutdown()
+        assert engine._collect_metrics not in metrics.REGISTRY._collectors
+
+        await engine.initialize_model(EngineConfig(engine_backend="mock"))
+        assert metrics.REGISTRY._collectors.count(engine._collect_metrics) == 1
+
+
+class TestRequestProfiling:
+    """Tests for opt-in per-request profiling."""
+
+    def test_header_adds_profile_and_trace(self, tmp_path, monkeypatch) -> None:
+        """Only jobs submitted with the profile header get a summary (and trace file)."""
+        monkeypatch.setattr(settings, "profile_requests", "header")
+        monkeypatch.setattr(settings, "profile_trace", True)
+        monkeypatch.setattr(settings, "export_dir", str(tmp_path))
+
+        profiles = []
+        with TestClient(app) as client:
+            for headers in ({}, {"X-Inkforge-Profile": "1"}):
+                response = client.post(
+                    "/api/generate", json={"text": "hi", "pacing": "unpaced"}, headers=headers
+                )
+                job_id = response.json()["job_id"]
+                with client.websocket_connect(f"/api/ws/{job_id}") as websocket:
+                    while (event := websocket.receive_json())["type"] != "complete":
+                        pass
+                profiles.append(event.get("profile"))
+
+        assert profiles[0] is None
+        phases = profiles[1]["phases"]
+        assert {"queue", "pace", "serialize", "send"} <= set(phases)
+        assert phases["serialize"]["count"] == event["total_strokes"]
+
+        trace = json.loads((tmp_path / "profiles" / f"{job_id}.trace.json").read_text())
+        assert {e["name"] for e in trace["traceEvents"] if e["ph"] == "X"} >= set(phases)
+
+    def test_trace_spans_are_capped(self, tmp_path) -> None:
+        """Spans past max_spans are dropped from the trace but still summed."""
+        profile = RequestProfile(trace=True, trace_path=tmp_path / "t.json", max_spans=2)
+        for _ in range(5):
+            profile.add("send", time.perf_counter())
+
+        summary = profile.summary()
+        assert len(profile.spans) == 2
+        assert summary["phases"]["send"]["count"] == 5
+        assert summary["dropped_spans"] == 3
+
+    def test_unknown_mode_falls_back_to_off(self) -> None:
+        """PROFILE_REQUESTS defaults to off and unknown values are not kept."""
+        assert Settings(_env_file=None).profile_requests == "off"
+        assert Settings(profile_requests="sometimes").profile_requests == "off"
+        assert Settings(profile_requests="all").profile_requests == "all"
+
+
+class _CountdownState:
+    """Decode state of _CountdownService: finishes after `remaining` strokes."""
+
+    def __init__(self, remaining: int) -> None:
+        self.remaining = remaining
+        self.finished = remaining == 0
+
+
+class _CountdownService:
+    """Model-free stand-in for InferenceService: stroke i of a text is (i, len(text), 0, 0, 0)."""
+
+    def begin_decode(self, text: str, **kwargs) -> _CountdownState:
+        return _CountdownState(len(text))
+
+    def decode_step(self, states: list[_CountdownState]) -> list[tuple]:
+        strokes = []
+        for state in states:
+            state.remaining -= 1
+            state.finished = state.remaining == 0
+            strokes.append((float(state.remaining), 0.0, 0, 0, int(state.finished)))
+        return strokes
+
+
+def _collect_in_child(batcher: ContinuousBatcher) -> None:
+    """Child-process body: exit 0 when the inherited batcher still decodes."""
+
+    async def collect() -> list:
+        return [stroke async for stroke in batcher.generate("abc")]
+
+    strokes = asyncio.run(asyncio.wait_for(collect(), timeout=5.0))
+    raise SystemExit(0 if [s[0] for s in strokes] == [2.0, 1.0, 0.0] else 1)
+
+
+class TestContinuousBatcher:
+    """Tests for the continuous batcher's decode threads."""
+
+    def test_decodes_after_fork(self) -> None:
+        """A process forked after start() (Celery prefork) should get working decode threads."""
+        batcher = ContinuousBatcher(_CountdownService(), max_batch_size=2, num_workers=2)
+        batcher.start()
+        try:
+            child = multiprocessing.get_context("fork").Process(
+                target=_collect_in_child, args=(batcher,)
+            )
+            child.start()
+            child.join(timeout=10.0)
+            if child.is_alive():
+                child.kill()
+            assert child.exitcode == 0
+        finally:
+            batcher.stop()
+
+
+class _RecordingBatcher:
+    """Batcher stand-in: records decoded texts, one stroke per character, then end-of-sequence."""
+
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+
+    async def generate(self, text: str, **kwargs):
+        self.texts.append(text)
+        for i in range(len(text)):
+            yield (1.0, 0.0, 0, 0, int(i == len(text) - 1))
+
+
+class _OneWordStore:
+    """Stroke store stand-in holding the word "stored" only."""
+
+    def lookup(self, word: str, style_id: str, temperature: float, variant=None):
+        return [(2.0, 0.0, 0, 0, 1)] if word == "stored" else None
+
+
+class TestStoredWordSource:
+    """Tests for serving stored words next to decoded text."""
+
+    async def _strokes(self, text: str, word_gap: float | None) -> tuple[list, list[str]]:
+        batcher = _RecordingBatcher()
+        service = SimpleNamespace(stroke_store=_OneWordStore(), word_gap=lambda: word_gap)
+        engine = SimpleNamespace(
+            _inference_service=service,
+            _batcher=batcher,
+            _config=EngineConfig(),
+            _word_stroke=LLMEngine._word_stroke,
+        )
+        strokes = [
+            s async for s in LLMEngine._real_stroke_source(engine, text, "neat_cursive", 0.4)
+        ]
+        return strokes, batcher.texts
+
+    async def test_misses_decode_as_one_sequence(self) -> None:
+        """Consecutive misses should be one model sequence, spaces written by the model."""
+        strokes, texts = await self._strokes("a few words stored then more", 12.5)
+
+        assert texts == ["a few words", "then more"]
+        gaps = [s for s in strokes if s == (12.5, 0.0, 0, 1, 0)]
+        assert len(gaps) == 2  # Either side of "stored"
+        assert [s[4] for s in strokes].count(1) == 1  # Only the final end-of-sequence
+        assert strokes[-1][4] == 1
+
+    async def test_gap_falls_back_without_stroke_stats(self) -> None:
+        """Without training statistics the default space width is used."""
+        strokes, texts = await self._strokes("stored word", None)
+
+        assert texts == ["word"]
+        assert strokes[1] == (10.0, 0.0, 0, 1, 0)
@@ -5,7 +5,58 @@ Tests for the ML inference pipeline: model loading, tokenization,
 stroke generation, and MDN sampling.
 """
 
-from app.ml.model import HandwritingLSTM, StyleEncoder
+import asyncio
+from pathlib import Path
+
+import pytest
+import torch
+
+from app.ml.artifacts import ArtifactExportError, checkpoint_fingerprint
+from app.ml.batching import ContinuousBatcher
+from app.ml.decode_export import export_decode_step
+from app.ml.model import HandwritingAttentionLSTM, HandwritingLSTM, StyleEncoder
+from app.ml.profiling import RequestProfile
+from app.ml.quantization import fuse_gate_layers, quantize_int8
+from app.ml.seeding import derive_seed
+from app.ml.stroke_budget import MIN_CAP, MIN_OBSERVATIONS, StrokeBudget, compute_stroke_stats
+from app.ml.utils import compute_mdn_loss
+from app.services.document_pool import DocumentWorkerPool
+from app.services.inference import DocumentGenerator, InferenceService
+from app.services.stroke_cache import StrokeCache
+from app.services.stroke_store import StrokeStore, StrokeStoreWriter
+
+
+def _tiny_service() -> InferenceService:
+    """InferenceService with a small randomly initialized model (no checkpoint)."""
+    service = InferenceService()
+    service.model = HandwritingLSTM(
+        vocab_size=service.vocab_size,
+        char_embed_dim=16,
+        hidden_dim=32,
+        num_layers=2,
+        dropout=0.0,
+        num_mixtures=3,
+    ).eval()
+    service.is_loaded = True
+    return service
+
+
+def _save_checkpoint(service: InferenceService, path) -> None:
+    """Save the tiny model like train.py checkpoints that predate stored style tables."""
+    torch.save(
+        {
+            "model_state_dict": service.model.state_dict(),
+            "model_config": {
+                "char_embed_dim": 16,
+                "hidden_dim": 32,
+                "num_layers": 2,
+                "num_mixtures": 3,
+            },
+            "stroke_mean": service.stroke_mean,
+            "stroke_std": service.stroke_std,
+        },
+        path,
+    )
 
 
 class TestHandwritingLSTM:
@@ -28,6 +79,205 @@ class TestHandwritingLSTM:
         # TODO: Implement when forward pass is ready
         pass
 
+    def test_step_matches_forward(self) -> None:
+        """Fused single-step decode should match a length-1 forward pass."""
+        model = HandwritingLSTM(vocab_size=80, hidden_dim=64, num_layers=3, dropout=0.0).eval()
+        chars = torch.tensor([5, 17])
+        prev_stroke = torch.randn(2, 5)
+        style_z = torch.randn(2, 128)
+        hidden = (torch.randn(3, 2, 64), torch.randn(3, 2, 64))
+
+        with torch.no_grad():
+            mdn_ref, pen_ref, (h_ref, c_ref) = model(
+                chars.unsqueeze(1), prev_stroke.unsqueeze(1), style_z, hidden
+            )
+            char_proj = model.char_projection_table()[chars]
+            mdn, pen, (h, c) = model.step(
+                char_proj, model.style_projection(style_z), prev_stroke, hidden
+            )
+
+        assert torch.allclose(mdn, mdn_ref[:, 0], atol=1e-5)
+        assert torch.allclose(pen, pen_ref[:, 0], atol=1e-5)
+        assert torch.allclose(h, h_ref, atol=1e-5)
+        assert torch.allclose(c, c_ref, atol=1e-5)
+
+
+class TestHandwritingAttentionLSTM:
+    """Tests for the soft-window attention variant."""
+
+    def _model(self) -> HandwritingAttentionLSTM:
+        return HandwritingAttentionLSTM(
+            vocab_size=80,
+            char_embed_dim=16,
+            hidden_dim=32,
+            num_layers=2,
+            dropout=0.0,
+            num_mixtures=3,
+            window_mixtures=4,
+        ).eval()
+
+    def test_forward_shapes_and_masked_loss(self) -> None:
+        """Forward takes unaligned text; padded steps must not change the loss."""
+        model = self._model()
+        chars = torch.tensor([[5, 6, 7, 0], [8, 9, 0, 0]])
+        char_mask = torch.tensor([[1, 1, 1, 0], [1, 1, 0, 0]], dtype=torch.bool)
+        strokes = torch.randn(2, 12, 5)
+
+        with torch.no_grad():
+            mdn, pen, _ = model(chars, strokes, torch.randn(2, 128), char_mask=char_mask)
+
+        assert mdn.shape == (2, 12, 3 * 6)
+        assert pen.shape == (2, 12, 3)
+
+        mask = torch.ones(2, 12, dtype=torch.bool)
+        mask[:, 8:] = False
+        targets = torch.randn(2, 12, 2)
+        pen_targets = torch.randint(0, 3, (2, 12))
+        masked = compute_mdn_loss(mdn, pen, targets, pen_targets, num_mixtures=3, mask=mask)
+        truncated = compute_mdn_loss(
+            mdn[:, :8], pen[:, :8], targets[:, :8], pen_targets[:, :8], num_mixtures=3
+        )
+        assert torch.allclose(masked, truncated, atol=1e-5)
+
+    def test_decode_terminates_within_step_limit(self) -> None:
+        """Attention decode batches texts of different lengths and always ends."""
+        service = InferenceService()
+        service.model = self._model()
+        service.is_loaded = True
+
+        results = service.generate_batch(["hello world", "ink"], max_strokes=5, seed=3)
+
+        assert len(results[0]) <= 5 * len("hello world")
+        assert len(results[1]) <= 5 * len("ink")
+        assert results == service.generate_batch(["hello world", "ink"], max_strokes=5, seed=3)
+
+
+class TestInt8Quantization:
+    """Tests for dynamic int8 serving copies."""
+
+    def test_fused_gate_layers_match_step(self) -> None:
+        """The fused [x ‖ h] gate GEMM must equal the two-matmul step in fp32."""
+        model = HandwritingLSTM(vocab_size=80, hidden_dim=32, num_layers=2, dropout=0.0).eval()
+        char_proj = model.char_projection_table()[torch.tensor([3, 9])]
+        style_proj = model.style_projection(torch.randn(2, 128))
+        prev_stroke = torch.randn(2, 5)
+        hidden = (torch.randn(2, 2, 32), torch.randn(2, 2, 32))
+
+        with torch.no_grad():
+            mdn_ref, _, (h_ref, _) = model.step(char_proj, style_proj, prev_stroke, hidden)
+            model.gate_layers = fuse_gate_layers(model)
+            mdn, _, (h, _) = model.step(char_proj, style_proj, prev_stroke, hidden)
+
+        assert torch.allclose(mdn, mdn_ref, atol=1e-5)
+        assert torch.allclose(h, h_ref, atol=1e-5)
+
+    def test_quantized_model_decodes(self) -> None:
+        """Both architectures keep their decode API after quantization."""
+        service = _tiny_service()
+        service.model = quantize_int8(service.model)
+        assert len(service.generate("ink", max_strokes=3)) <= 9
+
+        attention = HandwritingAttentionLSTM(
+            vocab_size=80, char_embed_dim=16, hidden_dim=32, num_layers=2, num_mixtures=3
+        ).eval()
+        service.model = quantize_int8(attention)
+        assert len(service.generate("ink", max_strokes=3)) <= 9
+
+    def test_parity_threshold_decides_serving(self) -> None:
+        """quantize_int8() swaps the model only when the NLL delta is acceptable."""
+        service = _tiny_service()
+        fp32_model = service.model
+
+        report = service.quantize_int8(max_nll_delta=float("-inf"))
+        assert service.model is fp32_model
+        assert service.quantization == "fp32"
+
+        service.quantize_int8(max_nll_delta=abs(report.delta) + 1.0)
+        assert service.model is not fp32_model
+        assert service.quantization == "int8"
+
+
+class TestCompiledDecodeStep:
+    """Tests for the exported TorchScript decode step."""
+
+    def test_export_round_trip_matches_eager(self, tmp_path) -> None:
+        """A service loaded from the artifact reproduces seeded eager generation."""
+        eager = _tiny_service()
+        path = tmp_path / "tiny.decode.pts"
+        error = export_decode_step(
+            eager.model,
+            path,
+            style_embeddings=eager.style_embeddings,
+            stroke_mean=eager.stroke_mean,
+            stroke_std=eager.stroke_std,
+            metadata={"model_config": {}},
+        )
+        assert error <= 1e-4
+
+        compiled = InferenceService(checkpoint_path=str(path))
+        compiled.load_model()
+        assert compiled.compiled_step is not None
+
+        expected = eager.generate_batch(["ink", "forge"], max_strokes=4, seed=11)
+        actual = compiled.generate_batch(["ink", "forge"], max_strokes=4, seed=11)
+        for strokes, reference in zip(actual, expected, strict=True):
+            assert [s[2:] for s in strokes] == [s[2:] for s in reference]
+            assert torch.allclose(torch.tensor(strokes), torch.tensor(reference), atol=1e-4)
+
+
+class TestOnnxDecodeStep:
+    """Tests for the ONNX Runtime backend."""
+
+    def test_onnx_service_matches_eager(self, tmp_path) -> None:
+        """The onnx backend reproduces seeded eager generation from an exported graph."""
+        pytest.importorskip("onnxruntime")
+        from app.ml.onnx_export import export_onnx_decode_step
+        from app.services.onnx_inference import OnnxInferenceService
+
+        eager = _tiny_service()
+        path = tmp_path / "tiny.decode.onnx"
+        error = export_onnx_decode_step(
+            eager.model,
+            path,
+            style_embeddings=eager.style_embeddings,
+            stroke_mean=eager.stroke_mean,
+            stroke_std=eager.stroke_std,
+            metadata={"model_config": {}},
+        )
+        assert error <= 1e-4
+
+        onnx = OnnxInferenceService(checkpoint_path=str(path), num_threads=1)
+        onnx.load_model()
+        assert onnx.model is None
+
+        expected = eager.generate_batch(["ink", "forge"], max_strokes=4, seed=11)
+        actual = onnx.generate_batch(["ink", "forge"], max_strokes=4, seed=11)
+        for strokes, reference in zip(actual, expected, strict=True):
+            assert [s[2:] for s in strokes] == [s[2:] for s in reference]
+            assert torch.allclose(torch.tensor(strokes), torch.tensor(reference), atol=1e-4)
+
+        with pytest.raises(ValueError):
+            onnx.begin_decode("ink", style_embedding=torch.zeros(128))
+
+    def test_unservable_checkpoints_fail_loudly(self, tmp_path) -> None:
+        """Compiled artifacts are refused, and exports go to the configured cache dir."""
+        pytest.importorskip("onnxruntime")
+        from app.ml.onnx_export import onnx_artifact_path
+        from app.services.onnx_inference import OnnxInferenceService
+
+        compiled = tmp_path / "tiny.decode.pts"
+        compiled.touch()
+        with pytest.raises(ArtifactExportError):
+            OnnxInferenceService(checkpoint_path=str(compiled)).load_model()
+
+        cache = tmp_path / "cache"
+        assert onnx_artifact_path("/ro/tiny.pt", cache) == cache / "tiny.decode.onnx"
+        assert onnx_artifact_path("/ro/tiny.pt") == Path("/ro/tiny.decode.onnx")
+
+        service = OnnxInferenceService()
+        assert service.supports_style("neat_cursive")
+        assert not service.supports_style("my_style")
+
 
 class TestStyleEncoder:
     """Tests for the CNN style encoder."""
@@ -55,3 +305,283 @@ class TestMDNSampling:
         """Higher temperature should produce more variance."""
         # TODO: Implement
         pass
+
+    def test_sample_batch_shape_and_pen_one_hot(self) -> None:
+        """sample_batch should return [B, 5] with exactly one pen state set per row."""
+        model = HandwritingLSTM(vocab_size=80, num_mixtures=4)
+        mdn_params = torch.randn(6, 4 * 6)
+        pen_logits = torch.randn(6, 3)
+        temperature = torch.full((6,), 0.5)
+
+        strokes = model.sample_batch(mdn_params, pen_logits, temperature)
+
+        assert strokes.shape == (6, 5)
+        assert torch.all(strokes[:, 2:].sum(dim=1) == 1)
+
+
+class TestBatchedDecode:
+    """Tests for step-wise batched decoding."""
+
+    def test_decode_step_returns_one_stroke_per_state(self) -> None:
+        """A [B, 1] step should advance every state by exactly one stroke."""
+        service = _tiny_service()
+        states = [
+            service.begin_decode("hi", temperature=0.4, max_strokes=5),
+            service.begin_decode("there", style_id="rushed_notes", temperature=1.0, max_strokes=5),
+        ]
+        strokes = service.decode_step(states)
+        assert len(strokes) == 2
+        assert all(len(stroke) == 5 for stroke in strokes)
+        assert all(state.hidden[0].shape == (2, 1, 32) for state in states)
+
+    def test_preset_style_projection_is_memoized(self) -> None:
+        """Preset requests should reuse one W_style·z instead of recomputing it."""
+        service = _tiny_service()
+        first = service.begin_decode("a", style_id="casual_print")
+        second = service.begin_decode("b", style_id="casual_print")
+        assert first.style_proj is second.style_proj
+
+    def test_generate_respects_per_character_cap(self) -> None:
+        """generate() should never exceed max_strokes per character."""
+        service = _tiny_service()
+        strokes = service.generate("abc", max_strokes=4)
+        assert 1 <= len(strokes) <= 3 * 4
+
+    def test_generate_batch_refills_slots(self) -> None:
+        """generate_batch() should return one sequence per text, in order, beyond one batch."""
+        service = _tiny_service()
+        texts = ["a", "bc", "", "def", "g"]
+        results = service.generate_batch(texts, max_strokes=3, max_batch_size=2)
+        assert len(results) == len(texts)
+        assert results[2] == []
+        for text, strokes in zip(texts[:2], results[:2], strict=True):
+            assert 1 <= len(strokes) <= 3 * len(text)
+
+    def test_stroke_budget_caps_characters(self) -> None:
+        """Characters should be cut off at their budget cap and counted."""
+        service = _tiny_service()
+        stats = compute_stroke_stats([{"text": "ab", "strokes": [0] * 4}] * MIN_OBSERVATIONS)
+        service.set_stroke_budget(StrokeBudget.from_stats(stats, multiplier=1.0))
+
+        state = service.begin_decode("ab", max_strokes=2000, seed=0)
+        assert state.char_caps == [MIN_CAP, MIN_CAP]
+
+        strokes = []
+        while not state.finished:
+            strokes.append(service.decode_step([state])[0])
+        assert len(strokes) <= 2 * MIN_CAP
+        assert service.budget_exceeded == state.budget_exceeded
+
+    def test_stroke_estimate_uses_per_character_medians(self) -> None:
+        """estimate_strokes() should sum per-character medians, with the global one as fallback."""
+        service = _tiny_service()
+        assert service.estimate_strokes("ab") is None
+
+        samples = [{"text": "aa", "strokes": [0] * 20}] * MIN_OBSERVATIONS
+        samples += [{"text": "b", "strokes": [0] * 2}]
+        service.load_stroke_stats(compute_stroke_stats(samples))
+        assert service.estimate_strokes("aa") == pytest.approx(20.0)
+        assert service.estimate_strokes("ab") == pytest.approx(10.0 + 10.0)  # "b": too few samples
+
+    def test_word_gap_from_stroke_stats(self) -> None:
+        """word_gap() should be the median strokes of a space times the mean stroke dx."""
+        service = _tiny_service()
+        assert service.word_gap() is None
+
+        service.load_stroke_stats(compute_stroke_stats([{"text": "a b", "strokes": [0] * 9}] * 20))
+        service.stroke_mean = torch.tensor([1.5, 0.0])
+        assert service.word_gap() == pytest.approx(3.0 * 1.5)
+
+    def test_seeded_batch_matches_serial_generation(self) -> None:
+        """A seeded batch should reproduce per-text serial generation exactly."""
+        service = _tiny_service()
+        texts = ["ab", "cde", "f"]
+        batched = service.generate_batch(texts, max_strokes=3, max_batch_size=2, seed=42)
+        serial = [
+            service.generate(text, max_strokes=3, seed=derive_seed(42, i))
+            for i, text in enumerate(texts)
+        ]
+        assert batched == serial
+
+    def test_seeded_strokes_survive_reloads(self, tmp_path) -> None:
+        """Two processes loading one checkpoint should write the same seeded strokes."""
+        checkpoint = tmp_path / "tiny.pt"
+        _save_checkpoint(_tiny_service(), checkpoint)
+
+        loads = []
+        for _ in range(2):
+            service = InferenceService(checkpoint_path=str(checkpoint))
+            service.load_model()
+            loads.append(service.generate_batch(["ink", "forge"], max_strokes=4, seed=3))
+        assert loads[0] == loads[1]
+
+    def test_worker_pool_matches_serial_generation(self) -> None:
+        """Seeded streams decoded by a multi-worker pool match serial generation."""
+        service = _tiny_service()
+        texts = ["ab", "cde", "f", "gh"]
+        batcher = ContinuousBatcher(service, max_batch_size=2, num_workers=2, threads_per_worker=1)
+        batcher.start()
+
+        async def collect(text: str, seed: int) -> list:
+            return [s async for s in batcher.generate(text, max_strokes=3, seed=seed)]
+
+        async def run_all() -> list:
+            return await asyncio.gather(*(collect(text, i) for i, text in enumerate(texts)))
+
+        try:
+            pooled = asyncio.run(run_all())
+        finally:
+            batcher.stop()
+        assert pooled == [
+            service.generate(text, max_strokes=3, seed=i) for i, text in enumerate(texts)
+        ]
+
+    def test_profiled_stream_times_decode_phases(self) -> None:
+        """A profiled stream is charged every batched step; an unprofiled one is untouched."""
+        service = _tiny_service()
+        batcher = ContinuousBatcher(service, max_batch_size=2)
+        batcher.start()
+        profile = RequestProfile()
+
+        async def run_both() -> list:
+            async def collect(text: str, profile: RequestProfile | None) -> list:
+                return [s async for s in batcher.generate(text, max_strokes=3, profile=profile)]
+
+            return await asyncio.gather(collect("ab", profile), collect("cd", None))
+
+        try:
+            profiled, _ = asyncio.run(run_both())
+        finally:
+            batcher.stop()
+
+        phases = profile.summary()["phases"]
+        assert phases["prepare"]["count"] == 1
+        for phase in ("gather", "model_step", "sample", "finish"):
+            assert phases[phase]["count"] == len(profiled)
+
+    def test_seeded_document_is_reproducible(self) -> None:
+        """The same document seed should give identical layout and strokes."""
+        service = _tiny_service()
+        generator = DocumentGenerator(service, stroke_cache=StrokeCache(variants=1))
+        first = generator.generate_document("seeded words repeat", seed=7)
+        second = generator.generate_document("seeded words repeat", seed=7)
+        assert first == second
+
+    def test_document_layout_then_batched_generation(self) -> None:
+        """Every laid-out word should get strokes, and generated words fill the cache."""
+        service = _tiny_service()
+        cache = StrokeCache(variants=1)
+        generator = DocumentGenerator(service, stroke_cache=cache)
+        document = generator.generate_document("the cat and the dog", fatigue=0.0)
+
+        assert [entry["word"] for entry in document] == ["the", "cat", "and", "the", "dog"]
+        assert all(entry["strokes"] for entry in document)
+        assert set(document[0]) == {"word", "strokes", "position", "line_number"}
+        assert cache.stats()["entries"] == 4
+
+
+class TestDocumentWorkerPool:
+    """Tests for parallel document generation across worker processes."""
+
+    def test_seeded_pool_matches_serial(self, tmp_path) -> None:
+        """A seeded document should be identical with and without the worker pool."""
+        checkpoint = tmp_path / "tiny.pt"
+        _save_checkpoint(_tiny_service(), checkpoint)
+        service = InferenceService(checkpoint_path=str(checkpoint))
+        service.load_model()
+
+        text = "the pool writes the same words as the serial path"
+        serial = DocumentGenerator(service, max_strokes=4).generate_document(text, seed=5)
+        with DocumentWorkerPool(
+            str(checkpoint),
+            workers=2,
+            batch_size=3,
+            style_embeddings=service.style_embeddings,
+            stroke_budget_multiplier=service.stroke_budget_multiplier,
+            quantization=service.quantization,
+        ) as pool:
+            generator = DocumentGenerator(service, worker_pool=pool, max_strokes=4)
+            pooled = generator.generate_document(text, seed=5)
+
+        assert pooled == serial
+
+
+class TestStrokeCache:
+    """Tests for the word-level stroke cache."""
+
+    def test_repeated_word_hits_cache(self) -> None:
+        """Each variation slot should call the generator only once."""
+        cache = StrokeCache(variants=2)
+        calls = []
+
+        def _generate() -> list[tuple[float, float, int, int, int]]:
+            calls.append(1)
+            return [(1.0, 0.5, 1, 0, 0), (0.0, 0.0, 0, 1, 0)]
+
+        for i in range(10):
+            strokes = cache.get_or_generate("the", "preset:neat_cursive", 0.4, _generate, slot=i)
+            assert len(strokes) == 2
+
+        assert len(calls) == 2
+        assert cache.stats()["hits"] == 8
+
+    def test_memory_budget_evicts_oldest_word(self) -> None:
+        """Entries beyond the memory budget should be evicted LRU-first."""
+        cache = StrokeCache(max_bytes=128 * 4, variants=1)
+        stroke = [(0.0, 0.0, 1, 0, 0)] * 2
+        for word in ("and", "of", "the"):
+            cache.get_or_generate(word, "preset:neat_cursive", 0.4, lambda: stroke)
+
+        assert cache.stats()["entries"] == 2
+        assert cache.stats()["evictions"] == 1
+
+
+class TestStrokeStore:
+    """Tests for the persistent memory-mapped word stroke store."""
+
+    def test_round_trip_through_disk(self, tmp_path) -> None:
+        """Strokes written by the builder should read back with pen states intact."""
+        writer = StrokeStoreWriter(tmp_path, "neat_cursive", temperature=0.4)
+        writer.add("the", [(1.5, -2.0, 1, 0, 0), (3.0, 0.5, 0, 1, 0), (0.0, 0.0, 0, 0, 1)])
+        writer.close()
+
+        store = StrokeStore(tmp_path)
+        strokes = store.lookup("the", "neat_cursive", temperature=0.4)
+
+        assert strokes == [(1.5, -2.0, 1, 0, 0), (3.0, 0.5, 0, 1, 0), (0.0, 0.0, 0, 0, 1)]
+
+    def test_miss_on_unknown_word_or_temperature(self, tmp_path) -> None:
+        """Unknown words and far-off temperatures should fall through to the model."""
+        writer = StrokeStoreWriter(tmp_path, "neat_cursive", temperature=0.4)
+        writer.add("and", [(1.0, 1.0, 1, 0, 0)])
+        writer.close()
+
+        store = StrokeStore(tmp_path)
+
+        assert store.lookup("of", "neat_cursive") is None
+        assert store.lookup("and", "neat_cursive", temperature=0.9) is None
+        assert store.lookup("and", "casual_print") is None
+
+    def test_store_of_another_model_is_refused(self, tmp_path) -> None:
+        """A store built for another checkpoint or style table should not be served."""
+        writer = StrokeStoreWriter(
+            tmp_path, "neat_cursive", temperature=0.4, checkpoint="aaaa", style_table="bbbb"
+        )
+        writer.add("and", [(1.0, 1.0, 1, 0, 0)])
+        writer.close()
+
+        assert StrokeStore(tmp_path, checkpoint="aaaa", style_table="bbbb").num_words == 1
+        with pytest.raises(ValueError):
+            StrokeStore(tmp_path, checkpoint="cccc", style_table="bbbb")
+        with pytest.raises(ValueError):
+            StrokeStore(tmp_path, checkpoint="aaaa", style_table="dddd")
+
+    def test_checkpoint_fingerprint_follows_content(self, tmp_path) -> None:
+        """Rewriting a checkpoint in place should change its fingerprint."""
+        checkpoint = tmp_path / "tiny.pt"
+        _save_checkpoint(_tiny_service(), checkpoint)
+        first = checkpoint_fingerprint(checkpoint)
+        assert checkpoint_fingerprint(checkpoint) == first
+
+        _save_checkpoint(_tiny_service(), checkpoint)
+        assert checkpoint_fingerprint(checkpoint) != first
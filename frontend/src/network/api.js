@@ -8,12 +8,14 @@
  * Rule #2: Never hold a connection the user has abandoned.
  */
 
+import { STROKE_SUBPROTOCOL, decodeStrokeFrame } from "./strokeCodec";
+
 const API_BASE = "/api";
 
 /**
  * Submit a handwriting generation job.
  *
- * @param {object} payload — { text, style_id, params, paper_texture, ink_color, font_size }
+ * @param {object} payload — { text, style_id, params, paper_texture, ink_color, font_size, framing? }
  * @param {AbortSignal} signal — caller-owned AbortSignal for cancellation
  * @returns {Promise<{ job_id: string, ws_url: string }>}
  */
@@ -44,21 +46,47 @@ export async function submitJob(payload, signal) {
  * @param {(data: {dx:number, dy:number, p1:number, p2:number, p3:number}) => void} callbacks.onStroke
  * @param {(totalStrokes: number) => void} callbacks.onComplete
  * @param {(error: string) => void} callbacks.onError
+ * @param {boolean} [callbacks.binary] — request packed binary frames (inkforge.strokes.v1)
  * @returns {{ close: () => void }}
  */
-export function connectStream(wsPath, { onStroke, onComplete, onError } = {}) {
+export function connectStream(wsPath, { onStroke, onComplete, onError, binary = false } = {}) {
     // Build absolute WS URL from current host (Vite proxy handles routing)
     const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
     const wsUrl = `${protocol}//${window.location.host}${wsPath}`;
 
-    const ws = new WebSocket(wsUrl);
+    const ws = binary ? new WebSocket(wsUrl, STROKE_SUBPROTOCOL) : new WebSocket(wsUrl);
+    ws.binaryType = "arraybuffer";
+
+    const emitColumns = ({ dx, dy, pen }) => {
+        // pen: 0 = down, 1 = up, 2 = end
+        for (let i = 0; i < dx.length; i++) {
+            onStroke?.({
+                dx: dx[i],
+                dy: dy[i],
+                p1: pen[i] === 0 ? 1 : 0,
+                p2: pen[i] === 1 ? 1 : 0,
+                p3: pen[i] === 2 ? 1 : 0,
+            });
+        }
+    };
 
     ws.onmessage = (event) => {
+        if (event.data instanceof ArrayBuffer) {
+            try {
+                emitColumns(decodeStrokeFrame(event.data));
+            } catch (err) {
+                console.warn("[inkforge] undecodable binary frame:", err);
+            }
+            return;
+        }
+
         try {
             const msg = JSON.parse(event.data);
 
             if (msg.type === "stroke" && msg.data) {
                 onStroke?.(msg.data);
+            } else if (msg.type === "frame" && msg.data) {
+                emitColumns(msg.data);
             } else if (msg.type === "complete") {
                 onComplete?.(msg.total_strokes ?? 0);
             } else if (msg.type === "error") {
@@ -0,0 +1,64 @@
+/**
+ * INKFORGE — Binary Stroke Codec (client side)
+ *
+ * Decodes packed stroke frames sent over the "inkforge.strokes.v1"
+ * WebSocket subprotocol. Layout mirrors backend/app/services/stroke_codec.py:
+ *
+ *   u8 kind | u32 index | u16 count | u16 numChars        (little-endian)
+ *   f16 dx[count] | f16 dy[count]
+ *   u8 pen[ceil(count/4)]   — 2 bits per stroke, LSB first; 0=down 1=up 2=end
+ *   numChars × (u16 offset, u32 codepoint)
+ */
+
+export const STROKE_SUBPROTOCOL = "inkforge.strokes.v1";
+
+const FRAME_KIND_STROKES = 1;
+const HEADER_BYTES = 9;
+
+/** Convert an IEEE 754 half-precision value to a JS number. */
+function halfToFloat(h) {
+    const sign = h & 0x8000 ? -1 : 1;
+    const exp = (h >> 10) & 0x1f;
+    const frac = h & 0x3ff;
+    if (exp === 0) return sign * 2 ** -14 * (frac / 1024);
+    if (exp === 0x1f) return frac ? NaN : sign * Infinity;
+    return sign * 2 ** (exp - 15) * (1 + frac / 1024);
+}
+
+/**
+ * Decode one binary frame.
+ *
+ * @param {ArrayBuffer} buffer
+ * @returns {{ index: number, dx: number[], dy: number[], pen: number[], chars: [number, string][] }}
+ */
+export function decodeStrokeFrame(buffer) {
+    const view = new DataView(buffer);
+    if (view.getUint8(0) !== FRAME_KIND_STROKES) {
+        throw new Error(`Unknown frame kind: ${view.getUint8(0)}`);
+    }
+
+    const index = view.getUint32(1, true);
+    const count = view.getUint16(5, true);
+    const numChars = view.getUint16(7, true);
+
+    let offset = HEADER_BYTES;
+    const dx = new Array(count);
+    const dy = new Array(count);
+    for (let i = 0; i < count; i++) dx[i] = halfToFloat(view.getUint16(offset + 2 * i, true));
+    offset += 2 * count;
+    for (let i = 0; i < count; i++) dy[i] = halfToFloat(view.getUint16(offset + 2 * i, true));
+    offset += 2 * count;
+
+    const pen = new Array(count);
+    for (let i = 0; i < count; i++) {
+        pen[i] = (view.getUint8(offset + (i >> 2)) >> ((i & 3) * 2)) & 0b11;
+    }
+    offset += Math.ceil(count / 4);
+
+    const chars = [];
+    for (let i = 0; i < numChars; i++, offset += 6) {
+        chars.push([view.getUint16(offset, true), String.fromCodePoint(view.getUint32(offset + 2, true))]);
+    }
+
+    return { index, dx, dy, pen, chars };
+}
@@ -0,0 +1,130 @@
+"""
+INKFORGE — Stroke Store Builder
+
+Pre-generates stroke sequences for frequent words and writes them to a
+memory-mappable stroke store (one shard per style preset). API and worker
+processes load it at startup via STROKE_STORE_DIR.
+
+Usage:
+    python scripts/build_stroke_store.py --checkpoint checkpoints/lstm_mdn_v1_best.pt \
+        --output stroke_store/ --variants 4
+    python scripts/build_stroke_store.py --checkpoint ... --words my_words.txt --styles neat_cursive
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Make the backend package importable when run from the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.ml.artifacts import checkpoint_fingerprint  # noqa: E402
+from app.services.inference import STYLE_PRESETS, InferenceService  # noqa: E402
+from app.services.stroke_store import StrokeStoreWriter  # noqa: E402
+
+# Most frequent English words — the default vocabulary
+COMMON_WORDS = (
+    "the of and to a in is you that it he was for on are as with his they I at be this "
+    "have from or one had by word but not what all were we when your can said there use "
+    "an each which she do how their if will up other about out many then them these so "
+    "some her would make like him into time has look two more write go see number no way "
+    "could people my than first water been call who oil its now find long down day did get "
+    "come made may part The I'm Dear Thank thank Please please regards Sincerely"
+).split()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build a pre-generated word stroke store.")
+    parser.add_argument("--checkpoint", type=str, required=True, help="Model checkpoint (.pt).")
+    parser.add_argument("--output", type=str, default="stroke_store/", help="Store directory.")
+    parser.add_argument(
+        "--words",
+        type=str,
+        default=None,
+        help="Optional word list file (one word per line). Defaults to built-in common words.",
+    )
+    parser.add_argument(
+        "--styles",
+        type=str,
+        nargs="+",
+        default=list(STYLE_PRESETS),
+        help="Style presets to generate.",
+    )
+    parser.add_argument("--variants", type=int, default=4, help="Variants per word.")
+    parser.add_argument("--temperature", type=float, default=0.4, help="Sampling temperature.")
+    parser.add_argument("--max-strokes", type=int, default=50, help="Max strokes per character.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Sequences decoded together.")
+    parser.add_argument("--device", type=str, default="cpu", help="cpu | cuda")
+    return parser.parse_args()
+
+
+def load_words(path: str | None) -> list[str]:
+    """Load the vocabulary to pre-generate (deduplicated, order preserved)."""
+    if path is None:
+        words = COMMON_WORDS
+    else:
+        with open(path, encoding="utf-8") as f:
+            words = [line.strip() for line in f]
+    return list(dict.fromkeys(w for w in words if w and " " not in w))
+
+
+def main() -> None:
+    args = parse_args()
+
+    print("=" * 60)
+    print("INKFORGE — Stroke Store Builder")
+    print("=" * 60)
+
+    service = InferenceService(checkpoint_path=args.checkpoint, device=args.device)
+    service.load_model()
+    # Recorded in index.json: the engine only serves the store for this model and presets
+    fingerprint = checkpoint_fingerprint(args.checkpoint)
+    style_table = service.style_table_fingerprint()
+
+    words = load_words(args.words)
+    jobs = [word for word in words for _ in range(args.variants)]
+
+    print(f"Checkpoint: {args.checkpoint} ({fingerprint})")
+    print(f"Output:     {args.output}")
+    print(f"Words:      {len(words)} × {args.variants} variants")
+    print(f"Styles:     {', '.join(args.styles)}")
+    print()
+
+    for style_id in args.styles:
+        if style_id not in STYLE_PRESETS:
+            print(f"Skipping unknown style: {style_id}")
+            continue
+
+        writer = StrokeStoreWriter(
+            args.output,
+            style_id,
+            temperature=args.temperature,
+            checkpoint=fingerprint,
+            style_table=style_table,
+        )
+        total_strokes = 0
+
+        for start in range(0, len(jobs), args.batch_size):
+            batch = jobs[start : start + args.batch_size]
+            results = service.generate_batch(
+                batch,
+                style_id=style_id,
+                temperature=args.temperature,
+                max_strokes=args.max_strokes,
+                max_batch_size=args.batch_size,
+            )
+            for word, strokes in zip(batch, results, strict=True):
+                writer.add(word, strokes)
+                total_strokes += len(strokes)
+
+        writer.close()
+        print(f"  {style_id}: {total_strokes} strokes")
+
+    print("\n" + "=" * 60)
+    print("Stroke store complete!")
+    print(f"Set STROKE_STORE_DIR={Path(args.output).resolve()} to serve it.")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
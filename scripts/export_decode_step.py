@@ -0,0 +1,101 @@
+"""
+INKFORGE — Decode Step Exporter
+
+Traces the fused decode step (model step + MDN sampling + denormalization)
+of a trained checkpoint into a TorchScript artifact, verifies it against the
+eager model and saves it next to the checkpoint, where the engine picks it
+up (COMPILED_DECODE=true).
+
+Usage:
+    python scripts/export_decode_step.py --checkpoint checkpoints/lstm_mdn_v1_best.pt
+    python scripts/export_decode_step.py --checkpoint ... --int8 --output decode_int8.pts
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Make the backend package importable when run from the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import torch  # noqa: E402
+
+from app.ml.artifacts import decode_artifact_path  # noqa: E402
+from app.ml.decode_export import export_decode_step  # noqa: E402
+from app.services.inference import InferenceService  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export a compiled decode step.")
+    parser.add_argument("--checkpoint", type=str, required=True, help="Model checkpoint (.pt).")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Artifact path. Defaults to <checkpoint>.decode.pts next to the checkpoint.",
+    )
+    parser.add_argument(
+        "--int8",
+        action="store_true",
+        help="Export the dynamic int8 model (subject to the NLL parity check).",
+    )
+    parser.add_argument(
+        "--max-nll-delta",
+        type=float,
+        default=0.05,
+        help="Largest held-out NLL increase accepted for --int8.",
+    )
+    parser.add_argument("--atol", type=float, default=1e-4, help="Compiled vs eager tolerance.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    output = Path(args.output) if args.output else decode_artifact_path(args.checkpoint)
+
+    print("=" * 60)
+    print("INKFORGE — Decode Step Exporter")
+    print("=" * 60)
+
+    # Tracing happens on CPU; the artifact is moved to the serving device on load
+    service = InferenceService(checkpoint_path=args.checkpoint, device="cpu")
+    service.load_model()
+
+    checkpoint = torch.load(args.checkpoint, map_location="cpu", weights_only=True)
+    metadata = {
+        "model_config": checkpoint.get("model_config", {}),
+        "stroke_stats": checkpoint.get("stroke_stats"),
+        "source": Path(args.checkpoint).name,
+    }
+
+    if args.int8:
+        report = service.quantize_int8(args.max_nll_delta)
+        if service.quantization != "int8":
+            print(f"Int8 model refused: NLL delta {report.delta:+.4f} > {args.max_nll_delta}")
+            sys.exit(1)
+        print(f"Int8 NLL delta: {report.delta:+.4f}")
+    metadata["quantization"] = service.quantization
+
+    try:
+        error = export_decode_step(
+            service.model,
+            output,
+            style_embeddings=service.style_embeddings,
+            stroke_mean=service.stroke_mean,
+            stroke_std=service.stroke_std,
+            metadata=metadata,
+            atol=args.atol,
+        )
+    except ValueError as e:
+        print(f"Export failed: {e}")
+        sys.exit(1)
+
+    print(f"Checkpoint: {args.checkpoint}")
+    print(f"Artifact:   {output}")
+    print(f"Precision:  {service.quantization}")
+    print(f"Parity:     max |compiled - eager| = {error:.2e}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,7 @@ import argparse
 import json
 import random
 import re
+import sys
 import xml.etree.ElementTree as ET
 from collections import defaultdict
 from pathlib import Path
@@ -26,6 +27,11 @@ import numpy as np
 import torch
 from tqdm import tqdm
 
+# Make the backend package importable when run from the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.ml.stroke_budget import compute_stroke_stats  # noqa: E402
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Preprocess IAM dataset.")
@@ -428,6 +434,9 @@ def main() -> None:
     mean = float(deltas_array.mean())
     std = float(deltas_array.std())
 
+    # Per-character stroke counts, for the inference stroke budget
+    stroke_stats = compute_stroke_stats(train_samples, max_seq_len=args.max_seq_len)
+
     stats_path = output_dir / "stats.json"
     with open(stats_path, "w") as f:
         json.dump({
@@ -437,9 +446,14 @@ def main() -> None:
             "num_val": len(val_samples),
             "num_test": len(test_samples),
             "num_writers": len(samples_by_writer),
-        }, f, indent=2)
+            "stroke_stats": stroke_stats,
+        }, f, indent=2, ensure_ascii=False)
 
     print(f"\nNormalization stats: mean={mean:.4f}, std={std:.4f}")
+    print(
+        f"Strokes per character: p50={stroke_stats['global']['p50']:.1f}, "
+        f"p99={stroke_stats['global']['p99']:.1f} ({len(stroke_stats['chars'])} chars)"
+    )
 
     print("\n" + "=" * 60)
     print("Preprocessing complete!")
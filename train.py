@@ -21,9 +21,12 @@ from torch.utils.data import DataLoader
 
 import yaml
 
-from backend.app.ml.model import HandwritingLSTM
+from backend.app.ml.model import HandwritingAttentionLSTM, HandwritingLSTM
 from backend.app.ml.dataset import IAMStrokeDataset, collate_fn
 from backend.app.ml.utils import compute_mdn_loss, build_vocab
+from backend.app.ml.stroke_budget import compute_stroke_stats
+from backend.app.ml.seeding import preset_style_embeddings
+from backend.app.services.inference import STYLE_PRESETS
 
 
 def parse_args() -> argparse.Namespace:
@@ -104,6 +107,59 @@ def get_scheduler(optimizer, config: dict, num_training_steps: int):
         return None
 
 
+def forward_batch(
+    model: nn.Module,
+    batch: dict,
+    text_indices: torch.Tensor,
+    prev_strokes: torch.Tensor,
+    style_z: torch.Tensor,
+    device: torch.device,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor | None]:
+    """
+    Run the model on one batch, aligning the text the way its architecture expects.
+
+    Args:
+        model: HandwritingLSTM or HandwritingAttentionLSTM.
+        batch: Collated batch (for the stroke/text lengths).
+        text_indices: Character indices [B, text_len].
+        prev_strokes: Previous strokes (shifted by 1) [B, seq_len, 5].
+        style_z: Style embeddings [B, style_dim].
+        device: PyTorch device.
+
+    Returns:
+        Tuple of (mdn_params, pen_logits, loss_mask); loss_mask is None when
+        every timestep counts.
+    """
+    batch_size, seq_len, _ = prev_strokes.shape
+
+    if getattr(model, "architecture", "lstm") == "attention":
+        # The soft window learns the alignment: pass the text unexpanded
+        positions = torch.arange(text_indices.shape[1], device=device)
+        char_mask = positions < batch["text_lengths"].to(device).unsqueeze(1)
+        mdn_params, pen_logits, _ = model(
+            text_indices, prev_strokes, style_z, char_mask=char_mask
+        )
+        steps = torch.arange(seq_len, device=device)
+        loss_mask = steps < batch["stroke_lengths"].to(device).unsqueeze(1)
+        return mdn_params, pen_logits, loss_mask
+
+    # Expand text indices to match stroke sequence length
+    text_len = text_indices.shape[1]
+
+    # Simple approach: repeat each char for seq_len/text_len strokes
+    strokes_per_char = max(1, seq_len // text_len)
+    expanded_text = text_indices.repeat_interleave(strokes_per_char, dim=1)
+    expanded_text = expanded_text[:, :seq_len]  # Truncate to exact length
+
+    # Pad if needed
+    if expanded_text.shape[1] < seq_len:
+        pad = torch.zeros(batch_size, seq_len - expanded_text.shape[1], dtype=torch.long, device=device)
+        expanded_text = torch.cat([expanded_text, pad], dim=1)
+
+    mdn_params, pen_logits, _ = model(expanded_text, prev_strokes, style_z)
+    return mdn_params, pen_logits, None
+
+
 def train_epoch(
     model: nn.Module,
     dataloader: DataLoader,
@@ -150,23 +206,11 @@ def train_epoch(
         prev_strokes = torch.zeros_like(strokes)
         prev_strokes[:, 1:] = strokes[:, :-1]
 
-        # Expand text indices to match stroke sequence length
-        seq_len = strokes.shape[1]
-        text_len = text_indices.shape[1]
-
-        # Simple approach: repeat each char for seq_len/text_len strokes
-        strokes_per_char = max(1, seq_len // text_len)
-        expanded_text = text_indices.repeat_interleave(strokes_per_char, dim=1)
-        expanded_text = expanded_text[:, :seq_len]  # Truncate to exact length
-
-        # Pad if needed
-        if expanded_text.shape[1] < seq_len:
-            pad = torch.zeros(batch_size, seq_len - expanded_text.shape[1], dtype=torch.long, device=device)
-            expanded_text = torch.cat([expanded_text, pad], dim=1)
-
         # Forward pass
         optimizer.zero_grad()
-        mdn_params, pen_logits, _ = model(expanded_text, prev_strokes, style_z)
+        mdn_params, pen_logits, loss_mask = forward_batch(
+            model, batch, text_indices, prev_strokes, style_z, device
+        )
 
         # Compute loss
         target_strokes = strokes[:, :, :2]  # Just Δx, Δy
@@ -176,6 +220,7 @@ def train_epoch(
             target_strokes,
             pen_states,
             num_mixtures=config["model"].get("num_mixtures", 20),
+            mask=loss_mask,
         )
 
         # Backward pass
@@ -240,16 +285,9 @@ def validate(
             prev_strokes = torch.zeros_like(strokes)
             prev_strokes[:, 1:] = strokes[:, :-1]
 
-            seq_len = strokes.shape[1]
-            text_len = text_indices.shape[1]
-            strokes_per_char = max(1, seq_len // text_len)
-            expanded_text = text_indices.repeat_interleave(strokes_per_char, dim=1)[:, :seq_len]
-
-            if expanded_text.shape[1] < seq_len:
-                pad = torch.zeros(batch_size, seq_len - expanded_text.shape[1], dtype=torch.long, device=device)
-                expanded_text = torch.cat([expanded_text, pad], dim=1)
-
-            mdn_params, pen_logits, _ = model(expanded_text, prev_strokes, style_z)
+            mdn_params, pen_logits, loss_mask = forward_batch(
+                model, batch, text_indices, prev_strokes, style_z, device
+            )
 
             target_strokes = strokes[:, :, :2]
             loss = compute_mdn_loss(
@@ -258,6 +296,7 @@ def validate(
                 target_strokes,
                 pen_states,
                 num_mixtures=config["model"].get("num_mixtures", 20),
+                mask=loss_mask,
             )
 
             total_loss += loss.item()
@@ -278,6 +317,8 @@ def save_checkpoint(
     stroke_mean: torch.Tensor,
     stroke_std: torch.Tensor,
     scheduler=None,
+    stroke_stats: dict | None = None,
+    parity_batch: dict | None = None,
 ) -> None:
     """Save training checkpoint."""
     checkpoint = {
@@ -289,7 +330,17 @@ def save_checkpoint(
         "vocab": vocab,
         "stroke_mean": stroke_mean,
         "stroke_std": stroke_std,
+        # Style preset table, so every serving process uses the same presets
+        "style_embeddings": preset_style_embeddings(
+            len(STYLE_PRESETS), config["model"].get("style_dim", 128)
+        ),
     }
+    if stroke_stats is not None:
+        # Per-character stroke counts → inference stroke budget
+        checkpoint["stroke_stats"] = stroke_stats
+    if parity_batch is not None:
+        # Held-out batch → int8 quantization parity check at serving time
+        checkpoint["parity_batch"] = parity_batch
     if scheduler is not None:
         checkpoint["scheduler_state_dict"] = scheduler.state_dict()
     torch.save(checkpoint, save_path)
@@ -379,6 +430,14 @@ def main() -> None:
         )
         print(f"Created {len(train_dataset)} dummy samples for testing")
 
+    stroke_stats = compute_stroke_stats(
+        train_dataset.samples, max_seq_len=data_config.get("max_seq_len", 700)
+    )
+    print(
+        f"Strokes per character: p50={stroke_stats['global']['p50']:.1f}, "
+        f"p99={stroke_stats['global']['p99']:.1f}"
+    )
+
     # Create data loaders
     train_loader = DataLoader(
         train_dataset,
@@ -398,9 +457,18 @@ def main() -> None:
         pin_memory=data_config.get("pin_memory", False) and device.type == "cuda",
     ) if len(val_dataset) > 0 else None
 
+    # A few held-out sequences kept in the checkpoint for the int8 parity check
+    parity_batch = None
+    if val_loader is not None:
+        first_batch = next(iter(val_loader))
+        parity_batch = {
+            key: first_batch[key][:8].clone()
+            for key in ("strokes", "text_indices", "stroke_lengths", "text_lengths")
+        }
+
     # Initialize model
     model_config = config["model"]
-    model = HandwritingLSTM(
+    model_kwargs = dict(
         vocab_size=model_config.get("vocab_size", vocab_size),
         char_embed_dim=model_config.get("char_embed_dim", 256),
         style_dim=model_config.get("style_dim", 128),
@@ -409,6 +477,15 @@ def main() -> None:
         dropout=model_config.get("dropout", 0.2),
         num_mixtures=model_config.get("num_mixtures", 20),
     )
+    architecture = model_config.get("architecture", "lstm")
+    if architecture == "attention":
+        model = HandwritingAttentionLSTM(
+            **model_kwargs, window_mixtures=model_config.get("window_mixtures", 10)
+        )
+    elif architecture == "lstm":
+        model = HandwritingLSTM(**model_kwargs)
+    else:
+        raise ValueError(f"Unknown model architecture: {architecture}")
     model = model.to(device)
 
     num_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
@@ -488,6 +565,7 @@ def main() -> None:
                         model, optimizer, epoch, val_loss, config,
                         checkpoint_dir / f"{config['checkpointing']['checkpoint_name']}_best.pt",
                         vocab, train_dataset.stroke_mean, train_dataset.stroke_std,
+                        stroke_stats=stroke_stats, parity_batch=parity_batch,
                     )
             else:
                 patience_counter += 1
@@ -503,6 +581,7 @@ def main() -> None:
                     model, optimizer, epoch, train_loss, config,
                     checkpoint_dir / f"{config['checkpointing']['checkpoint_name']}_epoch{epoch + 1}.pt",
                     vocab, train_dataset.stroke_mean, train_dataset.stroke_std,
+                    stroke_stats=stroke_stats, parity_batch=parity_batch,
                 )
 
         # Update scheduler
@@ -523,6 +602,7 @@ def main() -> None:
         model, optimizer, epoch, train_loss, config,
         checkpoint_dir / f"{config['checkpointing']['checkpoint_name']}_final.pt",
         vocab, train_dataset.stroke_mean, train_dataset.stroke_std,
+        stroke_stats=stroke_stats, parity_batch=parity_batch,
     )
 
     # Export TorchScript model for inference